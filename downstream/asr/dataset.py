@@ -10,11 +10,9 @@
 ###############
 # IMPORTATION #
 ###############
-import logging
 import os
 import random
 #-------------#
-import pandas as pd
 from tqdm import tqdm
 #-------------#
 import torch
@@ -23,6 +21,7 @@ from torch.utils.data.dataset import Dataset
 #-------------#
 import torchaudio
 #-------------#
+from downstream.sampler import read_bucket_lengths
 from .dictionary import Dictionary
 
 SAMPLE_RATE = 16000
@@ -44,24 +43,9 @@ class SequenceDataset(Dataset):
         # Read table for bucketing
         assert os.path.isdir(bucket_file), 'Please first run `python3 preprocess/generate_len_for_bucket.py -h` to get bucket file.'
 
-        # Wavs
-        table_list = []
-        for item in self.split_sets:
-            file_path = os.path.join(bucket_file, item + ".csv")
-            if os.path.exists(file_path):
-                table_list.append(
-                    pd.read_csv(file_path)
-                )
-            else:
-                logging.warning(f'{item} is not found in bucket_file: {bucket_file}, skipping it.')
-
-        table_list = pd.concat(table_list)
-        table_list = table_list.sort_values(by=['length'], ascending=False)
-
-        X = table_list['file_path'].tolist()
-        X_lens = table_list['length'].tolist()
-
-        assert len(X) != 0, f"0 data found for {split}"
+        # Wavs, from the longest
+        X, X_lens = read_bucket_lengths(bucket_file, self.split_sets)
+        X, X_lens = zip(*sorted(zip(X, X_lens), key=lambda item: item[1], reverse=True))
 
         # Transcripts
         Y = self._load_transcript(X)
@@ -96,6 +80,7 @@ class SequenceDataset(Dataset):
 
         # Use bucketing to allow different batch sizes at run time
         self.X = []
+        self.X_lens = []
         batch_x, batch_len = [], []
 
         for x, x_len in tqdm(zip(X, X_lens), total=len(X), desc=f'ASR dataset {split}', dynamic_ncols=True):
@@ -109,14 +94,18 @@ class SequenceDataset(Dataset):
                     if (bucket_size >= 2) and (max(batch_len) > HALF_BATCHSIZE_TIME):
                         self.X.append(batch_x[:bucket_size//2])
                         self.X.append(batch_x[bucket_size//2:])
+                        self.X_lens.append(max(batch_len[:bucket_size//2]))
+                        self.X_lens.append(max(batch_len[bucket_size//2:]))
                     else:
                         self.X.append(batch_x)
+                        self.X_lens.append(max(batch_len))
                     batch_x, batch_len = [], []
         
         # Gather the last batch
         if len(batch_x) > 1:
             if self._parse_x_name(x) in usage_list:
                 self.X.append(batch_x)
+                self.X_lens.append(max(batch_len))
 
     def _parse_x_name(self, x):
         return x.split('/')[-1].split('.')[0]
@@ -173,5 +162,7 @@ class SequenceDataset(Dataset):
         return wav_batch, label_batch # bucketing, return ((wavs, labels))
 
     def collate_fn(self, items):
-        assert len(items) == 1
-        return items[0][0], items[0][1] # hack bucketing, return (wavs, labels)
+        # each item is a pre-bucketed batch, or a single utterance (bucket_size=1) batched by DynamicBatchSampler
+        wav_batch = [wav for item in items for wav in item[0]]
+        label_batch = [label for item in items for label in item[1]]
+        return wav_batch, label_batch # hack bucketing, return (wavs, labels)
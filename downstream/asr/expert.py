@@ -13,6 +13,7 @@ from torch.nn.utils.rnn import pad_sequence
 
 from .model import *
 from .dataset import SequenceDataset
+from ..sampler import DynamicBatchSampler
 
 
 def token_to_word(text):
@@ -80,7 +81,9 @@ class DownstreamExpert(nn.Module):
         self.modelrc = downstream_expert['modelrc']
         self.expdir = expdir
 
-        self.train_dataset = SequenceDataset("train", self.datarc['train_batch_size'], **self.datarc)
+        # with train_max_samples, batches are formed by DynamicBatchSampler from single-utterance buckets
+        train_bucket_size = 1 if self.datarc.get('train_max_samples') else self.datarc['train_batch_size']
+        self.train_dataset = SequenceDataset("train", train_bucket_size, **self.datarc)
 
         self.projector = nn.Linear(upstream_dim, self.modelrc['project_dim'])
         model_cls = eval(self.modelrc['select'])
@@ -128,6 +131,18 @@ class DownstreamExpert(nn.Module):
             return self._get_eval_dataloader(getattr(self, f'{split}_dataset'))
 
     def _get_train_dataloader(self, dataset):
+        if self.datarc.get('train_max_samples'):
+            batch_sampler = DynamicBatchSampler(
+                dataset.X_lens,
+                max_samples=self.datarc['train_max_samples'],
+                max_batch_size=self.datarc.get('train_batch_size'),
+            )
+            return DataLoader(
+                dataset, batch_sampler=batch_sampler,
+                num_workers=self.datarc['num_workers'],
+                collate_fn=dataset.collate_fn,
+            )
+
         sampler = DistributedSampler(dataset) if is_initialized() else None
         return DataLoader(
             dataset, batch_size=1,
@@ -1,40 +1,123 @@
+import os
+import json
+import hashlib
+import numpy as np
 from tqdm import tqdm
 from pathlib import Path
+from functools import lru_cache
 from os.path import join, getsize
 from joblib import Parallel, delayed
 from torch.utils.data import Dataset
 
+from ..text import load_text_encoder
 
-def read_text(file):
-    '''Get transcription of target wave file, 
-       it's somewhat redundant for accessing each txt multiplt times,
-       but it works fine with multi-thread'''
-    src_file = '-'.join(file.split('-')[:-1])+'.trans.txt'
-    idx = file.split('/')[-1].split('.')[0]
 
-    with open(src_file, 'r') as fp:
+@lru_cache(maxsize=4)
+def _get_tokenizer(mode, vocab_file, slots_file=None):
+    # rebuilt once in each joblib worker instead of pickling the tokenizer into it
+    return load_text_encoder(mode, vocab_file, slots_file)
+
+
+def describe_file(filepath):
+    '''A stable identity of a vocabulary file: its absolute path, size and mtime'''
+    if filepath is None or not os.path.isfile(filepath):
+        # eg. the pretrained model name of the bert tokenizers
+        return filepath
+    stat = os.stat(filepath)
+    return [os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns]
+
+
+def read_chapter(trans_file, tokenizer):
+    '''Read a chapter transcription file once, return the flac path and token ids of each utterance'''
+    if isinstance(tokenizer, dict):
+        tokenizer = _get_tokenizer(**tokenizer)
+    chapter_dir = os.path.dirname(trans_file)
+    items = []
+    with open(trans_file, 'r') as fp:
         for line in fp:
-            if idx == line.split(' ')[0]:
-                return line[:-1].split(' ', 1)[1]
+            idx, transcription = line.rstrip('\n').split(' ', 1)
+            items.append((join(chapter_dir, idx + '.flac'), tokenizer.encode(transcription)))
+    return items
+
+
+def build_index(path, split, tokenizer, n_jobs=-1):
+    '''
+    Args:
+        tokenizer: the text encoder, or the text config to rebuild it with load_text_encoder,
+            which tokenizes in parallel workers without pickling the encoder
+
+    Return:
+        file_list: flac paths relative to path
+        tokens: token ids of all utterances concatenated
+        offsets: utterance i has tokens[offsets[i]:offsets[i + 1]]
+    '''
+    trans_files = sorted(Path(join(path, split)).rglob('*.trans.txt'))
+    assert len(trans_files) > 0, "No data found @ {}".format(join(path, split))
+
+    if isinstance(tokenizer, dict):
+        chapters = Parallel(n_jobs=n_jobs)(
+            delayed(read_chapter)(str(f), tokenizer) for f in tqdm(trans_files, desc=f'Read text {split}'))
+    else:
+        chapters = [read_chapter(str(f), tokenizer) for f in tqdm(trans_files, desc=f'Read text {split}')]
+
+    items = [item for chapter in chapters for item in chapter]
+    file_list = [os.path.relpath(f, path) for f, _ in items]
+    lengths = [len(txt) for _, txt in items]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    tokens = np.array([token for _, txt in items for token in txt], dtype=np.int64)
+    return file_list, tokens, offsets
+
+
+def load_index(path, split, tokenizer, text_config=None, index_dir=None, n_jobs=-1):
+    '''
+    Load the persisted index of a split with memory mapping, build and persist it if missing
+
+    Args:
+        text_config: the `text` config the tokenizer is loaded from, identifies the index
+            together with the corpus path and split. Without it the index is not persisted
+    '''
+    if text_config is None:
+        return build_index(path, split, tokenizer, n_jobs)
+    if index_dir is None:
+        return build_index(path, split, text_config, n_jobs)
+
+    description = {
+        'path': os.path.abspath(path),
+        'split': split,
+        'mode': text_config['mode'],
+        'vocab_file': describe_file(text_config['vocab_file']),
+        'slots_file': describe_file(text_config.get('slots_file')),
+    }
+    digest = hashlib.md5(json.dumps(description, sort_keys=True).encode()).hexdigest()[:8]
+    prefix = join(index_dir, f'{split}-{digest}')
+    if not os.path.isfile(f'{prefix}.offsets.npy'):
+        file_list, tokens, offsets = build_index(path, split, text_config, n_jobs)
+        os.makedirs(index_dir, exist_ok=True)
+        with open(f'{prefix}.files.txt', 'w') as fp:
+            fp.write('\n'.join(file_list) + '\n')
+        np.save(f'{prefix}.tokens.npy', tokens)
+        # offsets are written last, marking a complete index
+        np.save(f'{prefix}.offsets.npy', offsets)
+
+    with open(f'{prefix}.files.txt', 'r') as fp:
+        file_list = fp.read().splitlines()
+    tokens = np.load(f'{prefix}.tokens.npy', mmap_mode='r')
+    offsets = np.load(f'{prefix}.offsets.npy', mmap_mode='r')
+    return file_list, tokens, offsets
 
 
 class LibriDataset(Dataset):
-    def __init__(self, split, tokenizer, bucket_size, path, ascending=False, **kwargs):
+    def __init__(self, split, tokenizer, bucket_size, path, ascending=False, text_config=None, index_dir=None, num_workers=-1, **kwargs):
         # Setup
         self.path = path
         self.bucket_size = bucket_size
 
-        # List all wave files
-        file_list = []
+        # List all wave files and their transcriptions
+        file_list, text = [], []
         for s in split:
-            split_list = list(Path(join(path, s)).rglob("*.flac"))
-            assert len(split_list) > 0, "No data found @ {}".format(join(path,s))
-            file_list += split_list
-        
-        text = []
-        for f in tqdm(file_list, desc='Read text'):
-            transcription = read_text(str(f))
-            text.append(tokenizer.encode(transcription))
+            split_files, tokens, offsets = load_index(path, s, tokenizer, text_config, index_dir, num_workers)
+            file_list += [Path(join(path, f)) for f in split_files]
+            text += [tokens[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
 
         self.file_list, self.text = zip(*[(f_name, txt)
                                           for f_name, txt in sorted(zip(file_list, text), reverse=not ascending, key=lambda x:len(x[1]))])
@@ -43,10 +126,10 @@ class LibriDataset(Dataset):
         if self.bucket_size > 1:
             # Return a bucket
             index = min(len(self.file_list)-self.bucket_size, index)
-            return [(f_path, txt) for f_path, txt in
+            return [(f_path, txt.tolist()) for f_path, txt in
                     zip(self.file_list[index:index+self.bucket_size], self.text[index:index+self.bucket_size])]
         else:
-            return self.file_list[index], self.text[index]
+            return self.file_list[index], self.text[index].tolist()
 
     def __len__(self):
         return len(self.file_list)
@@ -67,10 +67,10 @@ def create_dataset(split, tokenizer, name, bucketing, batch_size, **kwargs):
     return dataset, loader_bs
 
 
-def load_dataset(split, tokenizer, corpus):
+def load_dataset(split, tokenizer, corpus, text_config=None):
     ''' Prepare dataloader for training/validation'''
     num_workers = corpus.pop('num_workers', 12)
-    dataset, loader_bs = create_dataset(split, tokenizer, num_workers=num_workers, **corpus)
+    dataset, loader_bs = create_dataset(split, tokenizer, num_workers=num_workers, text_config=text_config, **corpus)
     collate_fn = partial(collect_audio_batch, split=split)
     if split == 'train':
         sampler = DistributedSampler(dataset) if is_initialized() else None
@@ -30,7 +30,8 @@ class DownstreamExpert(nn.Module):
         self.corpus = downstream_expert["corpus"]
 
         # Text tokenizer
-        self.tokenizer = load_text_encoder(**downstream_expert["text"])
+        self.text_config = downstream_expert["text"]
+        self.tokenizer = load_text_encoder(**self.text_config)
 
         modelrc = downstream_expert["model"]
         self.projector = nn.Linear(upstream_dim, modelrc["project_dim"])
@@ -58,7 +59,7 @@ class DownstreamExpert(nn.Module):
 
     # Interface
     def get_dataloader(self, split):
-        return load_dataset(split, self.tokenizer, self.corpus)
+        return load_dataset(split, self.tokenizer, self.corpus, self.text_config)
 
     # Interface
     def forward(self, split, features, labels, filenames, records, **kwargs):
@@ -209,7 +209,7 @@ class DownstreamExpert(nn.Module):
                 the loss to be optimized, should not be detached
         """
         labels = [torch.from_numpy(label) for label in labels]
-        lengths = torch.LongTensor(lengths)
+        lengths = torch.LongTensor(lengths).to(features[0].device)
 
         features = pad_sequence(features, batch_first=True)
         labels = pad_sequence(labels, batch_first=True, padding_value=0).to(
@@ -222,10 +222,10 @@ class DownstreamExpert(nn.Module):
         # nn.CrossEntropyLoss expect to have (N, class) and (N,) as input
         # here we flatten logits and labels in order to apply nn.CrossEntropyLoss
         class_num = predicted.size(-1)
-        loss, perm_idx, perm_list = self.objective(predicted, labels, lengths)
+        loss, perm = self.objective(predicted, labels, lengths)
 
         # get the best label permutation
-        label_perm = get_label_perm(labels, perm_idx, perm_list)
+        label_perm = get_label_perm(labels, perm)
 
         (
             correct,
@@ -239,21 +239,23 @@ class DownstreamExpert(nn.Module):
             speaker_error,
         ) = calc_diarization_error(predicted, label_perm, lengths)
 
-        if speech_scored > 0 and speaker_scored > 0 and num_frames > 0:
-            SAD_MR, SAD_FR, MI, FA, CF, ACC, DER = (
-                speech_miss / speech_scored,
-                speech_falarm / speech_scored,
-                speaker_miss / speaker_scored,
-                speaker_falarm / speaker_scored,
-                speaker_error / speaker_scored,
-                correct / num_frames,
-                (speaker_miss + speaker_falarm + speaker_error) / speaker_scored,
-            )
-        else:
-            SAD_MR, SAD_FR, MI, FA, CF, ACC, DER = 0, 0, 0, 0, 0, 0, 0
+        # the statistics stay on device, records are only synchronized in self.log_records
+        valid = (speech_scored > 0) & (speaker_scored > 0) & (num_frames > 0)
+        ratio = lambda numerator, denominator: torch.where(
+            valid, numerator / denominator.clamp(min=1), torch.zeros_like(numerator)
+        )
+        SAD_MR, SAD_FR, MI, FA, CF, ACC, DER = (
+            ratio(speech_miss, speech_scored),
+            ratio(speech_falarm, speech_scored),
+            ratio(speaker_miss, speaker_scored),
+            ratio(speaker_falarm, speaker_scored),
+            ratio(speaker_error, speaker_scored),
+            ratio(correct, num_frames),
+            ratio(speaker_miss + speaker_falarm + speaker_error, speaker_scored),
+        )
         # debug
         # print("SAD_MR {}, SAD_FR {}, MI {}, FA {}, CF {}, ACC {}, DER {}".format(SAD_MR, SAD_FR, MI, FA, CF, ACC, DER))
-        records["loss"].append(loss.item())
+        records["loss"].append(loss.detach())
         records["acc"] += [ACC]
         records["der"] += [DER]
 
@@ -304,8 +306,8 @@ class DownstreamExpert(nn.Module):
                 You can return nothing or an empty list when no need to save the checkpoint
 
         """
-        average_acc = torch.FloatTensor(records["acc"]).mean().item()
-        average_der = torch.FloatTensor(records["der"]).mean().item()
+        average_acc = torch.stack(records["acc"]).mean().item()
+        average_der = torch.stack(records["der"]).mean().item()
 
         logger.add_scalar(
             f"diarization/{mode}-acc", average_acc, global_step=global_step
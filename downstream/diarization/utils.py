@@ -11,18 +11,21 @@
 # IMPORTATION #
 ###############
 import torch
-import numpy as np
+import torch.nn.functional as F
 from itertools import permutations
+from scipy.optimize import linear_sum_assignment
+
+
+# the permutations are enumerated on device up to this number of speakers,
+# beyond which the assignment is solved by the Hungarian algorithm
+MAX_PERMUTE_SPEAKERS = 5
 
 
 # compute mask to remove the padding positions
 def create_length_mask(length, max_len, num_output, device):
-    batch_size = len(length)
-    mask = torch.zeros(batch_size, max_len, num_output)
-    for i in range(batch_size):
-        mask[i, : length[i], :] = 1
-    mask = mask.to(device)
-    return mask
+    length = torch.as_tensor(length, device=device)
+    mask = torch.arange(max_len, device=device).unsqueeze(0) < length.unsqueeze(1)
+    return mask.float().unsqueeze(2).expand(-1, -1, num_output)
 
 
 # compute loss for a single permutation
@@ -36,58 +39,85 @@ def pit_loss_single_permute(output, label, length):
     return loss
 
 
+def pit_cost_matrix(output, label, length):
+    """
+    cost[b, j, k] is the masked BCE summed over time between output j and label k,
+    computed for all the pairs at once with
+        BCEWithLogits(x, y) = softplus(x) - x * y
+
+    Args:
+        output, label: (batch_size, max_len, num_output)
+
+    Return:
+        (batch_size, num_output, num_output)
+    """
+    mask = create_length_mask(length, label.size(1), 1, output.device)
+    positive = torch.sum(F.softplus(output) * mask, dim=1).unsqueeze(2)
+    cross = torch.bmm((output * mask).transpose(1, 2), label.to(output.dtype))
+    return positive - cross
+
+
+def get_permutations(num_output, device):
+    return torch.LongTensor(list(permutations(range(num_output)))).to(device)
+
+
 def pit_loss(output, label, length):
+    """
+    Return:
+        loss: masked BCE of the best permutation, averaged over the valid frames
+        perm: (batch_size, num_output), output j is assigned to label perm[b, j]
+    """
     num_output = label.size(2)
     device = label.device
-    permute_list = [np.array(p) for p in permutations(range(num_output))]
-    loss_list = []
-    for p in permute_list:
-        label_perm = label[:, :, p]
-        loss_perm = pit_loss_single_permute(output, label_perm, length)
-        loss_list.append(loss_perm)
-    loss = torch.cat(loss_list, dim=1)
-    min_loss, min_idx = torch.min(loss, dim=1)
-    loss = torch.sum(min_loss) / torch.sum(length.float().to(device))
-    return loss, min_idx, permute_list
-
-
-def get_label_perm(label, perm_idx, perm_list):
-    batch_size = len(perm_idx)
-    label_list = []
-    for i in range(batch_size):
-        label_list.append(label[i, :, perm_list[perm_idx[i]]].data.cpu().numpy())
-    return torch.from_numpy(np.array(label_list)).float()
+    cost = pit_cost_matrix(output, label, length)
+    outputs = torch.arange(num_output, device=device)
+
+    if num_output <= MAX_PERMUTE_SPEAKERS:
+        permute_list = get_permutations(num_output, device)
+        # (batch_size, num_perm)
+        loss = cost[:, outputs.unsqueeze(0), permute_list].sum(dim=2)
+        min_loss, min_idx = torch.min(loss, dim=1)
+        perm = permute_list[min_idx]
+    else:
+        cost_np = cost.detach().cpu().numpy()
+        perm = torch.LongTensor([linear_sum_assignment(c)[1] for c in cost_np]).to(device)
+        min_loss = cost.gather(2, perm.unsqueeze(2)).squeeze(2).sum(dim=1)
+
+    loss = torch.sum(min_loss) / num_output / torch.sum(length.float().to(device))
+    return loss, perm
+
+
+def get_label_perm(label, perm):
+    return label.gather(2, perm.unsqueeze(1).expand(-1, label.size(1), -1)).float()
 
 
 def calc_diarization_error(pred, label, length):
+    """
+    All the statistics are computed on the device of pred and returned as 0-dim tensors
+    """
     (batch_size, max_len, num_output) = label.size()
     # mask the padding part
-    mask = np.zeros((batch_size, max_len, num_output))
-    for i in range(batch_size):
-        mask[i, : length[i], :] = 1
+    mask = create_length_mask(length, max_len, num_output, pred.device)
 
     # pred and label have the shape (batch_size, max_len, num_output)
-    label_np = label.data.cpu().numpy().astype(int)
-    pred_np = (pred.data.cpu().numpy() > 0).astype(int)
-    label_np = label_np * mask
-    pred_np = pred_np * mask
-    length = length.data.cpu().numpy()
+    label = label.to(pred.device).float() * mask
+    pred = (pred.detach() > 0).float() * mask
 
     # compute speech activity detection error
-    n_ref = np.sum(label_np, axis=2)
-    n_sys = np.sum(pred_np, axis=2)
-    speech_scored = float(np.sum(n_ref > 0))
-    speech_miss = float(np.sum(np.logical_and(n_ref > 0, n_sys == 0)))
-    speech_falarm = float(np.sum(np.logical_and(n_ref == 0, n_sys > 0)))
+    n_ref = torch.sum(label, dim=2)
+    n_sys = torch.sum(pred, dim=2)
+    speech_scored = torch.sum(n_ref > 0).float()
+    speech_miss = torch.sum((n_ref > 0) & (n_sys == 0)).float()
+    speech_falarm = torch.sum((n_ref == 0) & (n_sys > 0)).float()
 
     # compute speaker diarization error
-    speaker_scored = float(np.sum(n_ref))
-    speaker_miss = float(np.sum(np.maximum(n_ref - n_sys, 0)))
-    speaker_falarm = float(np.sum(np.maximum(n_sys - n_ref, 0)))
-    n_map = np.sum(np.logical_and(label_np == 1, pred_np == 1), axis=2)
-    speaker_error = float(np.sum(np.minimum(n_ref, n_sys) - n_map))
-    correct = float(1.0 * np.sum((label_np == pred_np) * mask) / num_output)
-    num_frames = np.sum(length)
+    speaker_scored = torch.sum(n_ref)
+    speaker_miss = torch.sum(torch.clamp(n_ref - n_sys, min=0))
+    speaker_falarm = torch.sum(torch.clamp(n_sys - n_ref, min=0))
+    n_map = torch.sum(label * pred, dim=2)
+    speaker_error = torch.sum(torch.min(n_ref, n_sys) - n_map)
+    correct = torch.sum((label == pred).float() * mask) / num_output
+    num_frames = torch.sum(torch.as_tensor(length, device=pred.device)).float()
     return (
         correct,
         num_frames,
@@ -1,9 +1,7 @@
-import math
-
 import torch
 import torch.nn as nn
-from torch.nn.utils.rnn import pad_sequence
 from downstream.model import UtteranceLevel_Linear, AttentivePooling, MeanPooling
+from downstream.pooling import lengths_to_mask, mask_to_logits
 
 class SelfAttentionPooling(nn.Module):
     """
@@ -193,13 +191,8 @@ class DeepModel(nn.Module):
         self.model = eval(model_type)(pooling=pooling, **kwargs)
 
     def forward(self, features, features_len):
-        attention_mask = [
-            torch.ones(math.ceil((l / self.pooling)))
-            for l in features_len
-        ]
-        attention_mask = pad_sequence(attention_mask, batch_first=True)
-        attention_mask = (1.0 - attention_mask) * -100000.0
-        attention_mask = attention_mask.to(features.device)
+        pooled_len = torch.ceil(torch.as_tensor(features_len, device=features.device).float() / self.pooling).long()
+        attention_mask = mask_to_logits(lengths_to_mask(pooled_len))
         predicted = self.model(features, attention_mask)
         return predicted
 
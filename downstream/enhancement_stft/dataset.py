@@ -21,6 +21,8 @@ from torch.utils.data.dataset import Dataset
 
 import librosa
 
+from downstream.separation_stft.stft_cache import STFTCache
+
 class SeparationDataset(Dataset):
     def __init__(
         self,
@@ -208,3 +210,46 @@ class SeparationDataset(Dataset):
             number of samples in each utterance
         """
         return source_wav_list, uttname_list, source_attr, source_wav, target_attr, target_wav_list, feat_length, wav_length
+
+
+class CachedSeparationDataset(SeparationDataset):
+    def __init__(self, data_dir, cache_dir, num_workers=4, **kwargs):
+        """
+        Args:
+            cache_dir (str):
+                the waveforms and STFT features of src and tgt are precomputed
+                once into memory-mapped arrays under cache_dir, and sliced
+                directly by __getitem__ afterwards
+
+            num_workers (int):
+                dataloader workers used to precompute the cache
+
+            Other arguments are the same as SeparationDataset
+        """
+        super(CachedSeparationDataset, self).__init__(data_dir, **kwargs)
+        config = {
+            'data_dir': os.path.abspath(data_dir),
+            'rate': self.rate,
+            'n_fft': self.n_fft,
+            'hop_length': self.hop_length,
+            'win_length': self.win_length,
+            'window': self.window,
+            'center': self.center,
+        }
+        self.cache = STFTCache(cache_dir, self.src + self.tgt, config)
+        # __getitem__ computes the items while building the cache
+        self.cached = False
+        self.cache.prepare(self, num_workers)
+        self.cached = True
+
+    def __getitem__(self, i):
+        if not self.cached:
+            return super(CachedSeparationDataset, self).__getitem__(i)
+        reco = self.recolist[i]
+        src_samp, src_feat = self.cache.read(reco, self.src[0])
+        tgt_samp_list, tgt_feat_list = [], []
+        for j in range(self.n_srcs):
+            tgt_samp, tgt_feat = self.cache.read(reco, self.tgt[j])
+            tgt_samp_list.append(tgt_samp)
+            tgt_feat_list.append(tgt_feat)
+        return reco, src_samp, src_feat, tgt_samp_list, tgt_feat_list
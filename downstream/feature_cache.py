@@ -0,0 +1,162 @@
+import os
+import glob
+import hashlib
+from typing import List
+
+import torch
+import numpy as np
+from torch.nn.utils.rnn import pad_sequence
+from torch.distributed import is_initialized, get_rank
+
+from utility.helper import show
+
+
+def get_upstream_digest(upstream, ckpt=None, model_config=None, feature_selection='hidden_states'):
+    """
+    Identify the upstream whose features are cached.
+    The ckpt file is fingerprinted by its size and mtime instead of its content,
+    since hashing a large checkpoint would take longer than the forward it saves.
+    """
+    hasher = hashlib.sha1()
+    for item in [upstream, ckpt, model_config, feature_selection]:
+        hasher.update(str(item).encode())
+    for path in [ckpt, model_config]:
+        if isinstance(path, str) and os.path.isfile(path):
+            stat = os.stat(path)
+            hasher.update(f'{stat.st_size}-{stat.st_mtime}'.encode())
+    return f'{upstream}-{hasher.hexdigest()[:16]}'
+
+
+class FeatureCache:
+    """
+    On-disk cache of the upstream features selected by the Featurizer, for frozen upstreams.
+
+    Each utterance is stored as a (layer_num, seq_len, feat_dim) array appended into large shard
+    files, which are memory-mapped when read back. Utterances are keyed by the hash of their
+    waveform samples, so datasets with random cropping or augmentation stay correct (they simply
+    miss the cache more often). Every process writes its own shards and index, so the cache can
+    be shared among DDP workers.
+    """
+    def __init__(self, cache_dir, upstream, ckpt=None, model_config=None,
+                 feature_selection='hidden_states', dtype='float32', shard_bytes=2 ** 30, **kwargs):
+        self.feature_selection = feature_selection
+        self.dtype = np.dtype(dtype)
+        self.shard_bytes = shard_bytes
+        self.root = os.path.join(cache_dir, get_upstream_digest(upstream, ckpt, model_config, feature_selection))
+        os.makedirs(self.root, exist_ok=True)
+
+        self.rank = get_rank() if is_initialized() else 0
+        self.index = {}
+        for index_path in glob.glob(f'{self.root}/*.idx'):
+            self._read_index(index_path)
+        show(f'[FeatureCache] - {len(self.index)} cached utterances found in {self.root}')
+
+        self.memmaps = {}
+        self.writer = None
+        self.index_file = open(os.path.join(self.root, f'rank{self.rank}.idx'), 'a')
+
+    def _read_index(self, index_path):
+        with open(index_path, 'r') as file:
+            for line in file:
+                fields = line.strip().split()
+                if len(fields) != 6:
+                    # a partially written line from an interrupted run
+                    continue
+                key, shard, offset, layer_num, seq_len, feat_dim = fields
+                self.index[key] = (shard, int(offset), (int(layer_num), int(seq_len), int(feat_dim)))
+
+    def _open_writer(self):
+        shard_id = len(glob.glob(f'{self.root}/rank{self.rank}-*.bin'))
+        self.writer_shard = f'rank{self.rank}-{shard_id}.bin'
+        self.writer = open(os.path.join(self.root, self.writer_shard), 'ab')
+
+    def _get_memmap(self, shard, end):
+        memmap = self.memmaps.get(shard)
+        if memmap is None or len(memmap) < end:
+            # shards still being appended by this run need to be re-mapped after growing
+            memmap = np.memmap(os.path.join(self.root, shard), dtype=np.uint8, mode='r')
+            self.memmaps[shard] = memmap
+        return memmap
+
+    @staticmethod
+    def get_keys(wavs):
+        """
+        Args:
+            wavs: list of waveforms as returned by the dataloader (numpy arrays or cpu tensors)
+        """
+        keys = []
+        for wav in wavs:
+            if isinstance(wav, torch.Tensor):
+                wav = wav.detach().cpu().numpy()
+            wav = np.ascontiguousarray(wav, dtype=np.float32)
+            keys.append(hashlib.sha1(wav.tobytes()).hexdigest())
+        return keys
+
+    def load(self, keys: List[str], device='cpu'):
+        """
+        Return:
+            a feature dict which can be consumed by the Featurizer,
+            or None if any of the utterances is not cached yet
+        """
+        if not all(key in self.index for key in keys):
+            return None
+
+        layers = []
+        for key in keys:
+            shard, offset, shape = self.index[key]
+            nbytes = int(np.prod(shape)) * self.dtype.itemsize
+            buffer = self._get_memmap(shard, offset + nbytes)[offset : offset + nbytes]
+            array = np.frombuffer(buffer, dtype=self.dtype).reshape(shape)
+            layers.append(torch.from_numpy(array.astype(np.float32)))
+
+        # (batch_size, layer_num, seq_len, feat_dim) -> layer_num x (batch_size, max_seq_len, feat_dim)
+        layer_num = layers[0].size(0)
+        feature = [
+            pad_sequence([item[layer_id] for item in layers], batch_first=True).to(device)
+            for layer_id in range(layer_num)
+        ]
+        return {self.feature_selection: feature}
+
+    def save(self, keys: List[str], wavs, features):
+        """
+        Args:
+            keys: from get_keys
+            wavs: the waveforms fed into the upstream, used to compute valid feature lengths
+            features: the upstream output dict
+        """
+        feature = features.get(self.feature_selection)
+        if isinstance(feature, dict):
+            feature = list(feature.values())
+        if not isinstance(feature, (list, tuple)):
+            feature = [feature]
+
+        # (layer_num, batch_size, max_seq_len, feat_dim)
+        stacked = torch.stack([f.detach() for f in feature], dim=0).cpu()
+        ratio = max([len(wav) for wav in wavs]) / stacked.size(2)
+        feature_len = [round(len(wav) / ratio) for wav in wavs]
+
+        for i, (key, length) in enumerate(zip(keys, feature_len)):
+            if key in self.index:
+                continue
+
+            array = np.ascontiguousarray(stacked[:, i, :length].numpy().astype(self.dtype))
+            if self.writer is None or self.writer.tell() + array.nbytes > self.shard_bytes:
+                if self.writer is not None:
+                    self.writer.close()
+                self._open_writer()
+
+            offset = self.writer.tell()
+            self.writer.write(array.tobytes())
+            self.writer.flush()
+
+            # the index line is written only after its payload is on disk
+            layer_num, seq_len, feat_dim = array.shape
+            self.index_file.write(f'{key} {self.writer_shard} {offset} {layer_num} {seq_len} {feat_dim}\n')
+            self.index_file.flush()
+            self.index[key] = (self.writer_shard, offset, array.shape)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self.index_file.close()
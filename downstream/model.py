@@ -2,6 +2,8 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+from .pooling import lengths_to_mask, mask_to_logits, masked_mean
+
 
 def get_downstream_model(input_dim, output_dim, config):
     model_cls = eval(config['select'])
@@ -69,12 +71,10 @@ class MeanPooling(nn.Module):
             feature_BxTxH - [BxTxH]   Acoustic feature with shape 
             features_len  - [B] of feature length
         '''
-        agg_vec_list = []
-        for i in range(len(feature_BxTxH)):
-            agg_vec = torch.mean(feature_BxTxH[i][:features_len[i]], dim=0)
-            agg_vec_list.append(agg_vec)
+        features_len = torch.as_tensor(features_len, device=feature_BxTxH.device)
+        agg_vec = masked_mean(feature_BxTxH, features_len)
 
-        return torch.stack(agg_vec_list), torch.ones(len(feature_BxTxH)).long()
+        return agg_vec, torch.ones(len(feature_BxTxH)).long()
 
 
 class AttentivePooling(nn.Module):
@@ -90,9 +90,9 @@ class AttentivePooling(nn.Module):
             feature_BxTxH - [BxTxH]   Acoustic feature with shape 
             features_len  - [B] of feature length
         '''
-        device = feature_BxTxH.device
-        len_masks = torch.lt(torch.arange(features_len.max()).unsqueeze(0).to(device), features_len.unsqueeze(1))
-        sap_vec, _ = self.sap_layer(feature_BxTxH, len_masks)
+        features_len = torch.as_tensor(features_len, device=feature_BxTxH.device)
+        att_mask = mask_to_logits(lengths_to_mask(features_len, feature_BxTxH.size(1)))
+        sap_vec, _ = self.sap_layer(feature_BxTxH, att_mask)
 
         return sap_vec, torch.ones(len(feature_BxTxH)).long()
 
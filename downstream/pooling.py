@@ -0,0 +1,59 @@
+"""
+Masked pooling over padded features, shared by utterance-level downstream models.
+Every function takes a padded (batch_size, seq_len, hidden_dim) tensor and the valid length of each item.
+"""
+
+import torch
+import torch.nn.functional as F
+
+
+def lengths_to_mask(lengths, max_len=None):
+    """
+    Return:
+        (batch_size, max_len) bool tensor, True for valid frames
+    """
+    max_len = max_len or int(lengths.max())
+    positions = torch.arange(max_len, device=lengths.device)
+    return positions.unsqueeze(0) < lengths.unsqueeze(-1)
+
+
+def mask_to_logits(mask, value=-100000.0):
+    """Convert a bool mask into the additive attention mask used by the attention modules"""
+    return (~mask).float() * value
+
+
+def masked_mean(features, lengths):
+    """(batch_size, hidden_dim)"""
+    mask = lengths_to_mask(lengths, features.size(1)).unsqueeze(-1).to(features.dtype)
+    counts = lengths.to(features.dtype).clamp(min=1).unsqueeze(-1)
+    return (features * mask).sum(dim=1) / counts
+
+
+def masked_std(features, lengths, mean=None, unbiased=True):
+    """(batch_size, hidden_dim), unbiased like torch.std by default"""
+    if mean is None:
+        mean = masked_mean(features, lengths)
+    mask = lengths_to_mask(lengths, features.size(1)).unsqueeze(-1).to(features.dtype)
+    counts = lengths.to(features.dtype) - (1 if unbiased else 0)
+    squared = ((features - mean.unsqueeze(1)) ** 2 * mask).sum(dim=1)
+    return torch.sqrt(squared / counts.clamp(min=1).unsqueeze(-1))
+
+
+def statistics_pooling(features, lengths):
+    """Concatenated mean and standard deviation, (batch_size, 2 * hidden_dim)"""
+    mean = masked_mean(features, lengths)
+    return torch.cat([mean, masked_std(features, lengths, mean)], dim=-1)
+
+
+def attentive_pooling(features, logits, lengths):
+    """
+    Args:
+        logits: (batch_size, seq_len) unnormalized attention scores, padded frames are ignored
+
+    Return:
+        pooled: (batch_size, hidden_dim)
+        weights: (batch_size, seq_len, 1)
+    """
+    mask = lengths_to_mask(lengths, features.size(1))
+    weights = F.softmax(logits.masked_fill(~mask, float('-inf')), dim=-1).unsqueeze(-1)
+    return torch.sum(features * weights, dim=1), weights
@@ -0,0 +1,89 @@
+import torch
+
+
+class PrefetchedWavs(list):
+    """
+    The device-resident waveforms of a batch.
+    `host` keeps the matching CPU views, for the consumers hashing the samples (eg. FeatureCache)
+    without syncing the device.
+    """
+    def __init__(self, wavs, host):
+        super().__init__(wavs)
+        self.host = host
+
+
+def pack_wavs(wavs, pin_memory=False):
+    """
+    Pack the waveforms of a batch into one contiguous float32 buffer
+
+    Return:
+        buffer: (total_samples, ) tensor, pinned if pin_memory
+        offsets: list of (start, end) of each waveform in the buffer
+        shapes: list of the original shapes
+    """
+    wavs = [torch.as_tensor(wav, dtype=torch.float32) for wav in wavs]
+    shapes = [wav.shape for wav in wavs]
+    offsets, start = [], 0
+    for wav in wavs:
+        offsets.append((start, start + wav.numel()))
+        start += wav.numel()
+
+    buffer = torch.empty(start, dtype=torch.float32, pin_memory=pin_memory)
+    torch.cat([wav.reshape(-1) for wav in wavs], out=buffer)
+    return buffer, offsets, shapes
+
+
+def unpack_wavs(buffer, offsets, shapes):
+    return [buffer[start:end].view(shape) for (start, end), shape in zip(offsets, shapes)]
+
+
+class BatchPrefetcher:
+    """
+    Wrap a dataloader yielding (wavs, *others), and yield (PrefetchedWavs, *others).
+
+    The waveforms of each batch are packed into one pinned buffer and copied to the device
+    with a single non-blocking transfer on a side stream. The transfer of batch N+1 is
+    issued before batch N is handed to the training loop, so it overlaps the computation.
+    On CPU the batch is only packed.
+    """
+    def __init__(self, dataloader, device):
+        self.dataloader = dataloader
+        self.device = torch.device(device)
+        self.use_cuda = self.device.type == 'cuda' and torch.cuda.is_available()
+        self.stream = torch.cuda.Stream(self.device) if self.use_cuda else None
+
+    def __len__(self):
+        return len(self.dataloader)
+
+    def _preload(self, iterator):
+        try:
+            wavs, *others = next(iterator)
+        except StopIteration:
+            return None
+
+        host_buffer, offsets, shapes = pack_wavs(wavs, pin_memory=self.use_cuda)
+        if self.use_cuda:
+            with torch.cuda.stream(self.stream):
+                device_buffer = host_buffer.to(self.device, non_blocking=True)
+        else:
+            device_buffer = host_buffer
+
+        wavs = PrefetchedWavs(
+            unpack_wavs(device_buffer, offsets, shapes),
+            unpack_wavs(host_buffer, offsets, shapes),
+        )
+        return device_buffer, wavs, others
+
+    def __iter__(self):
+        iterator = iter(self.dataloader)
+        batch = self._preload(iterator)
+        while batch is not None:
+            device_buffer, wavs, others = batch
+            if self.use_cuda:
+                current_stream = torch.cuda.current_stream(self.device)
+                current_stream.wait_stream(self.stream)
+                # the buffer is allocated on the side stream but consumed on the current one
+                device_buffer.record_stream(current_stream)
+
+            batch = self._preload(iterator)
+            yield (wavs, *others)
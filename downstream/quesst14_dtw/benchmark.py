@@ -0,0 +1,71 @@
+"""
+Compare DTWEngine against the per-pair match path on random features.
+
+Usage:
+    python3 -m downstream.quesst14_dtw.benchmark --n_queries 8 --n_docs 200
+"""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .dtw_engine import DTWEngine
+from .expert import cosine_exp, match
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_queries", type=int, default=8)
+    parser.add_argument("--n_docs", type=int, default=200)
+    parser.add_argument("--feat_dim", type=int, default=768)
+    parser.add_argument("--max_workers", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    rng = np.random.RandomState(args.seed)
+    queries = [
+        rng.randn(rng.randint(20, 100), args.feat_dim).astype(np.float32)
+        for _ in range(args.n_queries)
+    ]
+    docs = [
+        rng.randn(rng.randint(100, 500), args.feat_dim).astype(np.float32)
+        for _ in range(args.n_docs)
+    ]
+    dtwrc = {
+        "step_pattern": "asymmetric",
+        "keep_internals": False,
+        "distance_only": False,
+        "open_begin": True,
+        "open_end": True,
+    }
+
+    start = time.time()
+    baseline = np.zeros((len(queries), len(docs)))
+    with ProcessPoolExecutor(max_workers=args.max_workers) as executor:
+        futures = {
+            executor.submit(match, query, doc, i, j, cosine_exp, True, dtwrc): (i, j)
+            for i, query in enumerate(queries)
+            for j, doc in enumerate(docs)
+        }
+        for future in futures:
+            i, j, score = future.result()
+            baseline[i, j] = score
+    baseline_time = time.time() - start
+
+    start = time.time()
+    with DTWEngine(docs, "cosine_exp", max_workers=args.max_workers) as engine:
+        scores = engine.score(queries)
+    engine_time = time.time() - start
+
+    print(f"match:     {baseline_time:.2f} sec")
+    print(f"DTWEngine: {engine_time:.2f} sec ({baseline_time / engine_time:.1f}x)")
+    print(f"max abs score difference: {np.abs(scores - baseline).max():.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Batched DTW scoring engine for query-by-example search."""
+
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from dtw import dtw
+from scipy.spatial import distance
+from tqdm import tqdm
+
+COSINE_METHODS = ["cosine", "cosine_exp", "cosine_neg_log"]
+
+# Per-process state of the pool workers, filled by _init_worker
+_worker = {}
+
+
+class DTWEngine:
+    """
+    Score every query against every doc.
+
+    All doc features are concatenated into one matrix placed once in shared memory,
+    and each worker scores a whole query against blocks of docs: distances are computed
+    with one matrix product (or cdist call) per block, and subsequence DTW runs over all
+    docs of a block at once, with two columns of inf separating neighboring docs so that
+    no path crosses a doc boundary.
+    """
+
+    def __init__(
+        self,
+        docs,
+        dist_method="cosine_exp",
+        minmax_norm=True,
+        step_pattern="asymmetric",
+        subsequence=True,
+        max_workers=None,
+        block_frames=50000,
+        **kwargs,
+    ):
+        self.n_docs = len(docs)
+        self.max_workers = max_workers
+        self.config = {
+            "dist_method": dist_method,
+            "minmax_norm": minmax_norm,
+            "step_pattern": step_pattern,
+            "subsequence": subsequence,
+        }
+
+        doc_lens = np.array([len(doc) for doc in docs])
+        doc_offsets = np.concatenate([[0], np.cumsum(doc_lens)])
+        doc_feats = np.concatenate(docs).astype(np.float32)
+        if dist_method in COSINE_METHODS:
+            doc_feats /= np.clip(
+                np.linalg.norm(doc_feats, axis=1, keepdims=True), 1e-9, np.inf
+            )
+
+        # Group consecutive docs into blocks of about block_frames frames
+        blocks, start = [], 0
+        for end in range(1, self.n_docs + 1):
+            if end == self.n_docs or doc_offsets[end + 1] - doc_offsets[start] > block_frames:
+                blocks.append((start, end))
+                start = end
+        self.config["blocks"] = blocks
+        self.config["doc_offsets"] = doc_offsets
+
+        self.shm = SharedMemory(create=True, size=max(doc_feats.nbytes, 1))
+        self.doc_feats = np.ndarray(doc_feats.shape, doc_feats.dtype, buffer=self.shm.buf)
+        self.doc_feats[:] = doc_feats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.shm is not None:
+            self.doc_feats = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def score(self, queries):
+        """Return a (n_queries, n_docs) array, higher means more likely to contain the query."""
+        scores = np.zeros((len(queries), self.n_docs))
+        initargs = (
+            self.shm.name,
+            self.doc_feats.shape,
+            self.doc_feats.dtype,
+            self.config,
+        )
+        with Pool(self.max_workers, _init_worker, initargs) as pool:
+            jobs = pool.imap(_score_query, enumerate(queries))
+            for query_id, query_scores in tqdm(
+                jobs, total=len(queries), ncols=0, desc="DTW"
+            ):
+                scores[query_id] = query_scores
+        return scores
+
+
+def _init_worker(shm_name, shape, dtype, config):
+    shm = SharedMemory(name=shm_name)
+    _worker["shm"] = shm
+    _worker["doc_feats"] = np.ndarray(shape, dtype, buffer=shm.buf)
+    _worker["config"] = config
+
+
+def _score_query(args):
+    query_id, query = args
+    return query_id, score_query(query, _worker["doc_feats"], **_worker["config"])
+
+
+def score_query(
+    query,
+    doc_feats,
+    doc_offsets,
+    blocks,
+    dist_method,
+    minmax_norm,
+    step_pattern,
+    subsequence,
+):
+    """Score one query against all docs, doc_feats is normalized for cosine methods."""
+    n_docs = len(doc_offsets) - 1
+    scores = np.zeros(n_docs)
+    if len(query) < 5:  # Do not consider too short queries
+        return scores
+
+    if dist_method in COSINE_METHODS:
+        query = query / np.clip(
+            np.linalg.norm(query, axis=1, keepdims=True), 1e-9, np.inf
+        )
+
+    for start, end in blocks:
+        frame_start, frame_end = doc_offsets[start], doc_offsets[end]
+        dist = block_distance(query, doc_feats[frame_start:frame_end], dist_method)
+        seg_starts = doc_offsets[start:end] - frame_start
+
+        if minmax_norm:
+            dist_min = np.minimum.reduceat(dist, seg_starts, axis=1)
+            dist_max = np.maximum.reduceat(dist, seg_starts, axis=1)
+            seg_lens = np.diff(doc_offsets[start : end + 1])
+            dist_min = np.repeat(dist_min, seg_lens, axis=1)
+            dist_max = np.repeat(dist_max, seg_lens, axis=1)
+            dist = (dist - dist_min) / np.clip(dist_max - dist_min, 1e-9, np.inf)
+
+        if step_pattern == "asymmetric" and subsequence:
+            costs = subsequence_dtw(dist, seg_starts)
+        else:
+            dtwrc = {
+                "step_pattern": step_pattern,
+                "keep_internals": False,
+                "distance_only": not subsequence,
+                "open_begin": subsequence,
+                "open_end": subsequence,
+            }
+            seg_ends = doc_offsets[start + 1 : end + 1] - frame_start
+            costs = [
+                dtw(x=dist[:, seg_start:seg_end], **dtwrc).normalizedDistance
+                for seg_start, seg_end in zip(seg_starts, seg_ends)
+            ]
+        scores[start:end] = -1 * np.asarray(costs)
+
+    return scores
+
+
+def block_distance(query, docs, dist_method):
+    """Distance matrix between a query and concatenated docs, cosine methods expect normalized inputs."""
+    if dist_method not in COSINE_METHODS:
+        return distance.cdist(query, docs, metric=dist_method)
+
+    dist = 1.0 - np.matmul(query, docs.T).astype(np.float64)
+    if dist_method == "cosine_exp":
+        dist = np.exp(dist) - 1
+    elif dist_method == "cosine_neg_log":
+        dist = -1 * np.log(1 - dist)
+    return dist
+
+
+def subsequence_dtw(dist, seg_starts):
+    """
+    Open-begin, open-end DTW with the asymmetric step pattern, for concatenated docs.
+
+    Equivalent to dtw-python's normalizedDistance for each doc: every row advances one query
+    frame from (i-1, j), (i-1, j-1) or (i-1, j-2), and the cost is normalized by the query length.
+    """
+    n_frames, n_cols = dist.shape
+    n_docs = len(seg_starts)
+
+    # Each doc is followed by two inf columns, which the widest (i-1, j-2) step cannot jump over
+    cols = np.arange(n_cols) + 2 * np.repeat(
+        np.arange(n_docs), np.diff(np.append(seg_starts, n_cols))
+    )
+    padded = np.full((n_frames, n_cols + 2 * n_docs), np.inf)
+    padded[:, cols] = dist
+
+    prev = np.zeros(padded.shape[1])
+    for i in range(n_frames):
+        cur = prev.copy()
+        np.minimum(cur[1:], prev[:-1], out=cur[1:])
+        np.minimum(cur[2:], prev[:-2], out=cur[2:])
+        cur += padded[i]
+        prev = cur
+
+    return np.minimum.reduceat(prev[cols], seg_starts) / n_frames
@@ -1,8 +1,6 @@
 """Downstream expert for Query-by-Example Spoken Term Detection on QUESST 2014."""
 
 from collections import defaultdict
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from functools import partial
 from pathlib import Path
 
 import numpy as np
@@ -12,9 +10,9 @@ from dtw import dtw
 from lxml import etree
 from scipy.spatial import distance
 from torch.utils.data import DataLoader
-from tqdm import tqdm
 
 from .dataset import QUESST14Dataset
+from .dtw_engine import DTWEngine
 
 
 class DownstreamExpert(nn.Module):
@@ -95,49 +93,18 @@ class DownstreamExpert(nn.Module):
         queries = [((query - feature_mean) / feature_std).numpy() for query in queries]
         docs = [((doc - feature_mean) / feature_std).numpy() for doc in docs]
 
-        # Define distance function for DTW
-        if self.dtwrc["dist_method"] == "cosine_exp":
-            dist_fn = cosine_exp
-        elif self.dtwrc["dist_method"] == "cosine_neg_log":
-            dist_fn = cosine_neg_log
-        else:
-            dist_fn = partial(distance.cdist, metric=self.dtwrc["dist_method"])
-
-        # Define DTW configurations
-        dtwrc = {
-            "step_pattern": self.dtwrc["step_pattern"],
-            "keep_internals": False,
-            "distance_only": False if self.dtwrc["subsequence"] else True,
-            "open_begin": True if self.dtwrc["subsequence"] else False,
-            "open_end": True if self.dtwrc["subsequence"] else False,
+        # Calculate matching scores
+        engine_config = {
+            **self.dtwrc,
+            "max_workers": self.max_workers,
         }
+        with DTWEngine(docs, **engine_config) as engine:
+            scores = engine.score(queries)
 
-        # Calculate matching scores
+        # Too short queries get all-zero scores from the engine
         results = defaultdict(list)
-        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = []
-            for query, query_name in zip(queries, query_names):
-                if len(query) < 5:  # Do not consider too short queries
-                    results[query_name] = [(doc_name, 0) for doc_name in doc_names]
-                    continue
-                for doc, doc_name in zip(docs, doc_names):
-                    futures.append(
-                        executor.submit(
-                            match,
-                            query,
-                            doc,
-                            query_name,
-                            doc_name,
-                            dist_fn,
-                            self.dtwrc["minmax_norm"],
-                            dtwrc,
-                        )
-                    )
-            for future in tqdm(
-                as_completed(futures), total=len(futures), ncols=0, desc="DTW"
-            ):
-                query_name, doc_name, score = future.result()
-                results[query_name].append((doc_name, score))
+        for query_name, query_scores in zip(query_names, scores):
+            results[query_name] = list(zip(doc_names, query_scores))
 
         # Normalize scores with regard to each query
         for query_name, doc_scores in results.items():
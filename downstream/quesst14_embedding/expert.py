@@ -7,11 +7,11 @@ import torch.nn as nn
 import torch.nn.functional as F
 from torch.utils.data import DataLoader, WeightedRandomSampler
 from lxml import etree
-from tqdm import tqdm
 
 from .quesst14_trainset import QUESST14Trainset
 from .quesst14_testset import QUESST14Testset
 from .model import Model
+from ..similarity_search import MaxSimilaritySearch
 
 
 class DownstreamExpert(nn.Module):
@@ -156,24 +156,13 @@ class DownstreamExpert(nn.Module):
 
             results = {}
 
-            # Calculate matching scores
-            for query_emb, query_name in zip(
-                tqdm(query_embs, desc="Query", ncols=0), query_names
-            ):
-                query_emb = query_emb[0:1].cuda()
-                scores = []
-
-                for doc_emb, doc_name in zip(
-                    tqdm(doc_embs, desc="Doc", ncols=0, leave=False), doc_names
-                ):
-                    with torch.no_grad():
-                        doc_emb = doc_emb.cuda()
-                        similarities = F.cosine_similarity(query_emb, doc_emb)
-                        score = similarities.max().detach().cpu()
-
-                    scores.append(score)
+            # Calculate matching scores of all the queries against all the docs at once
+            search = MaxSimilaritySearch(
+                doc_embs, device="cuda" if torch.cuda.is_available() else "cpu"
+            )
+            all_scores = search.score(torch.stack([emb[0] for emb in query_embs]))
 
-                scores = torch.stack(scores)
+            for scores, query_name in zip(all_scores, query_names):
                 if scores.std() < 0.1:
                     scores = torch.zeros_like(scores)
                 else:
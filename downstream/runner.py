@@ -1,7 +1,6 @@
 import os
 import sys
 import math
-import glob
 import shutil
 import random
 import tempfile
@@ -18,6 +17,9 @@ import hubconf
 from optimizers import get_optimizer
 from schedulers import get_scheduler
 from upstream.interfaces import Featurizer
+from downstream.feature_cache import FeatureCache
+from downstream.prefetch import BatchPrefetcher, PrefetchedWavs
+from utility.checkpoint import CheckpointManager
 from utility.helper import is_leader_process, get_model_state, show, defaultdict
 
 SAMPLE_RATE = 16000
@@ -45,6 +47,7 @@ class Runner():
         self.featurizer = self._get_featurizer()
         self.downstream = self._get_downstream()
         self.all_entries = [self.upstream, self.featurizer, self.downstream]
+        self.feature_cache = self._get_feature_cache()
 
 
     def _load_weight(self, model, name):
@@ -123,6 +126,54 @@ class Runner():
         )
 
 
+    def _get_feature_cache(self):
+        cache_dir = getattr(self.args, 'upstream_feature_cache', None)
+        if cache_dir is None:
+            return None
+
+        if self.upstream.trainable:
+            show('[Runner] - The feature cache is disabled since the upstream is trainable')
+            return None
+
+        return FeatureCache(
+            cache_dir,
+            upstream = self.args.upstream,
+            ckpt = self.args.upstream_ckpt,
+            model_config = self.args.upstream_model_config,
+            feature_selection = self.args.upstream_feature_selection,
+        )
+
+
+    def _prefetch(self, dataloader):
+        if self.config['runner'].get('prefetch', True):
+            return BatchPrefetcher(dataloader, self.args.device)
+        return dataloader
+
+
+    def _to_device(self, wavs):
+        if isinstance(wavs, PrefetchedWavs):
+            return wavs
+        return [torch.FloatTensor(wav).to(self.args.device) for wav in wavs]
+
+
+    def _frozen_upstream_forward(self, wavs):
+        """
+        Args:
+            wavs: the waveforms yielded by the dataloader, or the prefetched ones already on the device
+        """
+        keys = self.feature_cache.get_keys(getattr(wavs, 'host', wavs)) if self.feature_cache else None
+        wavs = self._to_device(wavs)
+
+        features = self.feature_cache.load(keys, self.args.device) if self.feature_cache else None
+        if features is None:
+            with torch.no_grad():
+                features = self.upstream.model(wavs)
+            if self.feature_cache:
+                self.feature_cache.save(keys, wavs, features)
+
+        return wavs, features
+
+
     def _get_optimizer(self, model_params):
         optimizer = get_optimizer(
             model_params, 
@@ -180,6 +231,13 @@ class Runner():
         if is_leader_process():
             logger = SummaryWriter(self.args.expdir)
 
+        # checkpoints are written in background, only the first name holds the payload
+        checkpoint_manager = CheckpointManager(
+            self.args.expdir,
+            self.config['runner']['max_keep'],
+            asynchronous=self.config['runner'].get('async_checkpoint', True),
+        )
+
         # prepare data
         dataloader = self.downstream.model.get_dataloader('train')
 
@@ -188,22 +246,23 @@ class Runner():
         records = defaultdict(list)
         epoch = self.init_ckpt.get('Epoch', 0)
         while pbar.n < pbar.total:
-            if is_initialized():
+            if hasattr(dataloader.batch_sampler, 'set_epoch'):
+                dataloader.batch_sampler.set_epoch(epoch)
+            elif is_initialized():
                 dataloader.sampler.set_epoch(epoch)
 
-            for batch_id, (wavs, *others) in enumerate(tqdm(dataloader, dynamic_ncols=True, desc='train', file=tqdm_file)):
+            for batch_id, (wavs, *others) in enumerate(tqdm(self._prefetch(dataloader), dynamic_ncols=True, desc='train', file=tqdm_file)):
                 # try/except block for forward/backward
                 try:
                     if pbar.n >= pbar.total:
                         break
                     global_step = pbar.n + 1
 
-                    wavs = [torch.FloatTensor(wav).to(self.args.device) for wav in wavs]
                     if self.upstream.trainable:
+                        wavs = self._to_device(wavs)
                         features = self.upstream.model(wavs)
                     else:
-                        with torch.no_grad():
-                            features = self.upstream.model(wavs)
+                        wavs, features = self._frozen_upstream_forward(wavs)
                     features = self.featurizer.model(wavs, features)
 
                     if specaug:
@@ -278,14 +337,6 @@ class Runner():
                         save_names += self.evaluate(split, logger, global_step)
 
                 if global_step % self.config['runner']['save_step'] == 0:
-                    def check_ckpt_num(directory):
-                        max_keep = self.config['runner']['max_keep']
-                        ckpt_pths = glob.glob(f'{directory}/states-*.ckpt')
-                        if len(ckpt_pths) >= max_keep:
-                            ckpt_pths = sorted(ckpt_pths, key=lambda pth: int(pth.split('-')[-1].split('.')[0]))
-                            for ckpt_pth in ckpt_pths[:len(ckpt_pths) - max_keep + 1]:
-                                os.remove(ckpt_pth)
-                    check_ckpt_num(self.args.expdir)
                     save_names.append(f'states-{global_step}.ckpt')
 
                 if len(save_names) > 0:
@@ -307,18 +358,20 @@ class Runner():
                     if is_initialized():
                         all_states['WorldSize'] = get_world_size()
 
-                    save_paths = [os.path.join(self.args.expdir, name) for name in save_names]
+                    save_paths = checkpoint_manager.save(all_states, save_names)
                     tqdm.write(f'[Runner] - Save the checkpoint to:')
                     for i, path in enumerate(save_paths):
                         tqdm.write(f'{i + 1}. {path}')
-                        torch.save(all_states, path)
 
                 pbar.update(1)
             epoch += 1
 
         pbar.close()
+        checkpoint_manager.close()
         if is_leader_process():
             logger.close()
+        if self.feature_cache:
+            self.feature_cache.close()
 
 
     def evaluate(self, split=None, logger=None, global_step=0):
@@ -351,11 +404,16 @@ class Runner():
 
         batch_ids = []
         records = defaultdict(list)
-        for batch_id, (wavs, *others) in enumerate(tqdm(dataloader, dynamic_ncols=True, desc=split)):
+        for batch_id, (wavs, *others) in enumerate(tqdm(self._prefetch(dataloader), dynamic_ncols=True, desc=split)):
+
+            if self.upstream.trainable:
+                wavs = self._to_device(wavs)
+                with torch.no_grad():
+                    features = self.upstream.model(wavs)
+            else:
+                wavs, features = self._frozen_upstream_forward(wavs)
 
-            wavs = [torch.FloatTensor(wav).to(self.args.device) for wav in wavs]
             with torch.no_grad():
-                features = self.upstream.model(wavs)
                 features = self.featurizer.model(wavs, features)
                 self.downstream.model(
                     split,
@@ -0,0 +1,118 @@
+import os
+import math
+import random
+import logging
+from typing import List
+
+import pandas as pd
+from torch.utils.data import Sampler
+from torch.distributed import is_initialized, get_rank, get_world_size
+
+
+def read_bucket_lengths(bucket_file, splits):
+    """
+    Read the length tables generated by preprocess/generate_len_for_bucket.py
+
+    Return:
+        file_paths: list of relative file paths
+        lengths: list of numbers of samples
+    """
+    tables = []
+    for split in splits:
+        file_path = os.path.join(bucket_file, split + '.csv')
+        if os.path.exists(file_path):
+            tables.append(pd.read_csv(file_path))
+        else:
+            logging.warning(f'{split} is not found in bucket_file: {bucket_file}, skipping it.')
+
+    assert len(tables) > 0, f'0 data found for {splits} in {bucket_file}'
+    table = pd.concat(tables)
+    return table['file_path'].tolist(), table['length'].tolist()
+
+
+class DynamicBatchSampler(Sampler):
+    """
+    A batch sampler grouping utterances of similar lengths, where each batch is limited by the
+    total number of padded samples instead of a fixed batch size.
+
+    Used as the `batch_sampler` of a DataLoader. Like DistributedSampler, every replica gets the
+    same number of batches and `set_epoch` should be called at the beginning of each epoch to
+    reshuffle the buckets.
+    """
+    def __init__(self, lengths: List[int], max_samples: int, max_batch_size: int = None,
+                 shuffle: bool = True, num_replicas: int = None, rank: int = None, seed: int = 0,
+                 drop_last: bool = False):
+        """
+        Args:
+            lengths: the length (eg. number of samples) of each item in the dataset
+            max_samples: the budget of max(lengths in a batch) * batch_size
+            max_batch_size: optional upper bound of the number of items in a batch
+        """
+        if num_replicas is None:
+            num_replicas = get_world_size() if is_initialized() else 1
+        if rank is None:
+            rank = get_rank() if is_initialized() else 0
+
+        self.lengths = lengths
+        self.max_samples = max_samples
+        self.max_batch_size = max_batch_size
+        self.shuffle = shuffle
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.seed = seed
+        self.drop_last = drop_last
+        self.epoch = 0
+
+        # the batch boundaries only depend on lengths, the shuffling below preserves their number
+        self.num_batches = len(self._make_batches(sorted(range(len(lengths)), key=lambda i: lengths[i])))
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _make_batches(self, indices):
+        batches = []
+        batch, batch_max_len = [], 0
+        for index in indices:
+            max_len = max(batch_max_len, self.lengths[index])
+            full = (
+                max_len * (len(batch) + 1) > self.max_samples
+                or (self.max_batch_size is not None and len(batch) >= self.max_batch_size)
+            )
+            if len(batch) > 0 and full:
+                batches.append(batch)
+                batch, max_len = [], self.lengths[index]
+            batch.append(index)
+            batch_max_len = max_len
+        if len(batch) > 0:
+            batches.append(batch)
+        return batches
+
+    def _get_replica_batches(self):
+        rng = random.Random(self.seed + self.epoch)
+        indices = list(range(len(self.lengths)))
+        if self.shuffle:
+            # break ties randomly so that equal-length items are grouped differently every epoch
+            rng.shuffle(indices)
+        indices.sort(key=lambda i: self.lengths[i])
+
+        batches = self._make_batches(indices)
+        if self.shuffle:
+            rng.shuffle(batches)
+
+        if self.drop_last:
+            total = len(batches) // self.num_replicas * self.num_replicas
+            batches = batches[:total]
+        else:
+            # cycle the batches like DistributedSampler, which also covers num_replicas > 2 * len(batches)
+            total = math.ceil(len(batches) / self.num_replicas) * self.num_replicas
+            batches = (batches * math.ceil(total / len(batches)))[:total]
+
+        return batches[self.rank:total:self.num_replicas]
+
+    def __iter__(self):
+        return iter(self._get_replica_batches())
+
+    def __len__(self):
+        if self.drop_last:
+            return self.num_batches // self.num_replicas
+        return math.ceil(self.num_batches / self.num_replicas)
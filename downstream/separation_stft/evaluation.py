@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*- #
+"""*********************************************************************************************"""
+#   FileName     [ evaluation.py ]
+#   Synopsis     [ batched iSTFT and background metric computation for separation / enhancement ]
+#   Copyright    [ Copyright(c), Johns Hopkins University ]
+"""*********************************************************************************************"""
+
+###############
+# IMPORTATION #
+###############
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+import torch.fft
+import torch.nn.functional as F
+from asteroid.metrics import get_metrics
+
+
+def get_window(window, win_length, n_fft, device):
+    assert window == 'hann', 'only support Hann window now'
+    # periodic Hann window, the same as librosa's get_window('hann', win_length, fftbins=True)
+    win = torch.hann_window(win_length, device=device)
+    left = (n_fft - win_length) // 2
+    return F.pad(win, (left, n_fft - win_length - left))
+
+
+def batch_istft(stfts, feat_length, wav_length, n_fft, hop_length, win_length, window='hann', center=True):
+    """
+    Reconstruct all the utterances and sources at once with overlap-add, giving the same result
+    as running librosa.istft on each unpadded utterance with length=wav_length[i]
+
+    Args:
+        stfts (tensor): complex STFT with shape [bs, n_srcs, max_T, n_fft // 2 + 1], padded with zeros
+        feat_length (tensor): number of valid frames of each utterance
+        wav_length (tensor): number of samples of each utterance
+
+    Return:
+        tensor with shape [bs, n_srcs, max(wav_length)], padded with zeros
+    """
+    bs, n_srcs, max_T, _ = stfts.shape
+    device = stfts.device
+    win = get_window(window, win_length, n_fft, device)
+
+    # [bs, max_T], padded frames contribute neither signal nor window envelope
+    frame_mask = (torch.arange(max_T, device=device).unsqueeze(0) < feat_length.to(device).unsqueeze(1)).float()
+
+    frames = torch.fft.irfft(stfts, n=n_fft, dim=-1) * win
+    frames = frames * frame_mask[:, None, :, None]
+    out_len = n_fft + hop_length * (max_T - 1)
+
+    def overlap_add(x):
+        # [N, max_T, n_fft] -> [N, out_len]
+        x = F.fold(x.transpose(1, 2), output_size=(1, out_len), kernel_size=(1, n_fft), stride=(1, hop_length))
+        return x.view(x.size(0), -1)
+
+    signal = overlap_add(frames.reshape(bs * n_srcs, max_T, n_fft)).view(bs, n_srcs, out_len)
+    envelope = overlap_add(frame_mask.unsqueeze(-1) * (win ** 2)).view(bs, 1, out_len)
+    signal = torch.where(envelope > 1e-11, signal / envelope.clamp(min=1e-11), signal)
+
+    start = n_fft // 2 if center else 0
+    max_len = int(max(wav_length))
+    signal = signal[:, :, start:start + max_len]
+    if signal.size(-1) < max_len:
+        signal = F.pad(signal, (0, max_len - signal.size(-1)))
+
+    wav_mask = torch.arange(max_len, device=device).unsqueeze(0) < wav_length.to(device).unsqueeze(1)
+    return signal * wav_mask.unsqueeze(1)
+
+
+def compute_improvements(mix, refs, ests, sample_rate, metrics_list, compute_permutation):
+    """Improvement of each metric over the mixture for one utterance, run in the metric workers"""
+    utt_metrics = get_metrics(
+        mix,
+        refs,
+        ests,
+        sample_rate = sample_rate,
+        metrics_list = metrics_list,
+        compute_permutation = compute_permutation,
+    )
+    improvements = {}
+    for metric in metrics_list:
+        input_metric = "input_" + metric
+        assert metric in utt_metrics and input_metric in utt_metrics
+        improvements[metric] = utt_metrics[metric] - utt_metrics[input_metric]
+    return improvements
+
+
+class MetricWorkers(object):
+    """
+    Compute the metrics of each utterance in a process pool, so that PESQ/STOI/SI-SDR
+    overlap with the forward of the following batches instead of blocking it
+    """
+    def __init__(self, sample_rate, metrics_list, compute_permutation, max_workers=None):
+        self.sample_rate = sample_rate
+        self.metrics_list = metrics_list
+        self.compute_permutation = compute_permutation
+        self.max_workers = max_workers
+        self.executor = None
+
+    def submit(self, mix, refs, ests):
+        """
+        Args:
+            mix (ndarray): [1, T]
+            refs, ests (ndarray): [n_srcs, T]
+        """
+        if self.executor is None:
+            # spawn instead of fork since the parent process holds CUDA contexts
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return self.executor.submit(
+            compute_improvements, mix, refs, ests,
+            self.sample_rate, self.metrics_list, self.compute_permutation,
+        )
+
+    def close(self):
+        """Shut down the worker processes, they are spawned again by the next submit"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def gather(self, futures):
+        """
+        Return dict(metric -> list of improvements), in the order of submission.
+        The worker processes are shut down afterwards, as the evaluation is over.
+        """
+        results = {}
+        for future in futures:
+            for metric, value in future.result().items():
+                results.setdefault(metric, []).append(value)
+        self.close()
+        return results
@@ -27,9 +27,10 @@ import torch.nn.functional as F
 
 # -------------#
 from .model import SepRNN
-from .dataset import SeparationDataset
-from asteroid.metrics import get_metrics
+from .dataset import SeparationDataset, CachedSeparationDataset
 from .loss import MSELoss, SISDRLoss
+from .evaluation import batch_istft, MetricWorkers
+from .stft_cache import get_cache_dir
 
 device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
 
@@ -66,39 +67,9 @@ class DownstreamExpert(nn.Module):
         self.loaderrc = downstream_expert["loaderrc"]
         self.modelrc = downstream_expert["modelrc"]
 
-        self.train_dataset = SeparationDataset(
-                data_dir=self.loaderrc["train_dir"],
-                rate=self.datarc['rate'],
-                src=self.datarc['src'],
-                tgt=self.datarc['tgt'],
-                n_fft=self.datarc['n_fft'],
-                hop_length=self.upstream_rate,
-                win_length=self.datarc['win_length'],
-                window=self.datarc['window'],
-                center=self.datarc['center'],
-            )
-        self.dev_dataset = SeparationDataset(
-                data_dir=self.loaderrc["dev_dir"],
-                rate=self.datarc['rate'],
-                src=self.datarc['src'],
-                tgt=self.datarc['tgt'],
-                n_fft=self.datarc['n_fft'],
-                hop_length=self.upstream_rate,
-                win_length=self.datarc['win_length'],
-                window=self.datarc['window'],
-                center=self.datarc['center'],
-        )
-        self.test_dataset = SeparationDataset(
-                data_dir=self.loaderrc["test_dir"],
-                rate=self.datarc['rate'],
-                src=self.datarc['src'],
-                tgt=self.datarc['tgt'],
-                n_fft=self.datarc['n_fft'],
-                hop_length=self.upstream_rate,
-                win_length=self.datarc['win_length'],
-                window=self.datarc['window'],
-                center=self.datarc['center'],
-        )
+        self.train_dataset = self._get_dataset(self.loaderrc["train_dir"])
+        self.dev_dataset = self._get_dataset(self.loaderrc["dev_dir"])
+        self.test_dataset = self._get_dataset(self.loaderrc["test_dir"])
 
         if self.modelrc["model"] == "SepRNN":
             self.model = SepRNN(
@@ -130,6 +101,36 @@ class DownstreamExpert(nn.Module):
         
         self.register_buffer("best_score", torch.ones(1) * -10000)
 
+        # metrics of dev/test utterances are computed in background processes
+        self.metric_workers = MetricWorkers(
+            sample_rate=self.datarc['rate'],
+            metrics_list=COMPUTE_METRICS,
+            compute_permutation=True,
+            max_workers=self.loaderrc.get('metric_workers'),
+        )
+
+    def _get_dataset(self, data_dir):
+        dataset_args = dict(
+            data_dir=data_dir,
+            rate=self.datarc['rate'],
+            src=self.datarc['src'],
+            tgt=self.datarc['tgt'],
+            n_fft=self.datarc['n_fft'],
+            hop_length=self.upstream_rate,
+            win_length=self.datarc['win_length'],
+            window=self.datarc['window'],
+            center=self.datarc['center'],
+        )
+        cache_dir = self.datarc.get('stft_cache_dir')
+        if cache_dir is None:
+            return SeparationDataset(**dataset_args)
+
+        return CachedSeparationDataset(
+            cache_dir=get_cache_dir(cache_dir, data_dir, self.upstream_rate),
+            num_workers=self.loaderrc["num_workers"],
+            **dataset_args,
+        )
+
     def _get_train_dataloader(self, dataset):
         return DataLoader(
             dataset,
@@ -232,43 +233,35 @@ class DownstreamExpert(nn.Module):
 
         # evaluate the separation quality of predict sources
         if mode == 'dev' or mode == 'test':
-            predict_stfts = [torch.squeeze(m * source_attr['stft'].to(device)) for m in mask]
-            predict_stfts_np = [np.transpose(s.data.cpu().numpy()) for s in predict_stfts]
-
-            assert len(wav_length) == 1
-            # reconstruct the signal using iSTFT
-            predict_srcs_np = [librosa.istft(stft_mat, 
+            # reconstruct all the sources of the padded batch at once using iSTFT
+            predict_stfts = torch.stack([m * source_attr['stft'].to(m.device) for m in mask], dim=1)
+            predict_srcs = batch_istft(predict_stfts,
+                feat_length=torch.as_tensor(feat_length),
+                wav_length=torch.as_tensor(wav_length),
+                n_fft=self.datarc['n_fft'],
                 hop_length=self.upstream_rate,
-                win_length=self.datarc['win_length'], 
-                window=self.datarc['window'], 
-                center=self.datarc['center'],
-                length=wav_length[0]) for stft_mat in predict_stfts_np]
-            predict_srcs_np = np.stack(predict_srcs_np, 0)
-            gt_srcs_np = torch.cat(target_wav_list, 0).data.cpu().numpy()
+                win_length=self.datarc['win_length'],
+                window=self.datarc['window'],
+                center=self.datarc['center'])
+            predict_srcs_np = predict_srcs.data.cpu().numpy()
+            gt_srcs_np = torch.stack(target_wav_list, 1).data.cpu().numpy()
             mix_np = source_wav.data.cpu().numpy()
 
-            utt_metrics = get_metrics(
-                mix_np,
-                gt_srcs_np,
-                predict_srcs_np,
-                sample_rate = self.datarc['rate'],
-                metrics_list = COMPUTE_METRICS,
-                compute_permutation=True,
-            )
-
-            for metric in COMPUTE_METRICS:
-                input_metric = "input_" + metric
-                assert metric in utt_metrics and input_metric in utt_metrics
-                imp = utt_metrics[metric] - utt_metrics[input_metric]
-                if metric not in records:
-                    records[metric] = []
-                records[metric].append(imp)
+            # the metrics are gathered in self.log_records, overlapping with the following batches
+            for i in range(len(wav_length)):
+                length = int(wav_length[i])
+                records['metric_futures'].append(self.metric_workers.submit(
+                    mix_np[i:i+1, :length],
+                    gt_srcs_np[i, :, :length],
+                    predict_srcs_np[i, :, :length],
+                ))
 
             assert 'batch_id' in kwargs
-            if kwargs['batch_id'] % 1000 == 0: # Save the prediction every 1000 examples
-                records['mix'].append(mix_np)
-                records['hypo'].append(predict_srcs_np)
-                records['ref'].append(gt_srcs_np)
+            if kwargs['batch_id'] % 1000 == 0: # Save the prediction every 1000 batches
+                length = int(wav_length[0])
+                records['mix'].append(mix_np[0:1, :length])
+                records['hypo'].append(predict_srcs_np[0, :, :length])
+                records['ref'].append(gt_srcs_np[0, :, :length])
                 records['uttname'].append(uttname_list[0])
 
         if self.loss_type == "MSE": # mean square loss
@@ -329,6 +322,7 @@ class DownstreamExpert(nn.Module):
             logger.add_scalar(
                 f"separation_stft/{mode}-loss", avg_loss, global_step=global_step
             )
+            records.update(self.metric_workers.gather(records.pop('metric_futures', [])))
             for metric in COMPUTE_METRICS:
                 avg_metric = np.mean(records[metric])
                 if mode == "test" or mode == "dev":
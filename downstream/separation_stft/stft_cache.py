@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*- #
+"""*********************************************************************************************"""
+#   FileName     [ stft_cache.py ]
+#   Synopsis     [ precomputed waveforms and STFT features of LibriMix in memory-mapped arrays ]
+#   Copyright    [ Copyright(c), Johns Hopkins University ]
+"""*********************************************************************************************"""
+
+
+###############
+# IMPORTATION #
+###############
+import os
+import json
+import hashlib
+
+import numpy as np
+import torch
+from torch.distributed import is_initialized
+from torch.utils.data import DataLoader
+from tqdm import tqdm
+
+from utility.helper import is_leader_process
+
+
+WAV_DTYPE = np.float32
+STFT_DTYPE = np.complex64
+
+
+def _unbatch(batch):
+    return batch[0]
+
+
+def get_cache_dir(cache_root, data_dir, hop_length):
+    """
+    One cache per data directory and hop length (the upstream rate), the hash of the absolute
+    data_dir tells apart the splits of the same name from different LibriMix roots
+    """
+    data_dir = os.path.abspath(data_dir)
+    split = os.path.basename(os.path.normpath(data_dir))
+    data_hash = hashlib.md5(data_dir.encode()).hexdigest()[:8]
+    return os.path.join(cache_root, f'{split}-{data_hash}-hop{hop_length}')
+
+
+class STFTCache(object):
+    """
+    For each condition in src + tgt, the samples and the complex STFT of all utterances are
+    concatenated into {cond}.wav.bin and {cond}.stft.bin. {cond}.index.npy holds
+    [wav_start, wav_len, frame_start, frame_len] per utterance, in the order of recolist.txt.
+    config.json is written last and marks a complete cache.
+    """
+    def __init__(self, cache_dir, conds, config):
+        """
+        Args:
+            cache_dir (str): directory of the cache of one data split
+            conds (list(str)): conditions to cache, eg. ['mix_clean', 's1', 's2']
+            config (dict): STFT parameters, the cache is rebuilt if they change
+        """
+        self.cache_dir = cache_dir
+        self.conds = conds
+        self.config = dict(config, conds=conds)
+        self.n_bins = config['n_fft'] // 2 + 1
+        self.arrays = None
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def is_complete(self, recolist):
+        if not os.path.isfile(self._path('config.json')):
+            return False
+        with open(self._path('config.json'), 'r') as fp:
+            if json.load(fp) != self.config:
+                return False
+        with open(self._path('recolist.txt'), 'r') as fp:
+            cached = set(fp.read().splitlines())
+        return all(reco in cached for reco in recolist)
+
+    def build(self, dataset, num_workers=4):
+        """
+        Args:
+            dataset: SeparationDataset, whose __getitem__ decodes the audios and computes the STFT
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if os.path.isfile(self._path('config.json')):
+            os.remove(self._path('config.json'))
+
+        # each item is computed once by the dataloader workers and appended to the files sequentially
+        loader = DataLoader(dataset, batch_size=1, shuffle=False, num_workers=num_workers, collate_fn=_unbatch)
+        files = {cond: (open(self._path(f'{cond}.wav.bin'), 'wb'), open(self._path(f'{cond}.stft.bin'), 'wb')) for cond in self.conds}
+        index = {cond: [] for cond in self.conds}
+        offsets = {cond: [0, 0] for cond in self.conds}
+        recolist = []
+        for reco, src_samp, src_feat, tgt_samp_list, tgt_feat_list in tqdm(loader, desc=f'Cache STFT {self.cache_dir}'):
+            recolist.append(reco)
+            for cond, samp, feat in zip(self.conds, [src_samp] + tgt_samp_list, [src_feat] + tgt_feat_list):
+                wav_fp, stft_fp = files[cond]
+                wav_fp.write(np.ascontiguousarray(samp, dtype=WAV_DTYPE).tobytes())
+                stft_fp.write(np.ascontiguousarray(feat, dtype=STFT_DTYPE).tobytes())
+                wav_start, frame_start = offsets[cond]
+                index[cond].append([wav_start, len(samp), frame_start, len(feat)])
+                offsets[cond] = [wav_start + len(samp), frame_start + len(feat)]
+
+        for cond in self.conds:
+            for fp in files[cond]:
+                fp.close()
+            np.save(self._path(f'{cond}.index.npy'), np.array(index[cond], dtype=np.int64))
+        with open(self._path('recolist.txt'), 'w') as fp:
+            fp.write('\n'.join(recolist) + '\n')
+        with open(self._path('config.json'), 'w') as fp:
+            json.dump(self.config, fp)
+
+    def prepare(self, dataset, num_workers=4):
+        """Build the cache of dataset if incomplete, only on the leader process while the others wait"""
+        if self.is_complete(dataset.recolist):
+            return
+        if is_leader_process():
+            self.build(dataset, num_workers)
+        if is_initialized():
+            torch.distributed.barrier()
+
+    def _open(self):
+        # memmaps are opened lazily, in each dataloader worker, instead of being pickled into them
+        with open(self._path('recolist.txt'), 'r') as fp:
+            self.reco2idx = {reco: i for i, reco in enumerate(fp.read().splitlines())}
+        self.arrays = {}
+        for cond in self.conds:
+            self.arrays[cond] = (
+                np.memmap(self._path(f'{cond}.wav.bin'), dtype=WAV_DTYPE, mode='r'),
+                np.memmap(self._path(f'{cond}.stft.bin'), dtype=STFT_DTYPE, mode='r').reshape(-1, self.n_bins),
+                np.load(self._path(f'{cond}.index.npy')),
+            )
+
+    def read(self, reco, cond):
+        """
+        Return:
+            samp (ndarray): audio samples [T, ]
+            feat (ndarray): complex STFT feature map [T1, D]
+        """
+        if self.arrays is None:
+            self._open()
+        wavs, stfts, index = self.arrays[cond]
+        wav_start, wav_len, frame_start, frame_len = index[self.reco2idx[reco]]
+        return np.array(wavs[wav_start:wav_start + wav_len]), np.array(stfts[frame_start:frame_start + frame_len])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['arrays'] = None
+        return state
@@ -0,0 +1,75 @@
+"""
+Max cosine similarity between queries and documents made of several segment embeddings,
+shared by the query-by-example spoken term detection tasks.
+"""
+
+import torch
+import torch.nn.functional as F
+
+
+def segment_index(lengths):
+    """
+    Args:
+        lengths: (n_docs, ) number of segments of each doc, stored contiguously
+
+    Return:
+        index: (n_docs, max_len) position of each segment in the packed matrix
+        valid: (n_docs, max_len) bool tensor, False for the padding
+    """
+    offsets = torch.cumsum(lengths, dim=0) - lengths
+    positions = torch.arange(int(lengths.max()), device=lengths.device).unsqueeze(0)
+    valid = positions < lengths.unsqueeze(1)
+    index = torch.where(valid, offsets.unsqueeze(1) + positions, torch.zeros_like(positions))
+    return index, valid
+
+
+class MaxSimilaritySearch:
+    """
+    All the doc segment embeddings are L2-normalized and packed into matrices of at most
+    block_segments rows. Scoring a set of queries is one matmul per block followed by a
+    max over the segments of each doc.
+
+    Args:
+        doc_embs: list of (n_segments, dim) tensors
+        device: where the packed matrices live and the similarities are computed
+        block_segments: number of segments per matmul block
+        query_block: number of queries per matmul block
+    """
+    def __init__(self, doc_embs, device="cpu", block_segments=65536, query_block=1024):
+        self.device = torch.device(device)
+        self.query_block = query_block
+        self.n_docs = len(doc_embs)
+
+        self.blocks = []
+        start = 0
+        while start < self.n_docs:
+            end, n_segments = start, 0
+            while end < self.n_docs and (end == start or n_segments + len(doc_embs[end]) <= block_segments):
+                n_segments += len(doc_embs[end])
+                end += 1
+            matrix = torch.cat([emb.detach().float() for emb in doc_embs[start:end]]).to(self.device)
+            lengths = torch.LongTensor([len(emb) for emb in doc_embs[start:end]]).to(self.device)
+            index, valid = segment_index(lengths)
+            self.blocks.append((F.normalize(matrix, dim=-1), index, valid))
+            start = end
+
+    @torch.no_grad()
+    def score(self, query_embs):
+        """
+        Args:
+            query_embs: (n_queries, dim)
+
+        Return:
+            (n_queries, n_docs) max cosine similarity on CPU
+        """
+        queries = F.normalize(query_embs.detach().float().to(self.device), dim=-1)
+        scores = []
+        for query_start in range(0, len(queries), self.query_block):
+            query = queries[query_start : query_start + self.query_block]
+            block_scores = []
+            for matrix, index, valid in self.blocks:
+                similarities = torch.matmul(query, matrix.t())[:, index]
+                similarities = similarities.masked_fill(~valid, float("-inf"))
+                block_scores.append(similarities.max(dim=-1).values)
+            scores.append(torch.cat(block_scores, dim=1).cpu())
+        return torch.cat(scores, dim=0)
@@ -24,11 +24,27 @@ EFFECTS = [
 ["silence", "1", "0.1", "0.1%", "-1", "0.1", "0.1%"],
 ]
 
+
+def load_wav(path, vad_cache=None):
+    """The waveform after EFFECTS, read from the VADCache when it holds the path"""
+    if vad_cache is not None and path in vad_cache:
+        return vad_cache.read(path)
+    wav, _ = apply_effects_file(path, EFFECTS)
+    return wav.squeeze(0)
+
+
+def get_length(path, vad_cache=None):
+    if vad_cache is not None and path in vad_cache:
+        return vad_cache.length(path)
+    return load_wav(path).shape[0]
+
+
 # Voxceleb 2 Speaker verification
 class SpeakerVerifi_train(Dataset):
-    def __init__(self, vad_config, key_list, file_path, meta_data, max_timestep=None):
+    def __init__(self, vad_config, key_list, file_path, meta_data, max_timestep=None, vad_cache=None):
     
         self.roots = file_path
+        self.vad_cache = vad_cache
         self.root_key = key_list
         self.max_timestep = max_timestep
         self.vad_c = vad_config 
@@ -66,9 +82,7 @@ class SpeakerVerifi_train(Dataset):
                     wav_list=find_files(speaker_dir)
                     speaker_wav_dict[speaker] = []
                     for wav in wav_list:
-                        wav_sample, _ = apply_effects_file(str(speaker_dir/wav), EFFECTS)
-                        wav_sample = wav_sample.squeeze(0)
-                        length = wav_sample.shape[0]
+                        length = get_length(str(speaker_dir/wav), self.vad_cache)
 
                         if length > self.vad_c['min_sec']:
                             utterance_id = "/".join(str(speaker_dir/wav).split("/")[-3:]).replace(".wav","").replace("/","-") 
@@ -113,8 +127,7 @@ class SpeakerVerifi_train(Dataset):
         return len(self.dataset)
     
     def __getitem__(self, idx):
-        wav, _ = apply_effects_file(self.dataset[idx][0], EFFECTS)
-        wav = wav.squeeze(0)
+        wav = load_wav(self.dataset[idx][0], self.vad_cache)
         length = wav.shape[0]
         
         if self.max_timestep !=None:
@@ -130,9 +143,10 @@ class SpeakerVerifi_train(Dataset):
 
 
 class SpeakerVerifi_test(Dataset):
-    def __init__(self, vad_config, file_path, meta_data):
+    def __init__(self, vad_config, file_path, meta_data, vad_cache=None):
         self.root = file_path
         self.meta_data = meta_data
+        self.vad_cache = vad_cache
         self.necessary_dict = self.processing()
         self.vad_c = vad_config 
         self.dataset = self.necessary_dict['pair_table'] 
@@ -159,11 +173,8 @@ class SpeakerVerifi_test(Dataset):
     def __getitem__(self, idx):
         y_label, x1_path, x2_path = self.dataset[idx]
 
-        wav1, _ = apply_effects_file(x1_path, EFFECTS)
-        wav2, _ = apply_effects_file(x2_path, EFFECTS)
-
-        wav1 = wav1.squeeze(0)
-        wav2 = wav2.squeeze(0)
+        wav1 = load_wav(x1_path, self.vad_cache)
+        wav2 = load_wav(x2_path, self.vad_cache)
 
         length1 = wav1.shape[0]
         length2 = wav2.shape[0]
@@ -174,3 +185,33 @@ class SpeakerVerifi_test(Dataset):
         wavs1, wavs2, lengths1, lengths2, ylabels = zip(*data_sample)
         all_wavs = wavs1 + wavs2
         return all_wavs, None, ylabels
+
+
+class SpeakerVerifi_test_utterance(SpeakerVerifi_test):
+    """
+    Iterate over the unique utterances in the trial list instead of the trial pairs,
+    so that each utterance is processed once no matter how many trials it appears in.
+    Trials are then scored from the extracted embeddings by indexing with self.trials.
+    """
+    def __init__(self, vad_config, file_path, meta_data, vad_cache=None):
+        super().__init__(vad_config, file_path, meta_data, vad_cache)
+        self.utterances = sorted(set(
+            path for _, x1_path, x2_path in self.dataset for path in [x1_path, x2_path]
+        ))
+        utterance2idx = {path: idx for idx, path in enumerate(self.utterances)}
+        # [[label, utterance_idx1, utterance_idx2], ...]
+        self.trials = [
+            [int(y_label[0]), utterance2idx[x1_path], utterance2idx[x2_path]]
+            for y_label, x1_path, x2_path in self.dataset
+        ]
+
+    def __len__(self):
+        return len(self.utterances)
+
+    def __getitem__(self, idx):
+        wav = load_wav(self.utterances[idx], self.vad_cache)
+        return wav.numpy(), idx
+
+    def collate_fn(self, data_sample):
+        wavs, utterance_idxs = zip(*data_sample)
+        return wavs, None, utterance_idxs
@@ -24,10 +24,13 @@ import torch.nn as nn
 from torch.nn.utils.rnn import pad_sequence
 from torch.utils.data import DataLoader, DistributedSampler
 from torch.distributed import is_initialized, get_rank, get_world_size
+from librosa.util import find_files
 #-------------#
 from utility.helper import is_leader_process
+from downstream.pooling import lengths_to_mask, mask_to_logits
+from downstream.vad_cache import VADCache
 from .model import Model, AMSoftmaxLoss, SoftmaxLoss, UtteranceExtractor
-from .dataset import SpeakerVerifi_train, SpeakerVerifi_test
+from .dataset import SpeakerVerifi_train, SpeakerVerifi_test, SpeakerVerifi_test_utterance, EFFECTS
 from .utils import EER
 
 
@@ -56,6 +59,7 @@ class DownstreamExpert(nn.Module):
         # dataset
         train_file_path = Path(self.datarc['file_path']) / "dev" / "wav"
         test_file_path = Path(self.datarc['file_path']) / "test" / "wav"
+        vad_cache = self._get_vad_cache([train_file_path, test_file_path])
         
         train_config = {
             "vad_config": self.datarc['vad_config'],
@@ -63,22 +67,29 @@ class DownstreamExpert(nn.Module):
             "key_list": ["Voxceleb1"],
             "meta_data": self.datarc['train_meta_data'],
             "max_timestep": self.datarc["max_timestep"],
+            "vad_cache": vad_cache,
         }
         self.train_dataset = SpeakerVerifi_train(**train_config)
 
         dev_config = {
             "vad_config": self.datarc['vad_config'],
             "file_path": train_file_path, 
-            "meta_data": self.datarc['dev_meta_data']
+            "meta_data": self.datarc['dev_meta_data'],
+            "vad_cache": vad_cache,
         }        
-        self.dev_dataset = SpeakerVerifi_test(**dev_config)
+        # score trials from per-utterance embeddings, each utterance is extracted only once
+        self.eval_by_utterance = self.datarc.get('eval_by_utterance', False)
+        TestDataset = SpeakerVerifi_test_utterance if self.eval_by_utterance else SpeakerVerifi_test
+
+        self.dev_dataset = TestDataset(**dev_config)
 
         test_config = {
             "vad_config": self.datarc['vad_config'],
             "file_path": test_file_path, 
-            "meta_data": self.datarc['test_meta_data']
+            "meta_data": self.datarc['test_meta_data'],
+            "vad_cache": vad_cache,
         }
-        self.test_dataset = SpeakerVerifi_test(**test_config)
+        self.test_dataset = TestDataset(**test_config)
 
         # module
         self.connector = nn.Linear(self.upstream_dim, self.modelrc['input_dim'])
@@ -114,6 +125,21 @@ class DownstreamExpert(nn.Module):
         self.eval_metric = EER
         self.register_buffer('best_score', torch.ones(1) * 100)
 
+    def _get_vad_cache(self, roots):
+        cache_dir = self.datarc.get('vad_cache_dir')
+        if cache_dir is None:
+            return None
+
+        vad_cache = VADCache(cache_dir, EFFECTS)
+        if not vad_cache.is_complete():
+            if is_leader_process():
+                paths = [path for root in roots for path in find_files(str(root))]
+                vad_cache.build(paths, self.datarc.get('vad_cache_workers'))
+            if is_initialized():
+                torch.distributed.barrier()
+            vad_cache = VADCache(cache_dir, EFFECTS)
+        return vad_cache
+
     # Interface
     def get_dataloader(self, mode):
         """
@@ -199,15 +225,13 @@ class DownstreamExpert(nn.Module):
         """
 
         features_pad = pad_sequence(features, batch_first=True)
-        
+        features_len = torch.LongTensor([len(feature) for feature in features])
+
         if self.modelrc['module'] == "XVector":
             # TDNN layers in XVector will decrease the total sequence length by fixed 14
-            attention_mask = [torch.ones((feature.shape[0] - 14)) for feature in features]
-        else:
-            attention_mask = [torch.ones((feature.shape[0])) for feature in features]
+            features_len = features_len - 14
 
-        attention_mask_pad = pad_sequence(attention_mask,batch_first=True)
-        attention_mask_pad = (1.0 - attention_mask_pad) * -100000.0
+        attention_mask_pad = mask_to_logits(lengths_to_mask(features_len))
 
         features_pad = self.connector(features_pad)
 
@@ -222,6 +246,12 @@ class DownstreamExpert(nn.Module):
             agg_vec = self.model.inference(features_pad, attention_mask_pad.cuda())
             agg_vec = agg_vec / (torch.norm(agg_vec, dim=-1).unsqueeze(-1))
 
+            if self.eval_by_utterance:
+                # labels are the utterance indices, trials are scored in log_records
+                records['embeddings'].append(agg_vec.detach().cpu())
+                records['utterance_idxs'].extend(labels)
+                return torch.tensor(0)
+
             # separate batched data to pair data.
             vec1, vec2 = self.separate_data(agg_vec)
 
@@ -258,6 +288,9 @@ class DownstreamExpert(nn.Module):
             print(f'sv-voxceleb1/{mode}-loss: {loss}')
 
         elif mode in ['dev', 'test']:
+            if self.eval_by_utterance:
+                records['scores'], records['labels'] = self.score_trials(mode, records)
+
             err, *others = self.eval_metric(np.array(records['labels']), np.array(records['scores']))
             logger.add_scalar(f'sv-voxceleb1/{mode}-EER', err, global_step=global_step)
             print(f'sv-voxceleb1/{mode}-ERR: {err}')
@@ -268,6 +301,20 @@ class DownstreamExpert(nn.Module):
 
         return save_names
 
+    def score_trials(self, mode, records):
+        dataset = getattr(self, f'{mode}_dataset')
+        embeddings = torch.cat(records['embeddings'], dim=0)
+        utterance_idxs = torch.LongTensor(records['utterance_idxs'])
+
+        # (utterance_num, hidden_dim), rows ordered by utterance index
+        embedding_table = torch.zeros(len(dataset.utterances), embeddings.size(-1))
+        embedding_table[utterance_idxs] = embeddings
+
+        trials = torch.LongTensor(dataset.trials)
+        # embeddings are already normalized, the dot product is the cosine similarity
+        scores = (embedding_table[trials[:, 1]] * embedding_table[trials[:, 2]]).sum(dim=-1)
+        return scores.tolist(), trials[:, 0].tolist()
+
     def separate_data(self, agg_vec):
         assert len(agg_vec) % 2 == 0
         total_num = len(agg_vec) // 2
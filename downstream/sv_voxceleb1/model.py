@@ -16,6 +16,7 @@ import torch.nn.functional as F
 
 from argparse import Namespace
 from upstream.mockingjay.model import TransformerEncoder
+from downstream.pooling import masked_mean, statistics_pooling, attentive_pooling
 
 #########
 # MODEL #
@@ -48,16 +49,8 @@ class MP(nn.Module):
             feature_BxTxH - [BxTxH]   Acoustic feature with shape 
             att_mask_BxT  - [BxT]     Attention Mask logits
         '''
-        agg_vec_list = []
-        for i in range(len(feature_BxTxH)):
-            if torch.nonzero(att_mask_BxT[i] < 0, as_tuple=False).size(0) == 0:
-                length = len(feature_BxTxH[i])
-            else:
-                length = torch.nonzero(att_mask_BxT[i] < 0, as_tuple=False)[0] + 1
-            agg_vec=torch.mean(feature_BxTxH[i][:length], dim=0)
-            agg_vec_list.append(agg_vec)
-
-        return torch.stack(agg_vec_list)
+        lengths = (att_mask_BxT >= 0).sum(dim=-1)
+        return masked_mean(feature_BxTxH, lengths)
 
 class AP(nn.Module):
     ''' Attentive Pooling module incoporate attention mask'''
@@ -114,9 +107,7 @@ class SP(nn.Module):
 
     def __init__(self, out_dim, input_dim, *kwargs):
         super(SP, self).__init__()
-
-        # Setup
-        self.mp_layer = MP()
+        # no additional parameters
     
     def forward(self, feature_BxTxH, att_mask_BxT):
 
@@ -126,20 +117,8 @@ class SP(nn.Module):
             att_mask- [BxT]     Attention Mask logits
         '''
         #Encode
-        mean_vec = self.mp_layer(feature_BxTxH, att_mask_BxT)
-        variance_vec_list = []
-        for i in range(len(feature_BxTxH)):
-            if torch.nonzero(att_mask_BxT[i] < 0, as_tuple=False).size(0) == 0:
-                length = len(feature_BxTxH[i])
-            else:
-                length = torch.nonzero(att_mask_BxT[i] < 0, as_tuple=False)[0] + 1
-            variances = torch.std(feature_BxTxH[i][:length], dim=-2)
-            variance_vec_list.append(variances)
-        var_vec = torch.stack(variance_vec_list)
-
-        statistic_pooling = torch.cat([mean_vec, var_vec], dim=-1)
-
-        return statistic_pooling
+        lengths = (att_mask_BxT >= 0).sum(dim=-1)
+        return statistics_pooling(feature_BxTxH, lengths)
 
 class AttentivePooling(nn.Module):
     """
@@ -150,7 +129,6 @@ class AttentivePooling(nn.Module):
         self.W_a = nn.Linear(input_dim, input_dim)
         self.W = nn.Linear(input_dim, 1)
         self.act_fn = nn.ReLU()
-        self.softmax = nn.functional.softmax
     def forward(self, batch_rep, att_mask):
         """
         input:
@@ -163,11 +141,8 @@ class AttentivePooling(nn.Module):
         utter_rep: size (B, H)
         """
         att_logits = self.W(self.act_fn(self.W_a(batch_rep))).squeeze(-1)
-        att_logits = att_mask + att_logits
-        att_w = self.softmax(att_logits, dim=-1).unsqueeze(-1)
-        utter_rep = torch.sum(batch_rep * att_w, dim=1)
-
-        return utter_rep, att_w
+        lengths = (att_mask >= 0).sum(dim=-1)
+        return attentive_pooling(batch_rep, att_logits, lengths)
 
 
 # General Interface
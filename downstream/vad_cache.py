@@ -0,0 +1,118 @@
+"""
+One-time cache of the waveforms after the sox effects (resampling, gain and silence removal)
+used by the VoxCeleb speaker tasks.
+
+The processed waveforms are quantized to int16 and appended into sharded memory-mapped files
+with utility.feature_store, keyed by their absolute path. The cache directory also records the
+effects it was built with, and is rebuilt when they change.
+
+For the tasks which only need the lengths after the effects, `lengths_only=True` keeps a
+path -> length table without writing any waveform.
+"""
+
+import os
+import json
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+import tqdm
+import torch
+import numpy as np
+import pandas as pd
+from torchaudio.sox_effects import apply_effects_file
+
+from utility.helper import show
+from utility.feature_store import ShardedFeatureWriter, ShardedFeatureStore
+
+EFFECTS_FILE = 'effects.json'
+LENGTHS_FILE = 'lengths.csv'
+INT16_SCALE = 32768
+
+
+def apply_effects_int16(path, effects):
+    wav, _ = apply_effects_file(path, effects)
+    wav = wav.squeeze(0).numpy()
+    return np.clip(np.round(wav * INT16_SCALE), -INT16_SCALE, INT16_SCALE - 1).astype(np.int16)
+
+
+def apply_effects_length(path, effects):
+    wav, _ = apply_effects_file(path, effects)
+    return wav.shape[-1]
+
+
+class VADCache:
+    """
+    Args:
+        cache_dir: where the shards and the index are written
+        effects: the sox effects chain applied before caching
+        lengths_only: only cache the lengths after the effects, read() is not available
+    """
+    def __init__(self, cache_dir, effects, lengths_only=False):
+        self.cache_dir = cache_dir
+        self.effects = effects
+        self.lengths_only = lengths_only
+        self.store = None
+        self.lengths = None
+        if self.is_complete():
+            self._open()
+
+    def _open(self):
+        if self.lengths_only:
+            df = pd.read_csv(os.path.join(self.cache_dir, LENGTHS_FILE))
+            self.lengths = dict(zip(df['path'], df['length']))
+        else:
+            self.store = ShardedFeatureStore(self.cache_dir)
+
+    def is_complete(self):
+        effects_path = os.path.join(self.cache_dir, EFFECTS_FILE)
+        if self.lengths_only:
+            exists = os.path.isfile(os.path.join(self.cache_dir, LENGTHS_FILE))
+        else:
+            exists = ShardedFeatureStore.exists(self.cache_dir)
+        if not exists or not os.path.isfile(effects_path):
+            return False
+        with open(effects_path, 'r') as handle:
+            return json.load(handle) == self.effects
+
+    def build(self, paths, num_workers=None, shard_size=1024 ** 3):
+        """Apply the effects on all the paths with a process pool and write the results"""
+        paths = sorted(set(os.path.abspath(path) for path in paths))
+        show(f'[VADCache] - Applying the effects on {len(paths)} files into {self.cache_dir}')
+
+        effects_path = os.path.join(self.cache_dir, EFFECTS_FILE)
+        if os.path.isfile(effects_path):
+            os.remove(effects_path)
+        if self.lengths_only:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                lengths = executor.map(partial(apply_effects_length, effects=self.effects), paths, chunksize=64)
+                lengths = list(tqdm.tqdm(lengths, total=len(paths)))
+            pd.DataFrame({'path': paths, 'length': lengths}).to_csv(os.path.join(self.cache_dir, LENGTHS_FILE), index=False)
+        else:
+            writer = ShardedFeatureWriter(self.cache_dir, shard_size, dtype='int16')
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                wavs = executor.map(partial(apply_effects_int16, effects=self.effects), paths, chunksize=64)
+                for path, wav in zip(paths, tqdm.tqdm(wavs, total=len(paths))):
+                    writer.add(path, wav.reshape(-1, 1))
+            writer.close()
+
+        with open(effects_path, 'w') as handle:
+            json.dump(self.effects, handle)
+        self._open()
+
+    def __contains__(self, path):
+        if self.lengths_only:
+            return self.lengths is not None and os.path.abspath(path) in self.lengths
+        return self.store is not None and os.path.abspath(path) in self.store
+
+    def length(self, path):
+        """Number of samples after the effects"""
+        if self.lengths_only:
+            return int(self.lengths[os.path.abspath(path)])
+        return self.store.index[os.path.abspath(path)][2]
+
+    def read(self, path):
+        """Return the processed waveform as a float32 torch.Tensor"""
+        assert not self.lengths_only, 'The waveforms are not cached with lengths_only=True'
+        wav = self.store.read(os.path.abspath(path))[:, 0]
+        return torch.from_numpy(wav.astype(np.float32) / INT16_SCALE)
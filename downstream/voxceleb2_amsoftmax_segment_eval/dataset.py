@@ -21,11 +21,20 @@ EFFECTS = [
 ["silence", "1", "0.1", "0.1%", "-1", "0.1", "0.1%"],
 ]
 
+
+def get_length(path, vad_cache=None):
+    """The number of samples after EFFECTS, read from the VADCache when it holds the path"""
+    if vad_cache is not None and path in vad_cache:
+        return vad_cache.length(path)
+    wav, _ = apply_effects_file(path, EFFECTS)
+    return wav.shape[-1]
+
 # Voxceleb 2 Speaker verification
 class SpeakerVerifi_train(Dataset):
-    def __init__(self, vad_config, file_path, meta_data, max_timestep=None):
+    def __init__(self, vad_config, file_path, meta_data, max_timestep=None, vad_cache=None):
 
         self.roots = file_path
+        self.vad_cache = vad_cache
         self.root_key = list(self.roots.keys())
         self.max_timestep = max_timestep
         self.vad_c = vad_config 
@@ -64,9 +73,7 @@ class SpeakerVerifi_train(Dataset):
 
                     for wav in wav_list:
 
-                        wav, _ = apply_effects_file(str(speaker_dir/wav), EFFECTS)
-                        wav = wav.squeeze(0)
-                        length = wav.shape[0]
+                        length = get_length(str(speaker_dir/wav), self.vad_cache)
 
                         if length > self.vad_c['min_sec']: 
                             self.dataset.append(str(speaker_dir/wav))
@@ -142,12 +149,13 @@ class SpeakerVerifi_train(Dataset):
 
 
 class SpeakerVerifi_dev(Dataset):
-    def __init__(self, vad_config, segment_config, file_path, meta_data):
+    def __init__(self, vad_config, segment_config, file_path, meta_data, vad_cache=None):
 
         self.root = file_path
         self.meta_data = meta_data
         self.segment_config = segment_config
         self.vad_c = vad_config
+        self.vad_cache = vad_cache
         self.pair_dict = self.preprocessing()
 
         cache_path = f"./downstream/voxceleb2_amsoftmax_segment_eval/cache_wav_paths/cache_dev_segment.p"
@@ -168,14 +176,13 @@ class SpeakerVerifi_dev(Dataset):
             label_info = wav_info[0]
             pair_info = wav_info[1]
 
-            wav, _ = apply_effects_file(wav_info[2], EFFECTS)
-            wav = wav.squeeze(0)
+            length = get_length(wav_info[2], self.vad_cache)
 
-            index_end = len(wav) -self.segment_config["window"]
+            index_end = length -self.segment_config["window"]
             segment_num = index_end // self.segment_config['stride']
 
             if index_end < 0:
-                segment_list.append([int(label_info), pair_info, str(utterance_id), segment_num, 0, len(wav), wav_info[2]])
+                segment_list.append([int(label_info), pair_info, str(utterance_id), segment_num, 0, length, wav_info[2]])
             else:
                 for index in range(0, index_end, self.segment_config['stride']):
                     segment_list.append([int(label_info), pair_info, str(utterance_id), segment_num, index, index+self.segment_config['window'], wav_info[2]])
@@ -20,9 +20,13 @@ import torch
 import torch.nn as nn
 from torch.utils.data import DataLoader
 from torch.nn.utils.rnn import pad_sequence
+from torch.distributed import is_initialized
+from librosa.util import find_files
 #-------------#
+from utility.helper import is_leader_process
+from downstream.vad_cache import VADCache
 from .model import Model, AdMSoftmaxLoss, UtteranceModel
-from .dataset import SpeakerVerifi_train, SpeakerVerifi_dev, SpeakerVerifi_test
+from .dataset import SpeakerVerifi_train, SpeakerVerifi_dev, SpeakerVerifi_test, EFFECTS
 from argparse import Namespace
 from .utils import EER, compute_metrics
 
@@ -48,8 +52,11 @@ class DownstreamExpert(nn.Module):
         self.datarc = downstream_expert['datarc']
         self.modelrc = downstream_expert['modelrc']
 
-        self.train_dataset = SpeakerVerifi_train(self.datarc['vad_config'], **self.datarc['train'])
-        self.dev_dataset = SpeakerVerifi_dev(self.datarc['vad_config'], self.datarc["segment_config"], **self.datarc['dev'])
+        # the lengths after the sox effects are read from the cache instead of re-running the effects,
+        # the items are loaded raw so the processed waveforms are not cached
+        vad_cache = self._get_vad_cache(list(self.datarc['train']['file_path'].values()) + [self.datarc['dev']['file_path']])
+        self.train_dataset = SpeakerVerifi_train(self.datarc['vad_config'], **self.datarc['train'], vad_cache=vad_cache)
+        self.dev_dataset = SpeakerVerifi_dev(self.datarc['vad_config'], self.datarc["segment_config"], **self.datarc['dev'], vad_cache=vad_cache)
         self.test_dataset = SpeakerVerifi_test(self.datarc['vad_config'],self.datarc["segment_config"], **self.datarc['test'])
         
         self.connector = nn.Linear(self.upstream_dim, self.modelrc['input_dim'])
@@ -59,6 +66,21 @@ class DownstreamExpert(nn.Module):
         self.score_fn  = nn.CosineSimilarity(dim=-1)
         self.eval_metric = EER
 
+    def _get_vad_cache(self, roots):
+        cache_dir = self.datarc.get('vad_cache_dir')
+        if cache_dir is None:
+            return None
+
+        vad_cache = VADCache(cache_dir, EFFECTS, lengths_only=True)
+        if not vad_cache.is_complete():
+            if is_leader_process():
+                paths = [path for root in roots for path in find_files(str(root))]
+                vad_cache.build(paths, self.datarc.get('vad_cache_workers'))
+            if is_initialized():
+                torch.distributed.barrier()
+            vad_cache = VADCache(cache_dir, EFFECTS, lengths_only=True)
+        return vad_cache
+
     # Interface
     def get_dataloader(self, mode):
         """
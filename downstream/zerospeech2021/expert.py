@@ -1,4 +1,3 @@
-import numpy as np
 import os
 import torch
 
@@ -8,6 +7,7 @@ from torch.nn.utils.rnn import pad_sequence
 
 from .model import Model
 from .dataset import *
+from .export import FeatureWriter
 
 import pandas as pd
 import sys
@@ -80,6 +80,13 @@ class DownstreamExpert(nn.Module):
         elif self.task == 'syntactic':
             pass 
 
+        # features are written in background and converted to text in self.log_records
+        if self.task in ['phonetic', 'semantic']:
+            self.writer = FeatureWriter(
+                precision=self.modelrc[self.task]['precision'],
+                num_workers=self.datarc.get('export_workers', 4),
+            )
+
         '''
         self.model = Model(
             output_class_num=self.datarc['num_class'],
@@ -175,17 +182,14 @@ class DownstreamExpert(nn.Module):
         """
         
         if self.task == 'phonetic':
+            lengths = [len(feature) for feature in features]
             features = pad_sequence(features, batch_first=True)
             features = self.connector(features)
             
             input_paths = your_other_contents1
             output_paths = [os.path.join(self.subdir, '/'.join(path.split('/')[-3:]))[:-4] + '.txt' for path in input_paths]
 
-            for path, feature in zip(output_paths, features):
-                if self.modelrc[self.task]['precision'] == 'None':
-                    np.savetxt(path, np.array(feature.cpu()))
-                else:
-                    np.savetxt(path, np.array(feature.cpu()), fmt='%1.'+str(self.modelrc[self.task]['precision'])+'e')
+            self.writer.submit([feature[:length] for feature, length in zip(features, lengths)], output_paths)
 
             return torch.tensor(0)
 
@@ -193,17 +197,14 @@ class DownstreamExpert(nn.Module):
             pass
 
         elif self.task == 'semantic':
+            lengths = [len(feature) for feature in features]
             features = pad_sequence(features, batch_first=True)
             features = self.connector(features)
             
             input_paths = your_other_contents1
             output_paths = [os.path.join(self.subdir, '/'.join(path.split('/')[-4:]))[:-4] + '.txt' for path in input_paths]
 
-            for path, feature in zip(output_paths, features):
-                if self.modelrc[self.task]['precision'] == 'None':
-                    np.savetxt(path, np.array(feature.cpu()))
-                else:
-                    np.savetxt(path, np.array(feature.cpu()), fmt='%1.'+str(self.modelrc[self.task]['precision'])+'e')
+            self.writer.submit([feature[:length] for feature, length in zip(features, lengths)], output_paths)
 
             return torch.tensor(0)
 
@@ -249,6 +250,9 @@ class DownstreamExpert(nn.Module):
             global_step:
                 global_step in runner, which is helpful for Tensorboard logging
         """
+        if self.task in ['phonetic', 'semantic']:
+            self.writer.finalize()
+
         '''
         for key, values in records.items():
             average = torch.FloatTensor(values).mean().item()
@@ -0,0 +1,102 @@
+"""
+Asynchronous feature export for the ZeroSpeech 2021 submission.
+
+During extraction, each utterance is written as a binary .npy next to its final .txt path by a
+background thread pool. The .npy files are converted into the text format of the challenge by
+a process pool at the end, or on demand with:
+
+    python3 -m downstream.zerospeech2021.export SUBMISSION_DIR --precision 4
+"""
+
+import os
+import glob
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+
+def get_fmt(precision):
+    if precision is None or precision == 'None':
+        return '%.18e'
+    return '%1.' + str(precision) + 'e'
+
+
+def npy_to_txt(npy_path, fmt):
+    np.savetxt(npy_path[:-4] + '.txt', np.load(npy_path), fmt=fmt)
+    os.remove(npy_path)
+
+
+def convert_to_text(npy_paths, precision=None, num_workers=None):
+    """Convert the .npy features into .txt in parallel, return the number of converted files"""
+    fmt = get_fmt(precision)
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        list(executor.map(npy_to_txt, npy_paths, [fmt] * len(npy_paths), chunksize=64))
+    return len(npy_paths)
+
+
+class FeatureWriter:
+    """
+    Args:
+        precision: None for full float precision, or int > 0 for the number of decimal places
+        num_workers: threads writing the .npy files, and processes converting them at the end
+    """
+    def __init__(self, precision=None, num_workers=4):
+        self.precision = precision
+        self.num_workers = num_workers
+        self.executor = ThreadPoolExecutor(max_workers=num_workers)
+        self.futures = []
+        self.npy_paths = []
+        self.start_time = None
+
+    @staticmethod
+    def _write(path, feature):
+        np.save(path, feature.numpy())
+
+    def submit(self, features, output_paths):
+        """
+        Args:
+            features: list of (seq_len, feature_dim) tensors, on any device
+            output_paths: list of the final .txt paths
+        """
+        if self.start_time is None:
+            self.start_time = time.time()
+        for feature, path in zip(features, output_paths):
+            npy_path = path[:-4] + '.npy'
+            self.futures.append(self.executor.submit(self._write, npy_path, feature.detach().cpu()))
+            self.npy_paths.append(npy_path)
+
+    def finalize(self):
+        """Wait for the pending writes and convert all the written features into text"""
+        for future in self.futures:
+            future.result()
+        n_utts = len(self.npy_paths)
+        if n_utts == 0:
+            return
+        extract_secs = time.time() - self.start_time
+
+        start = time.time()
+        convert_to_text(self.npy_paths, self.precision, self.num_workers)
+        convert_secs = time.time() - start
+        print(f'[FeatureWriter] - {n_utts} utterances, extraction {n_utts / extract_secs:.1f} utt/sec, '
+              f'text conversion {n_utts / convert_secs:.1f} utt/sec')
+
+        self.futures, self.npy_paths, self.start_time = [], [], None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('subdir', help='The submission directory containing the exported .npy features')
+    parser.add_argument('--precision', default=None, help='None or the number of decimal places')
+    parser.add_argument('--num_workers', type=int, default=None)
+    args = parser.parse_args()
+
+    npy_paths = glob.glob(os.path.join(args.subdir, '**', '*.npy'), recursive=True)
+    start = time.time()
+    n_utts = convert_to_text(npy_paths, args.precision, args.num_workers)
+    print(f'Converted {n_utts} utterances in {time.time() - start:.1f} sec')
+
+
+if __name__ == '__main__':
+    main()
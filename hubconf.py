@@ -7,11 +7,10 @@
 ************************************************************************************************"""
 
 import os
-import hashlib
+import ast
 import pathlib
 import importlib
 
-import torch
 dependencies = ['torch']
 
 
@@ -19,15 +18,64 @@ search_root = os.path.dirname(__file__)
 hubconfs = [str(p) for p in pathlib.Path(search_root).glob('*/*/hubconf.py')]
 hubconfs = [os.path.relpath(p, search_root) for p in hubconfs]
 
+
+def _scan_entries(hubconf):
+    """
+    Public names of a hubconf file, found without importing it: the functions, the top-level
+    assignments, and the entries re-exported from other hubconf files (eg. vq_apc_url)
+    """
+    with open(os.path.join(search_root, hubconf), 'r') as file:
+        tree = ast.parse(file.read(), filename=hubconf)
+
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef):
+            names.append(node.name)
+        elif isinstance(node, ast.Assign):
+            names += [target.id for target in node.targets if isinstance(target, ast.Name)]
+        elif isinstance(node, ast.ImportFrom) and (node.module or '').split('.')[-1] == 'hubconf':
+            names += [alias.asname or alias.name for alias in node.names]
+    return [name for name in names if name[0] != '_']
+
+
+# entry name -> module name, the backend modules (fairseq, transformers...) are imported on request
+_entries = {}
 for hubconf in hubconfs:
     module_name = '.'.join(str(hubconf).split('.')[:-1]).replace('/', '.')
+    for entry in _scan_entries(hubconf):
+        _entries[entry] = module_name
+
+
+def _get_entry_names():
+    """All the upstream entries, without importing any of them"""
+    return sorted(_entries.keys())
+
+
+def __getattr__(name):
+    if name not in _entries:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+    module_name = _entries[name]
     try:
         _module = importlib.import_module(module_name)
     except ModuleNotFoundError as e:
-        print(f'[hubconf] can not import {module_name}: {str(e)}... Pass.')
-        continue
+        # AttributeError keeps hasattr / getattr with a default working for the unavailable entries
+        raise AttributeError(f'[hubconf] can not import {module_name} for {name}: {str(e)}') from e
+
+    # later accesses get the entry directly from globals
+    _variable = getattr(_module, name)
+    globals()[name] = _variable
+    return _variable
+
 
-    for variable_name in dir(_module):
-        _variable = getattr(_module, variable_name)
-        if callable(_variable) and variable_name[0] != '_':
-            globals()[variable_name] = _variable
+def __dir__():
+    # torch.hub.list calls getattr on every name, so only the entries whose backend imports are listed
+    available = []
+    for name in _entries.keys():
+        if name not in globals():
+            try:
+                __getattr__(name)
+            except AttributeError:
+                continue
+        available.append(name)
+    return sorted(set(globals().keys()) | set(available))
@@ -5,6 +5,7 @@ import copy
 
 import logging
 from typing import Callable, Iterable, Tuple
+from collections import OrderedDict
 
 import torch
 import torch.nn as nn
@@ -40,33 +41,36 @@ def get_grouped_parameters(model_params):
     return grouped_parameters
 
 
-def get_BertAdam_with_schedule(model_params, lr=2e-4, total_steps=20000, warmup_proportion=0.07, **kwargs):
+def get_BertAdam_with_schedule(model_params, lr=2e-4, total_steps=20000, warmup_proportion=0.07, foreach=True, **kwargs):
     grouped_parameters = get_grouped_parameters(model_params)
-    optimizer = BertAdam(grouped_parameters, lr=lr,
-                         warmup=warmup_proportion,
-                         t_total=total_steps)
+    Opt_class = MultiTensorBertAdam if foreach else BertAdam
+    optimizer = Opt_class(grouped_parameters, lr=lr,
+                          warmup=warmup_proportion,
+                          t_total=total_steps)
     return optimizer
 
 
-def get_AdamW_with_schedule(model_params, lr=2e-4, total_steps=20000, warmup_proportion=0.07, **kwargs):
+def get_AdamW_with_schedule(model_params, lr=2e-4, total_steps=20000, warmup_proportion=0.07, foreach=True, **kwargs):
     grouped_parameters = get_grouped_parameters(model_params)
-    optimizer = Lamb(grouped_parameters,
-                     lr=lr,
-                     warmup=warmup_proportion,
-                     t_total=total_steps,
-                     adam=True,
-                     correct_bias=True)
+    Opt_class = MultiTensorLamb if foreach else Lamb
+    optimizer = Opt_class(grouped_parameters,
+                          lr=lr,
+                          warmup=warmup_proportion,
+                          t_total=total_steps,
+                          adam=True,
+                          correct_bias=True)
     return optimizer
 
 
-def get_Lamb_with_schedule(model_params, lr=2e-4, total_steps=20000, warmup_proportion=0.07, **kwargs):
+def get_Lamb_with_schedule(model_params, lr=2e-4, total_steps=20000, warmup_proportion=0.07, foreach=True, **kwargs):
     grouped_parameters = get_grouped_parameters(model_params)
-    optimizer = Lamb(grouped_parameters,
-                     lr=lr,
-                     warmup=warmup_proportion,
-                     t_total=total_steps,
-                     adam=False,
-                     correct_bias=False)
+    Opt_class = MultiTensorLamb if foreach else Lamb
+    optimizer = Opt_class(grouped_parameters,
+                          lr=lr,
+                          warmup=warmup_proportion,
+                          t_total=total_steps,
+                          adam=False,
+                          correct_bias=False)
     return optimizer
 
 
@@ -77,11 +81,12 @@ def get_Adam(model_params, lr=2e-4, **kwargs):
     return Adam(params, lr=lr, betas=(0.9, 0.999))
 
 
-def get_AdamW(model_params, lr=2e-4, **kwargs):
+def get_AdamW(model_params, lr=2e-4, foreach=True, **kwargs):
     params = []
     for m in model_params:
         params += list(m.parameters())
-    optimizer = AdamW(params, lr=lr)
+    Opt_class = MultiTensorAdamW if foreach else AdamW
+    optimizer = Opt_class(params, lr=lr)
     return optimizer
 
 
@@ -631,4 +636,297 @@ class Lamb(Optimizer):
 
                 p.data.add_(-lr_scheduled * trust_ratio, adam_step)
 
-        return loss
\ No newline at end of file
+        return loss
+
+
+# Multi-tensor implementations:
+# The parameters of a group are bucketed by (step, device, dtype) and each bucket is updated
+# with a few torch._foreach_* calls instead of several kernels per parameter.
+# When the running torch does not provide the needed foreach ops, the same math runs in a loop.
+
+
+def _has_foreach():
+    try:
+        x, y = [torch.zeros(1)], [torch.ones(1)]
+        torch._foreach_add_(x, y, alpha=1.0)
+        torch._foreach_addcmul_(x, y, y, value=1.0)
+        torch._foreach_addcdiv_(x, y, y, value=1.0)
+        torch._foreach_add_(x, 1.0)
+        torch._foreach_mul_(x, 1.0)
+        torch._foreach_sqrt(x)
+        torch._foreach_div(x, y)
+        return True
+    except (AttributeError, TypeError, RuntimeError):
+        return False
+
+
+def _has_foreach_scalar_list():
+    try:
+        torch._foreach_mul_([torch.zeros(1)], [1.0])
+        return True
+    except (AttributeError, TypeError, RuntimeError):
+        return False
+
+
+FOREACH_AVAILABLE = _has_foreach()
+FOREACH_SCALAR_LIST_AVAILABLE = FOREACH_AVAILABLE and _has_foreach_scalar_list()
+
+
+def _foreach_mul_(tensors, scalar):
+    if FOREACH_AVAILABLE:
+        torch._foreach_mul_(tensors, scalar)
+    else:
+        for t in tensors:
+            t.mul_(scalar)
+
+
+def _foreach_mul_scalars_(tensors, scalars):
+    """tensors[i] *= scalars[i], with a list of python floats"""
+    if FOREACH_SCALAR_LIST_AVAILABLE:
+        torch._foreach_mul_(tensors, scalars)
+    else:
+        for t, scalar in zip(tensors, scalars):
+            t.mul_(scalar)
+
+
+def _foreach_add_(tensors, others, alpha=1.0):
+    if FOREACH_AVAILABLE:
+        torch._foreach_add_(tensors, others, alpha=alpha)
+    else:
+        for t, other in zip(tensors, others):
+            t.add_(other, alpha=alpha)
+
+
+def _foreach_add_scalar_(tensors, scalar):
+    if FOREACH_AVAILABLE:
+        torch._foreach_add_(tensors, scalar)
+    else:
+        for t in tensors:
+            t.add_(scalar)
+
+
+def _foreach_addcmul_(tensors, tensors1, tensors2, value):
+    if FOREACH_AVAILABLE:
+        torch._foreach_addcmul_(tensors, tensors1, tensors2, value=value)
+    else:
+        for t, t1, t2 in zip(tensors, tensors1, tensors2):
+            t.addcmul_(t1, t2, value=value)
+
+
+def _foreach_addcdiv_(tensors, tensors1, tensors2, value):
+    if FOREACH_AVAILABLE:
+        torch._foreach_addcdiv_(tensors, tensors1, tensors2, value=value)
+    else:
+        for t, t1, t2 in zip(tensors, tensors1, tensors2):
+            t.addcdiv_(t1, t2, value=value)
+
+
+def _foreach_sqrt(tensors):
+    if FOREACH_AVAILABLE:
+        return list(torch._foreach_sqrt(tensors))
+    return [t.sqrt() for t in tensors]
+
+
+def _foreach_div(tensors1, tensors2):
+    if FOREACH_AVAILABLE:
+        return list(torch._foreach_div(tensors1, tensors2))
+    return [t1 / t2 for t1, t2 in zip(tensors1, tensors2)]
+
+
+def _foreach_norm(tensors):
+    """Return a 1-D tensor with the L2 norm of each tensor"""
+    if hasattr(torch, '_foreach_norm'):
+        return torch.stack(torch._foreach_norm(tensors))
+    return torch.stack([t.norm() for t in tensors])
+
+
+def _bucket_params(group, state, init_state, sparse_error):
+    """
+    Return:
+        list of (params, grads, states) whose parameters share the same step, device and dtype,
+        so that the scalars of the update are shared within a bucket
+    """
+    buckets = OrderedDict()
+    for p in group['params']:
+        if p.grad is None:
+            continue
+        grad = p.grad.data
+        if grad.is_sparse:
+            raise RuntimeError(sparse_error)
+
+        param_state = state[p]
+        if len(param_state) == 0:
+            init_state(param_state, p)
+
+        key = (param_state['step'], p.device, p.dtype)
+        params, grads, states = buckets.setdefault(key, ([], [], []))
+        params.append(p.data)
+        grads.append(grad)
+        states.append(param_state)
+    return list(buckets.values())
+
+
+class MultiTensorAdamW(AdamW):
+    """Same as AdamW, with the parameters of each group updated by multi-tensor ops"""
+
+    @staticmethod
+    def _init_state(state, p):
+        state["step"] = 0
+        state["exp_avg"] = torch.zeros_like(p.data)
+        state["exp_avg_sq"] = torch.zeros_like(p.data)
+
+    def step(self, closure: Callable = None):
+        loss = None
+        if closure is not None:
+            loss = closure()
+
+        for group in self.param_groups:
+            beta1, beta2 = group["betas"]
+            buckets = _bucket_params(group, self.state, self._init_state,
+                                     "Adam does not support sparse gradients, please consider SparseAdam instead")
+            for params, grads, states in buckets:
+                step = states[0]["step"] + 1
+                for state in states:
+                    state["step"] = step
+                exp_avgs = [state["exp_avg"] for state in states]
+                exp_avg_sqs = [state["exp_avg_sq"] for state in states]
+
+                _foreach_mul_(exp_avgs, beta1)
+                _foreach_add_(exp_avgs, grads, alpha=1.0 - beta1)
+                _foreach_mul_(exp_avg_sqs, beta2)
+                _foreach_addcmul_(exp_avg_sqs, grads, grads, value=1.0 - beta2)
+                denoms = _foreach_sqrt(exp_avg_sqs)
+                _foreach_add_scalar_(denoms, group["eps"])
+
+                step_size = group["lr"]
+                if group["correct_bias"]:  # No bias correction for Bert
+                    bias_correction1 = 1.0 - beta1 ** step
+                    bias_correction2 = 1.0 - beta2 ** step
+                    step_size = step_size * math.sqrt(bias_correction2) / bias_correction1
+
+                _foreach_addcdiv_(params, exp_avgs, denoms, value=-step_size)
+
+                # decoupled weight decay at the end (fixed version)
+                if group["weight_decay"] > 0.0:
+                    _foreach_add_(params, params, alpha=-group["lr"] * group["weight_decay"])
+
+        return loss
+
+
+class MultiTensorBertAdam(BertAdam):
+    """Same as BertAdam, with the parameters of each group updated by multi-tensor ops"""
+
+    @staticmethod
+    def _init_state(state, p):
+        state['step'] = 0
+        state['next_m'] = torch.zeros_like(p.data)
+        state['next_v'] = torch.zeros_like(p.data)
+
+    def step(self, closure=None):
+        loss = None
+        if closure is not None:
+            loss = closure()
+
+        for group in self.param_groups:
+            beta1, beta2 = group['betas']
+            buckets = _bucket_params(group, self.state, self._init_state,
+                                     'Adam does not support sparse gradients, please consider SparseAdam instead')
+            for params, grads, states in buckets:
+                next_m = [state['next_m'] for state in states]
+                next_v = [state['next_v'] for state in states]
+
+                # grad clipping of each parameter by its own norm, as clip_grad_norm_(p, max_grad_norm)
+                if group['max_grad_norm'] > 0:
+                    clip_coefs = (group['max_grad_norm'] / (_foreach_norm(grads) + 1e-6)).clamp(max=1.0)
+                    _foreach_mul_scalars_(grads, clip_coefs.tolist())
+
+                _foreach_mul_(next_m, beta1)
+                _foreach_add_(next_m, grads, alpha=1 - beta1)
+                _foreach_mul_(next_v, beta2)
+                _foreach_addcmul_(next_v, grads, grads, value=1 - beta2)
+                denoms = _foreach_sqrt(next_v)
+                _foreach_add_scalar_(denoms, group['e'])
+                updates = _foreach_div(next_m, denoms)
+
+                if group['weight_decay'] > 0.0:
+                    _foreach_add_(updates, params, alpha=group['weight_decay'])
+
+                # the schedule is evaluated before the step is increased
+                lr_scheduled = group['lr'] * group['schedule'].get_lr(states[0]['step'])
+                _foreach_add_(params, updates, alpha=-lr_scheduled)
+
+                for state in states:
+                    state['step'] += 1
+
+        return loss
+
+
+class MultiTensorLamb(Lamb):
+    """
+    Same as Lamb, with the parameters of each group updated by multi-tensor ops.
+    The per-parameter weight and update norms are only computed (and kept in the states)
+    when the trust ratio is used, ie. adam=False.
+    """
+
+    @staticmethod
+    def _init_state(state, p):
+        state['step'] = 0
+        state['exp_avg'] = torch.zeros_like(p.data)
+        state['exp_avg_sq'] = torch.zeros_like(p.data)
+
+    def step(self, closure=None):
+        loss = None
+        if closure is not None:
+            loss = closure()
+
+        for group in self.param_groups:
+            beta1, beta2 = group['betas']
+            buckets = _bucket_params(group, self.state, self._init_state,
+                                     'Lamb does not support sparse gradients, consider SparseAdam instad.')
+            for params, grads, states in buckets:
+                step = states[0]['step'] + 1
+                for state in states:
+                    state['step'] = step
+                exp_avgs = [state['exp_avg'] for state in states]
+                exp_avg_sqs = [state['exp_avg_sq'] for state in states]
+
+                # m_t
+                _foreach_mul_(exp_avgs, beta1)
+                _foreach_add_(exp_avgs, grads, alpha=1 - beta1)
+                # v_t
+                _foreach_mul_(exp_avg_sqs, beta2)
+                _foreach_addcmul_(exp_avg_sqs, grads, grads, value=1 - beta2)
+
+                step_size = group['lr']
+                if group['correct_bias']:  # No bias correction for Bert
+                    bias_correction1 = 1.0 - beta1 ** step
+                    bias_correction2 = 1.0 - beta2 ** step
+                    step_size = step_size * math.sqrt(bias_correction2) / bias_correction1
+                lr_scheduled = step_size * group['schedule'].get_lr(step)
+
+                denoms = _foreach_sqrt(exp_avg_sqs)
+                _foreach_add_scalar_(denoms, group['eps'])
+                adam_steps = _foreach_div(exp_avgs, denoms)
+                if group['weight_decay'] != 0:
+                    _foreach_add_(adam_steps, params, alpha=group['weight_decay'])
+
+                if self.adam:
+                    _foreach_add_(params, adam_steps, alpha=-lr_scheduled)
+                    continue
+
+                weight_norms = _foreach_norm(params)
+                adam_norms = _foreach_norm(adam_steps)
+                trust_ratios = torch.where(
+                    (weight_norms == 0) | (adam_norms == 0),
+                    torch.ones_like(weight_norms),
+                    weight_norms / adam_norms,
+                )
+                for state, weight_norm, adam_norm, trust_ratio in zip(states, weight_norms, adam_norms, trust_ratios):
+                    state['weight_norm'] = weight_norm
+                    state['adam_norm'] = adam_norm
+                    state['trust_ratio'] = trust_ratio
+
+                _foreach_mul_scalars_(adam_steps, (-lr_scheduled * trust_ratios).tolist())
+                _foreach_add_(params, adam_steps)
+
+        return loss
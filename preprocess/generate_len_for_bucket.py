@@ -17,6 +17,7 @@ import pickle
 import argparse
 import torchaudio
 import numpy as np
+import soundfile as sf
 import pandas as pd
 from tqdm import tqdm
 from pathlib import Path
@@ -49,7 +50,10 @@ def get_preprocess_args():
     parser.add_argument('-o', '--output_path', default='./data/', type=str, help='Path to store output', required=False)
     parser.add_argument('-a', '--audio_extension', default='.flac', type=str, help='audio file type (.wav / .flac / .mp3 / etc)', required=False)
     parser.add_argument('-n', '--name', default='len_for_bucket', type=str, help='Name of the output directory', required=False)
+    parser.add_argument('-s', '--splits', default=None, type=str, nargs='+', help='Splits to preprocess, default: all the known splits found in input_data', required=False)
     parser.add_argument('--n_jobs', default=-1, type=int, help='Number of jobs used for feature extraction', required=False)
+    parser.add_argument('--chunk_size', default=1000, type=int, help='Number of files probed by a job at once', required=False)
+    parser.add_argument('--no_cache', action='store_true', help='Probe all the files again instead of reusing the cached lengths')
 
     args = parser.parse_args()
     return args
@@ -59,38 +63,94 @@ def get_preprocess_args():
 # EXTRACT LENGTH #
 ##################
 def extract_length(input_file):
+    # number of samples from the container header (FLAC STREAMINFO / WAV header), without decoding
+    try:
+        frames = sf.info(input_file).frames
+        if frames > 0:
+            return frames
+    except RuntimeError:
+        pass
+    # fall back to decoding for the formats libsndfile can not read (eg. mp3)
     wav, _ = torchaudio.load(input_file)
     return wav.size(-1)
 
 
+def extract_lengths(input_files):
+    return [extract_length(input_file) for input_file in input_files]
+
+
+def get_file_key(input_file):
+    stat = os.stat(input_file)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+################
+# LENGTH CACHE #
+################
+def load_cache(cache_path):
+    """path -> (mtime_ns, size, length)"""
+    if os.path.isfile(cache_path):
+        with open(cache_path, 'rb') as handle:
+            return pickle.load(handle)
+    return {}
+
+
+def save_cache(cache, cache_path):
+    with open(cache_path + '.tmp', 'wb') as handle:
+        pickle.dump(cache, handle)
+    os.replace(cache_path + '.tmp', cache_path)
+
+
 ###################
 # GENERATE LENGTH #
 ###################
-def generate_length(args, tr_set, audio_extension):
-    
-    for i, s in enumerate(tr_set):
-        if os.path.isdir(os.path.join(args.input_data, s.lower())):
-            s = s.lower()
-        elif os.path.isdir(os.path.join(args.input_data, s.upper())):
-            s = s.upper()
-        else:
-            assert NotImplementedError
+def find_split_dir(input_data, s):
+    if os.path.isdir(os.path.join(input_data, s.lower())):
+        return s.lower()
+    elif os.path.isdir(os.path.join(input_data, s.upper())):
+        return s.upper()
+    return None
 
-        print('')
-        todo = list(Path(os.path.join(args.input_data, s)).rglob('*' + audio_extension)) # '*.flac'
-        print(f'Preprocessing data in: {s}, {len(todo)} audio files found.')
 
-        output_dir = os.path.join(args.output_path, args.name)
-        if not os.path.exists(output_dir): os.makedirs(output_dir)
+def generate_length(args, tr_set, audio_extension):
 
-        print('Extracting audio length...', flush=True)
-        tr_x = Parallel(n_jobs=args.n_jobs)(delayed(extract_length)(str(file)) for file in tqdm(todo))
+    output_dir = os.path.join(args.output_path, args.name)
+    if not os.path.exists(output_dir): os.makedirs(output_dir)
+    cache_path = os.path.join(output_dir, '.length_cache.pkl')
+    cache = {} if args.no_cache else load_cache(cache_path)
+
+    # list the files of all splits, only the new or changed ones are probed
+    split_files = {}
+    todo, todo_keys = [], []
+    for s in tr_set:
+        split_dir = find_split_dir(args.input_data, s)
+        assert split_dir is not None, f'{s} not found in {args.input_data}'
+        files = [str(f) for f in Path(os.path.join(args.input_data, split_dir)).rglob('*' + audio_extension)] # '*.flac'
+        split_files[s] = (split_dir, files)
+        print(f'Preprocessing data in: {split_dir}, {len(files)} audio files found.')
+        for f in files:
+            key = get_file_key(f)
+            cached = cache.get(f)
+            if cached is None or cached[:2] != key:
+                todo.append(f)
+                todo_keys.append(key)
+
+    print(f'Extracting audio length of {len(todo)} new or changed files...', flush=True)
+    chunks = [todo[i:i + args.chunk_size] for i in range(0, len(todo), args.chunk_size)]
+    lengths = Parallel(n_jobs=args.n_jobs)(delayed(extract_lengths)(chunk) for chunk in tqdm(chunks))
+    lengths = [length for chunk in lengths for length in chunk]
+    for f, key, length in zip(todo, todo_keys, lengths):
+        cache[f] = (*key, length)
+    save_cache(cache, cache_path)
+
+    for s, (split_dir, files) in split_files.items():
+        tr_x = [cache[f][2] for f in files]
 
         # sort by len
-        sorted_todo = [os.path.join(s, str(todo[idx]).split(s+'/')[-1]) for idx in reversed(np.argsort(tr_x))]
+        sorted_todo = [os.path.join(split_dir, str(files[idx]).split(split_dir+'/')[-1]) for idx in reversed(np.argsort(tr_x))]
         # Dump data
         df = pd.DataFrame(data={'file_path':[fp for fp in sorted_todo], 'length':list(reversed(sorted(tr_x))), 'label':None})
-        df.to_csv(os.path.join(output_dir, tr_set[i] + '.csv'))
+        df.to_csv(os.path.join(output_dir, s + '.csv'))
 
     print('All done, saved at', output_dir, 'exit.')
 
@@ -103,20 +163,22 @@ def main():
     # get arguments
     args = get_preprocess_args()
     
+    sets = SETS
     if 'librispeech' in args.input_data.lower():
-        SETS = ['train-clean-100', 'train-clean-360', 'train-other-500', 'dev-clean', 'dev-other', 'test-clean', 'test-other']
+        sets = ['train-clean-100', 'train-clean-360', 'train-other-500', 'dev-clean', 'dev-other', 'test-clean', 'test-other']
     elif 'timit' in args.input_data.lower():
-        SETS = ['TRAIN', 'TEST']
+        sets = ['TRAIN', 'TEST']
 
-    # Select data sets
-    for idx, s in enumerate(SETS):
-        print('\t', idx, ':', s)
-    tr_set = input('Please enter the index of splits you wish to use preprocess. (seperate with space): ')
-    tr_set = [SETS[int(t)] for t in tr_set.split(' ')]
+    # Select data sets, non-interactively
+    if args.splits is not None:
+        tr_set = args.splits
+    else:
+        tr_set = [s for s in sets if find_split_dir(args.input_data, s) is not None]
+    print('Splits to preprocess:', tr_set)
 
     # Acoustic Feature Extraction & Make Data Table
     generate_length(args, tr_set, args.audio_extension)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -15,12 +15,14 @@ import os
 import sys
 import pickle
 import argparse
+from functools import partial
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
 from pathlib import Path
 from joblib import Parallel, delayed
 from utility.audio import extract_feature, num_mels, num_mfcc, num_freq
+from utility.feature_store import extract_to_store
 
 
 ##################
@@ -47,6 +49,8 @@ def get_preprocess_args():
     parser.add_argument('--delta_delta', default=False, type=boolean_string, help='Append Delta Delta', required=False)
     parser.add_argument('--apply_cmvn', default=True, type=boolean_string, help='Apply CMVN on feature', required=False)
 
+    parser.add_argument('--sharded', default=False, type=boolean_string, help='Write the features into large memory-mapped shards instead of one .npy per utterance', required=False)
+    parser.add_argument('--shard_size', default=1024, type=int, help='Maximum shard size in MB', required=False)
     parser.add_argument('--n_jobs', default=-1, type=int, help='Number of jobs used for feature extraction', required=False)
     parser.add_argument('--name', default='None', type=str, help='Name of the output directory', required=False)
 
@@ -74,9 +78,15 @@ def acoustic_preprocess(args, tr_set, dim):
         if not os.path.exists(cur_path): os.makedirs(cur_path)
 
         print('Extracting acoustic feature...', flush=True)
-        tr_x = Parallel(n_jobs=args.n_jobs)(delayed(extract_feature)(str(file), feature=args.feature_type, \
-                                            delta=args.delta, delta_delta=args.delta_delta, cmvn=args.apply_cmvn, \
-                                            save_feature=os.path.join(cur_path, str(file).split('/')[-1].replace('.flac', ''))) for file in tqdm(todo))
+        if args.sharded:
+            keys = [os.path.join(s, str(file).split('/')[-1].replace('.flac', '.npy')) for file in todo]
+            tr_x = extract_to_store(cur_path, [str(file) for file in todo], keys, partial(extract_feature, feature=args.feature_type, \
+                                    delta=args.delta, delta_delta=args.delta_delta, cmvn=args.apply_cmvn), \
+                                    n_jobs=args.n_jobs, shard_size=args.shard_size * 1024 ** 2)
+        else:
+            tr_x = Parallel(n_jobs=args.n_jobs)(delayed(extract_feature)(str(file), feature=args.feature_type, \
+                                                delta=args.delta, delta_delta=args.delta_delta, cmvn=args.apply_cmvn, \
+                                                save_feature=os.path.join(cur_path, str(file).split('/')[-1].replace('.flac', ''))) for file in tqdm(todo))
 
         # sort by len
         sorted_todo = [os.path.join(s, str(todo[idx]).split('/')[-1].replace('.flac', '.npy')) for idx in reversed(np.argsort(tr_x))]
@@ -22,6 +22,7 @@ from torch.utils.data.dataset import Dataset
 import torchaudio
 #-------------#
 from pretrain.mockingjay.task import generate_masked_acoustic_model_data
+from utility.feature_store import ShardedFeatureStore
 
 
 HALF_BATCHSIZE_TIME = 99999
@@ -49,6 +50,12 @@ class AcousticDataset(Dataset):
         self.table = pd.concat(tables, ignore_index=True).sort_values(by=['length'], ascending=False)
         print('[Dataset] - Training data from these sets:', str(sets))
 
+        # Sharded feature stores written by the preprocessors with --sharded True
+        self.stores = [ShardedFeatureStore(os.path.join(file_path, s)) for s in sets
+                       if libri_root is None and ShardedFeatureStore.exists(os.path.join(file_path, s))]
+        if len(self.stores) > 0:
+            print('[Dataset] - Reading features from', len(self.stores), 'sharded stores')
+
         # Drop seqs that are too long
         if max_timestep > 0:
             self.table = self.table[self.table.length < max_timestep]
@@ -89,6 +96,12 @@ class AcousticDataset(Dataset):
         idx = random.randint(0, len(x)-self.sample_length)
         return x[idx:idx+self.sample_length]
 
+    def _load_npy(self, feat_path):
+        for store in self.stores:
+            if feat_path in store:
+                return torch.from_numpy(np.array(store.read(feat_path)))
+        return torch.FloatTensor(np.load(os.path.join(self.root, feat_path)))
+
     def __len__(self):
         return len(self.X)
 
@@ -107,7 +120,7 @@ class KaldiAcousticDataset(AcousticDataset):
 
     def _load_feat(self, feat_path):
         if self.libri_root is None:
-            return torch.FloatTensor(np.load(os.path.join(self.root, feat_path)))
+            return self._load_npy(feat_path)
         else:
             wav, _ = torchaudio.load(os.path.join(self.libri_root, feat_path))
             feat = self.extracter(wav.squeeze())
@@ -141,7 +154,7 @@ class OnlineAcousticDataset(AcousticDataset):
 
     def _load_feat(self, feat_path):
         if self.libri_root is None:
-            return torch.FloatTensor(np.load(os.path.join(self.root, feat_path)))
+            return self._load_npy(feat_path)
         else:
             wav, _ = torchaudio.load(os.path.join(self.libri_root, feat_path))
             wav = self._normalize_wav_decibel(wav.squeeze())
@@ -13,34 +13,14 @@
 import copy
 import torch
 import random
-import numpy as np
-from functools import lru_cache
-
-
-############
-# CONSTANT #
-############
-MAX_SEQLEN = 3000
-
-
-@lru_cache(maxsize=128)
-def get_sinusoid_table(hidden_size):
-    def cal_angle(position, hid_idx):
-        return position / np.power(10000, 2 * (hid_idx // 2) / hidden_size)
-        
-    def get_posi_angle_vec(position):
-        return [cal_angle(position, hid_j) for hid_j in range(hidden_size)]
-
-    sinusoid_table = np.array([get_posi_angle_vec(pos_i) for pos_i in range(MAX_SEQLEN)])
-    sinusoid_table[:, 0::2] = np.sin(sinusoid_table[:, 0::2])  # dim 2i
-    sinusoid_table[:, 1::2] = np.cos(sinusoid_table[:, 1::2])  # dim 2i+1
-    return torch.FloatTensor(sinusoid_table)
+import torch.nn.functional as F
+from upstream.mockingjay.position import position_encoding, get_attention_mask
 
 
 def fast_position_encoding(seq_len, hidden_size, batch_size=None, padding_idx=None):
     ''' position encoding table '''
-    assert seq_len <= MAX_SEQLEN, f'constant MAX_SEQLEN ({MAX_SEQLEN}) in mam.py < received seq_len ({seq_len})'        
-    table = get_sinusoid_table(hidden_size)[:seq_len]
+    # the cached table grows with seq_len, see upstream/mockingjay/position.py
+    table = position_encoding(seq_len, hidden_size)
 
     if padding_idx is not None:
         # deepcopy will slow down whole process when positional table is too large
@@ -63,8 +43,11 @@ def fast_position_encoding(seq_len, hidden_size, batch_size=None, padding_idx=No
         return table  # (seq_len, hidden_size)
 
 
-def generate_masked_acoustic_model_data(spec, config):
-    """Process training data for the masked acoustic model"""
+def generate_masked_acoustic_model_data_loop(spec, config):
+    """
+    Process training data for the masked acoustic model, one utterance at a time.
+    This is the reference of `generate_masked_acoustic_model_data`, see utility/benchmark_mam_masking.py
+    """
 
     with torch.no_grad():
 
@@ -157,3 +140,133 @@ def generate_masked_acoustic_model_data(spec, config):
         spec_target = spec_target.to(dtype=torch.float32)[valid_batchid]
 
     return spec_masked, pos_enc, mask_label, attn_mask, spec_target
+
+
+def _sample_starts(valid, proportion):
+    """
+    Uniformly choose `proportion` positions without replacement among the valid ones for each item,
+    the batched counterpart of `valid_starts[torch.randperm(len(valid_starts))[:proportion]]`
+
+    Return:
+        chosen: (batch_size, num_positions) bool
+        rank: (batch_size, num_positions) the order in which the chosen positions were drawn
+    """
+    scores = torch.rand(valid.shape)
+    scores[~valid] = 2.0 # invalid positions are ranked after all the valid ones
+    rank = scores.argsort(dim=-1).argsort(dim=-1)
+    chosen = valid & (rank < proportion.unsqueeze(-1))
+    return chosen, rank
+
+
+def _starts_to_frame_mask(chosen, consecutive, seq_len):
+    """Mark `consecutive` frames from every chosen start, (batch_size, seq_len) bool"""
+    positions = torch.arange(seq_len)
+    counts = F.pad(chosen.long(), (0, max(seq_len - chosen.size(-1), 0)))[:, :seq_len].cumsum(dim=-1)
+    previous = positions.unsqueeze(0) - consecutive.unsqueeze(-1)
+    previous_counts = counts.gather(1, previous.clamp(min=0))
+    previous_counts[previous < 0] = 0
+    return (counts - previous_counts) > 0
+
+
+def generate_masked_acoustic_model_data(spec, config):
+    """
+    Process training data for the masked acoustic model.
+    Masks of all the utterances are drawn at once with tensor ops, following the same distribution
+    as `generate_masked_acoustic_model_data_loop`
+    """
+
+    with torch.no_grad():
+
+        # Start
+        if len(spec) == 2: # if self.duo_feature: dataloader will output `source_spec` and `target_spec`
+            spec_masked = spec[0]
+            spec_target = spec[1]
+        elif len(spec) == 1:
+            spec_masked = spec[0] # (batch_size, seq_len, feat_dim)
+            spec_target = copy.deepcopy(spec[0]) # (batch_size, seq_len, feat_dim)
+        else:
+            raise ValueError
+
+        # Record length for each uttr
+        spec_len = (spec_target.sum(dim=-1) != 0).long().sum(dim=-1).cpu()
+        batch_size, seq_len, feat_dim = spec_target.shape
+        batch_ids = torch.arange(batch_size)
+
+        pos_enc = fast_position_encoding(seq_len, config['position_encoding_size']) # (seq_len, position_encoding_size)
+        mask_label = torch.zeros_like(spec_target, dtype=torch.uint8) \
+                     if config['mask_proportion'] != 0 or config['mask_frequency'] != 0 \
+                     else torch.ones_like(spec_target, dtype=torch.uint8)
+
+        # zero vectors for padding dimension
+        attn_mask = get_attention_mask(spec_len, seq_len) # (batch_size, seq_len)
+
+        # time masking
+        if config['mask_proportion'] > 0:
+            mask_consecutive = torch.randint(config['mask_consecutive_min'], config['mask_consecutive_max'] + 1, (batch_size,))
+            valid_start_max = (spec_len - mask_consecutive - 1).clamp(min=0) # max valid start point for a consecutive mask
+            proportion = torch.round(spec_len.float() * config['mask_proportion'] / mask_consecutive.float()).long()
+
+            positions = torch.arange(int(valid_start_max.max()) + 1).unsqueeze(0)
+            in_range = positions <= valid_start_max.unsqueeze(-1)
+            if config['mask_allow_overlap']:
+                valid = in_range
+            else:
+                mask_bucket_size = torch.round(mask_consecutive.float() * config['mask_bucket_ratio']).long().clamp(min=1)
+                rand_start = (torch.rand(batch_size) * (torch.min(mask_consecutive, valid_start_max) + 1).float()).long()
+                offset = positions - rand_start.unsqueeze(-1)
+                valid = in_range & (offset >= 0) & (offset % mask_bucket_size.unsqueeze(-1) == 0)
+            chosen, chosen_rank = _sample_starts(valid, proportion)
+            time_mask = _starts_to_frame_mask(chosen, mask_consecutive, seq_len) # (batch_size, seq_len)
+
+            # determine whether to mask / random / or do nothing to the frame
+            dice = torch.rand(batch_size)
+            to_zero = (dice < 0.8).unsqueeze(-1) & time_mask
+            to_random = ((dice >= 0.8) & (dice < 0.9)).unsqueeze(-1) & time_mask
+
+            if to_random.any():
+                # the k-th drawn chosen interval is replaced by the k-th drawn random interval
+                _, random_rank = _sample_starts(in_range, proportion)
+                random_by_rank = random_rank.argsort(dim=-1) # the position drawn at each rank
+
+                # the latest chosen start covering each frame
+                padded_chosen = F.pad(chosen, (0, max(seq_len - chosen.size(-1), 0)))[:, :seq_len]
+                starts = torch.where(padded_chosen, torch.arange(seq_len).expand(batch_size, -1), torch.full_like(padded_chosen, -1, dtype=torch.long))
+                latest_start = starts.cummax(dim=-1)[0].clamp(min=0)
+                latest_rank = F.pad(chosen_rank, (0, max(seq_len - chosen_rank.size(-1), 0)))[:, :seq_len].gather(1, latest_start)
+                source = random_by_rank.gather(1, latest_rank.clamp(max=random_by_rank.size(-1) - 1)) + torch.arange(seq_len) - latest_start
+                source = source.clamp(max=seq_len - 1)
+
+                replaced = spec_masked[batch_ids.unsqueeze(-1), source.to(spec_masked.device)]
+                spec_masked[to_random] = replaced[to_random]
+            spec_masked[to_zero] = 0
+
+            # the gradients will be calculated on chosen frames
+            mask_label[time_mask] = 1
+
+        # frequency masking
+        if config['mask_frequency'] > 0:
+            max_width = int(feat_dim * config['mask_frequency'])
+            rand_bandwidth = torch.randint(0, max_width + 1, (batch_size,))
+            chosen_start = (torch.rand(batch_size) * (feat_dim - rand_bandwidth).float()).long()
+            freq_positions = torch.arange(feat_dim).unsqueeze(0)
+            freq_mask = (freq_positions >= chosen_start.unsqueeze(-1)) & (freq_positions < (chosen_start + rand_bandwidth).unsqueeze(-1))
+            spec_masked.masked_fill_(freq_mask.unsqueeze(1).to(spec_masked.device), 0)
+
+            # the gradients will be calculated on chosen frames
+            mask_label[attn_mask.bool().unsqueeze(-1) & freq_mask.unsqueeze(1)] = 1
+
+        if config['noise_proportion'] > 0:
+            # noise augmentation
+            dice = random.random()
+            if dice < config['noise_proportion']:
+                noise_sampler = torch.distributions.Normal(0, 0.2)
+                spec_masked += noise_sampler.sample(spec_masked.shape).to(device=spec_masked.device)
+
+        valid_batchid = mask_label.view(batch_size, -1).sum(dim=-1).nonzero(as_tuple=False).view(-1)
+        spec_masked = spec_masked.to(dtype=torch.float32)[valid_batchid]
+        pos_enc = pos_enc.to(dtype=torch.float32)
+        mask_label = mask_label.to(dtype=torch.bool)[valid_batchid]
+        attn_mask = attn_mask.to(dtype=torch.float32)[valid_batchid]
+        spec_target = spec_target.to(dtype=torch.float32)[valid_batchid]
+
+    return spec_masked, pos_enc, mask_label, attn_mask, spec_target
@@ -10,9 +10,7 @@
 ###############
 # IMPORTATION #
 ###############
-import os
 import math
-import glob
 import random
 import importlib
 from tqdm import tqdm
@@ -25,6 +23,7 @@ import numpy as np
 #-------------#
 from optimizers import get_optimizer
 from schedulers import get_scheduler
+from utility.checkpoint import CheckpointManager
 
 
 ##########
@@ -135,6 +134,13 @@ class Runner():
         if init_step:
             pbar.n = init_step
 
+        # checkpoints are written in background
+        checkpoint_manager = CheckpointManager(
+            self.args.expdir,
+            self.config['runner']['max_keep'],
+            asynchronous=self.config['runner'].get('async_checkpoint', True),
+        )
+
         all_loss = 0
         backward_steps = 0
         records = defaultdict(list)
@@ -214,15 +220,6 @@ class Runner():
                     records = defaultdict(list)
 
                 if global_step % self.config['runner']['save_step'] == 0 or pbar.n == pbar.total -1:
-                    def check_ckpt_num(directory):
-                        max_keep = self.config['runner']['max_keep']
-                        ckpt_pths = glob.glob(f'{directory}/states-*.ckpt')
-                        if len(ckpt_pths) >= max_keep:
-                            ckpt_pths = sorted(ckpt_pths, key=lambda pth: int(pth.split('-')[-1].split('.')[0]))
-                            for ckpt_pth in ckpt_pths[:len(ckpt_pths) - max_keep + 1]:
-                                os.remove(ckpt_pth)
-                    check_ckpt_num(self.args.expdir)
-
                     all_states = {
                         'Optimizer': optimizer.state_dict(),
                         'Step': global_step,
@@ -236,11 +233,11 @@ class Runner():
                     
                     name = f'states-epoch-{n_epochs}.ckpt' if pbar.n == pbar.total -1 and n_epochs > 0 else \
                            f'states-{global_step}.ckpt'
-                    save_path = os.path.join(self.args.expdir, name)
+                    save_path, = checkpoint_manager.save(all_states, [name])
                     tqdm.write(f'[Runner] - Save the checkpoint to: {save_path}')
-                    torch.save(all_states, save_path)
                 
                 all_loss = 0      
                 pbar.update(1)
 
         pbar.close()
+        checkpoint_manager.close()
@@ -14,6 +14,7 @@ import copy
 import torch
 import random
 from pretrain.mockingjay.task import fast_position_encoding
+from upstream.mockingjay.position import get_attention_mask
 
 ############
 # CONSTANT #
@@ -56,12 +57,10 @@ def generate_spec_aug_data(spec, config):
         mask_label = torch.zeros_like(spec_target, dtype=torch.uint8) \
                      if config['mask_T'] != 0 or config['mask_F'] != 0 \
                      else torch.ones_like(spec_target, dtype=torch.uint8)
-        attn_mask = torch.ones((batch_size, seq_len)) # (batch_size, seq_len)
+        # zero vectors for padding dimension
+        attn_mask = get_attention_mask(spec_len, seq_len) # (batch_size, seq_len)
 
         for idx in range(batch_size):
-            # zero vectors for padding dimension
-            attn_mask[idx, spec_len[idx]:] = 0
-
             def _starts_to_intervals(starts, consecutive):
                 tiled = starts.expand(consecutive, starts.size(0)).permute(1, 0)
                 offset = torch.arange(consecutive).expand_as(tiled)
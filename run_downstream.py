@@ -51,7 +51,7 @@ def get_downstream_args():
     parser.add_argument('-v', '--downstream_variant', help='Downstream vairants given the same expert')
 
     # upstream settings
-    upstreams = [attr for attr in dir(hubconf) if callable(getattr(hubconf, attr)) and attr[0] != '_']
+    upstreams = hubconf._get_entry_names()
     parser.add_argument('-u', '--upstream', choices=upstreams, help='\
         Some upstream variants need local ckpt or config file.\
         Some download needed files on-the-fly and cache them.\
@@ -62,6 +62,7 @@ def get_downstream_args():
     parser.add_argument('-r', '--upstream_refresh', action='store_true', help='Re-download cached ckpts for on-the-fly upstream variants')
     parser.add_argument('-f', '--upstream_trainable', action='store_true', help='Fine-tune, set upstream.train(). Default is upstream.eval()')
     parser.add_argument('-s', '--upstream_feature_selection', default='hidden_states', help='Specify the layer to be extracted as the representation')
+    parser.add_argument('--upstream_feature_cache', metavar='DIR', help='Cache the features of a frozen upstream on disk and reuse them across epochs and evaluations')
 
     # experiment directory, choose one to specify
     # expname uses the default root directory: result/downstream
@@ -13,11 +13,10 @@
 import yaml
 import torch
 import random
-import numpy as np
 import torch.nn as nn
-from functools import lru_cache
 from distutils.util import strtobool
 from transformer.model import TransformerConfig, TransformerModel
+from upstream.mockingjay.position import position_encoding, get_attention_mask
 
 
 ###############
@@ -175,24 +174,18 @@ class TRANSFORMER(nn.Module):
             spec_stacked = spec
 
         # Record length for each uttr
-        spec_len = np.sum(np.sum(spec_stacked.cpu().data.numpy(), axis=-1) != 0, axis=-1)
-        spec_len = [int(sl) for sl in spec_len]
+        spec_len = (spec_stacked.sum(dim=-1) != 0).long().sum(dim=-1).to(self.device)
 
         batch_size = spec_stacked.shape[0]
         seq_len = spec_stacked.shape[1]
 
-        pos_enc = position_encoding(seq_len, self.hidden_size) # (seq_len, hidden_size)
-        attn_mask = np.ones((batch_size, seq_len)) # (batch_size, seq_len)
-
         # zero vectors for padding dimension
-        for idx in range(len(spec_stacked)):
-            attn_mask[idx][spec_len[idx]:] = 0 
+        attn_mask = get_attention_mask(spec_len, seq_len) # (batch_size, seq_len)
 
         if self.spec_aug and self.spec_aug_prev and self.model.training:
             spec_stacked = spec_augment(spec_stacked, mask_T=70, mask_F=4, num_T=2, num_F=2, p=1.0) # (batch_size, seq_len, feature_dim * dr)
         spec_stacked = spec_stacked.to(device=self.device, dtype=torch.float32) # (batch_size, seq_len, feature_dim * dr)
-        pos_enc = torch.FloatTensor(pos_enc).to(device=self.device, dtype=torch.float32).expand(spec_stacked.size(0), *pos_enc.size()) # (batch_size, seq_len, hidden_size)
-        attn_mask = torch.FloatTensor(attn_mask).to(device=self.device, dtype=torch.float32) # (batch_size, seq_len)
+        pos_enc = position_encoding(seq_len, self.hidden_size, self.device).expand(batch_size, -1, -1) # (batch_size, seq_len, hidden_size)
         return spec_stacked, pos_enc, attn_mask # (x, pos_enc, attention_mask)
 
 
@@ -275,31 +268,6 @@ class TRANSFORMER(nn.Module):
         return x
 
 
-#######################
-# POSITIONAL ENCODING #
-#######################
-MAX_SEQLEN = 5000
-@lru_cache(maxsize=128)
-def get_sinusoid_table(hidden_size):
-    def _cal_angle(position, hid_idx):
-        return position / np.power(10000, 2 * (hid_idx // 2) / hidden_size)
-    def _get_posi_angle_vec(position):
-        return [_cal_angle(position, hid_j) for hid_j in range(hidden_size)]
-    sinusoid_table = np.array([_get_posi_angle_vec(pos_i) for pos_i in range(MAX_SEQLEN)])
-    sinusoid_table[:, 0::2] = np.sin(sinusoid_table[:, 0::2])  # dim 2i
-    sinusoid_table[:, 1::2] = np.cos(sinusoid_table[:, 1::2])  # dim 2i+1
-    return torch.FloatTensor(sinusoid_table)
-
-
-def position_encoding(seq_len, hidden_size):
-    """ position encoding table """     
-    table = get_sinusoid_table(hidden_size)[:seq_len]
-    # no extra CPU and GPU memory allocation
-    # after getting the (seq_len, hidden_size) tensor, one should first put
-    # this tensor into GPU then expand it
-    return table  # (seq_len, hidden_size)
-
-
 ################
 # SPEC AUGMENT #
 ################
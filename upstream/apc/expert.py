@@ -10,7 +10,7 @@
 import torch
 
 import torch
-from torch.nn.utils.rnn import pad_sequence, pad_packed_sequence
+from torch.nn.utils.rnn import pad_packed_sequence
 
 from upstream.interfaces import UpstreamBase
 from .apc import APC
@@ -44,11 +44,8 @@ class UpstreamExpert(UpstreamBase):
             self.add_hook("self.model", lambda input, output: output[1])
 
     def forward(self, wavs):
-        features = [self.preprocessor(wav.unsqueeze(0)) for wav in wavs]
-        feat_lengths = [len(feat) for feat in features]
-
-        features = pad_sequence(features, batch_first=True)
-        feat_lengths = torch.LongTensor(feat_lengths)
+        features, feat_lengths = self.preprocessor.batch_forward(wavs)
+        feat_lengths = feat_lengths.cpu()
 
         predicted_BxLxM, features = self.model(
             features, feat_lengths, testing=not self.training
@@ -12,7 +12,7 @@ import yaml
 from torch.nn.utils.rnn import pad_sequence
 
 from upstream.interfaces import UpstreamBase
-from .extracter import get_extracter
+from .extracter import get_extracter, get_batch_extracter
 from .preprocessor import get_preprocessor
 
 
@@ -33,16 +33,15 @@ class UpstreamExpert(UpstreamBase):
 
         if "kaldi" in self.config:
             self.extracter, self.output_dim = get_extracter(self.config)
+            self.batch_extracter = get_batch_extracter(self.config)
         else:
             self.extracter, self.output_dim, _ = get_preprocessor(
                 self.config, process_input_only=True
             )
 
     def _extractor_forward(self, wavs):
-        feats = []
-        for wav in wavs:
-            feats.append(self.extracter(wav))
-        return feats
+        feats, feat_lengths = self.batch_extracter(wavs)
+        return [f[:l] for f, l in zip(feats, feat_lengths.tolist())]
 
     def _preprocessor_forward(self, wavs):
         wav_lengths = [len(wav) for wav in wavs]
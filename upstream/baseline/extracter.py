@@ -19,6 +19,8 @@ import torch.nn.functional as F
 #-------------#
 import torchaudio
 from torchaudio import transforms
+#-------------#
+from upstream.kaldi_frontend import KaldiFrontend
 
 
 ############
@@ -40,6 +42,22 @@ def get_extracter(config):
     return extracter, output_dim
 
 
+def get_batch_extracter(config):
+    """The same features as get_extracter, computed for a padded batch at once"""
+    kaldi_config = copy.deepcopy(config.get('kaldi', {}))
+    feat_type = kaldi_config.get('feat_type', 'fbank')
+    delta_config = config.get('delta', {})
+    return KaldiFrontend(
+        feat_type,
+        delta_order=delta_config.get('order', 2),
+        delta_win_length=delta_config.get('win_length', 5),
+        apply_cmvn=config.get('cmvn', {}).get('use_cmvn', False),
+        cmvn_eps=config.get('cmvn', {}).get('eps', 1e-10),
+        sample_frequency=SAMPLE_RATE,
+        **kaldi_config.get(feat_type, {}),
+    )
+
+
 class ExtractAudioFeature(nn.Module):
     def __init__(self, feat_type='fbank', **kwargs):
         super(ExtractAudioFeature, self).__init__()
@@ -2,6 +2,8 @@ import torch
 import torch.nn as nn
 import torchaudio
 from torchaudio.compliance import kaldi
+#-------------#
+from upstream.kaldi_frontend import KaldiFrontend
 
 
 ############
@@ -53,6 +55,12 @@ class FeatureExtractor(nn.Module):
         self.num_mel_bins = num_mel_bins
         self.kwargs = kwargs
         self.decode_wav = decode_wav
+        # computes the same features as forward for a whole batch on the device of the wavs
+        self.batch_extract_fn = KaldiFrontend('fbank', apply_cmvn=self.apply_cmvn,
+                                              num_mel_bins=self.num_mel_bins,
+                                              sample_frequency=SAMPLE_RATE,
+                                              window_type=WINDOW_TYPE,
+                                              **self.kwargs)
         if self.decode_wav:
             # HACK: sox cannot deal with wav with incorrect file length
             torchaudio.set_audio_backend('soundfile')
@@ -78,6 +86,17 @@ class FeatureExtractor(nn.Module):
 
         return y
 
+    def batch_forward(self, wavs):
+        """
+        Args:
+            wavs: list of unpadded wavs [wav1, wav2, ...]
+
+        Return:
+            features: (batch_size, max_len, num_mel_bins), padded with zeros
+            feat_lengths: LongTensor of the number of frames of each wav
+        """
+        return self.batch_extract_fn(wavs)
+
     def extra_repr(self):
         return "mode={}, num_mel_bins={}".format(self.mode, self.num_mel_bins)
 
@@ -1,7 +1,6 @@
 #-------------#
 import torch
 import torch.nn as nn
-from torch.nn.utils.rnn import pad_sequence
 #-------------#
 from .decoar2 import Decoar2
 from .audio import create_transform
@@ -48,10 +47,9 @@ class UpstreamExpert(nn.Module):
                 each feat is in torch.FloatTensor and already
                 put in the device assigned by command-line args
         """
-        features = [self.preprocessor(wav.unsqueeze(0)) for wav in wavs]
-        feat_lengths = [len(feat) for feat in features]
+        features, feat_lengths = self.preprocessor.batch_forward(wavs)
+        feat_lengths = feat_lengths.tolist()
         size = max(feat_lengths)
-        features = pad_sequence(features, batch_first=True)
 
         padding_mask = (
             torch.BoolTensor(features.shape).fill_(False).to(features.device)
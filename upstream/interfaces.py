@@ -1,3 +1,4 @@
+import re
 import sys
 from typing import Callable, List, Dict, Tuple, Union
 
@@ -24,6 +25,10 @@ class Hook:
         assert isinstance(self.unique_identifier, str)
 
 
+class EarlyExit(Exception):
+    """Raised by a hook to stop the upstream forward once all the requested hidden states are captured"""
+
+
 class initHook(type):
     def __call__(cls, *args, **kwargs):
         instance = super().__call__(*args, **kwargs)
@@ -51,6 +56,27 @@ class UpstreamBase(nn.Module, metaclass=initHook):
         self.hook_postprocess = hook_postprocess
         self._hook_hiddens: List[Tuple(str, Tensor)] = []
 
+        # None: all the hooked hidden states are needed, see request_hidden_states
+        self._needed_hidden_states = None
+        self._all_hidden_states_requested = False
+
+    def request_hidden_states(self, layer_ids: List[int] = None):
+        """
+        Declare the hidden_state_{i} a consumer needs, or None for all of them.
+
+        The requests of all the consumers are merged. When only some layers are requested,
+        the unrequested hook outputs are not retained (they are None in 'hidden_states'), and
+        the forward stops right after the hook of the deepest requested layer, in which case
+        'default' is not returned and 'last_hidden_state' is the deepest requested layer.
+        """
+        if layer_ids is None or callable(self.hook_postprocess):
+            # the postprocess may reorder the hook outputs, the indices would not match
+            self._all_hidden_states_requested = True
+        if self._all_hidden_states_requested:
+            self._needed_hidden_states = None
+        else:
+            self._needed_hidden_states = set(self._needed_hidden_states or []) | set(layer_ids)
+
     def remove_all_hooks(self):
         for hook in self.hooks:
             hook.handler.remove()
@@ -86,9 +112,19 @@ class UpstreamBase(nn.Module, metaclass=initHook):
             )
             hook.handler.remove()
 
+        upstream = self
+
         def generate_hook_handler(hiddens: List, hook: Hook):
             def hook_handler(self, input, output):
-                hiddens.append((hook.unique_identifier, hook.transform(input, output)))
+                needed = upstream._needed_hidden_states
+                layer_id = len(hiddens)
+                if needed is None or layer_id in needed:
+                    hiddens.append((hook.unique_identifier, hook.transform(input, output)))
+                else:
+                    hiddens.append((hook.unique_identifier, None))
+
+                if needed is not None and layer_id >= max(needed):
+                    raise EarlyExit
 
             return hook_handler
 
@@ -109,7 +145,10 @@ class UpstreamBase(nn.Module, metaclass=initHook):
     def __call__(self, wavs: List[Tensor], *args, **kwargs):
         self._hook_hiddens.clear()
 
-        result = super().__call__(wavs, *args, **kwargs) or {}
+        try:
+            result = super().__call__(wavs, *args, **kwargs) or {}
+        except EarlyExit:
+            result = {}
         assert isinstance(result, dict)
 
         if len(self._hook_hiddens) > 0:
@@ -143,6 +182,80 @@ class UpstreamBase(nn.Module, metaclass=initHook):
 
         return result
 
+    def stream(
+        self,
+        wav: Tensor,
+        window_secs: float = 10.0,
+        left_context_secs: float = 1.0,
+        right_context_secs: float = 1.0,
+        downsample_rate: int = None,
+        *args,
+        **kwargs,
+    ):
+        """
+        Forward an arbitrarily long waveform window by window, with bounded memory
+
+        Args:
+            wav: a single waveform with dim() == 1
+            window_secs: the length of the audio whose frames are yielded at each step
+            left_context_secs, right_context_secs:
+                the extra audio forwarded on both sides of a window, whose frames are dropped
+            downsample_rate: the number of samples per frame, eg. Featurizer.downsample_rate,
+                estimated from the first window if not given
+
+        Yield:
+            dict with 'hidden_states' (a list of (window_frames, feat_dim) Tensors, one per
+            hooked layer), 'last_hidden_state' and 'hidden_state_{i}', where concatenating the
+            yielded frames along time gives the frames of the whole waveform
+        """
+        assert wav.dim() == 1
+        window = round(window_secs * SAMPLE_RATE)
+        left = round(left_context_secs * SAMPLE_RATE)
+        right = round(right_context_secs * SAMPLE_RATE)
+        total_frames = None
+
+        for start in range(0, len(wav), window):
+            end = min(start + window, len(wav))
+            segment_start = max(0, start - left)
+            segment_end = min(len(wav), end + right)
+
+            with torch.no_grad():
+                result = self([wav[segment_start:segment_end]], *args, **kwargs)
+            hidden_states = result.get("hidden_states")
+            if hidden_states is None:
+                hidden_states = [result["default"]]
+
+            if downsample_rate is None:
+                ratio = (segment_end - segment_start) / hidden_states[-1].size(1)
+                possible_rate = torch.LongTensor([160, 320])
+                downsample_rate = int(possible_rate[(possible_rate - ratio).abs().argmin(dim=-1)])
+            if total_frames is None:
+                assert window % downsample_rate == 0, "window should contain whole frames"
+                total_frames = round(len(wav) / downsample_rate)
+
+            frame_start = start // downsample_rate
+            frame_end = total_frames if end == len(wav) else end // downsample_rate
+            offset = (start - segment_start) // downsample_rate
+            frame_num = frame_end - frame_start
+
+            stitched = []
+            for hidden_state in hidden_states:
+                if hidden_state is None:
+                    # not requested by any consumer, see UpstreamBase.request_hidden_states
+                    stitched.append(None)
+                    continue
+                hidden_state = hidden_state[0, offset : offset + frame_num]
+                if len(hidden_state) < frame_num:
+                    # the model may yield fewer frames at the boundary, repeat the last one to keep alignment
+                    padding = hidden_state[-1:].expand(frame_num - len(hidden_state), -1)
+                    hidden_state = torch.cat([hidden_state, padding], dim=0)
+                stitched.append(hidden_state)
+
+            chunk = {"hidden_states": stitched, "last_hidden_state": stitched[-1]}
+            for layer_id, hidden_state in enumerate(stitched):
+                chunk[f"hidden_state_{layer_id}"] = hidden_state
+            yield chunk
+
 
 class Featurizer(nn.Module):
     def __init__(
@@ -150,6 +263,7 @@ class Featurizer(nn.Module):
         upstream: UpstreamBase,
         feature_selection: str = "hidden_states",
         upstream_device: str = "cuda",
+        early_exit: bool = True,
         **kwargs,
     ):
         super().__init__()
@@ -160,6 +274,14 @@ class Featurizer(nn.Module):
             f"[{self.name}] - The input upstream is only for initialization and not saved in this nn.Module"
         )
 
+        # The upstream only needs to propagate up to the deepest layer consumed here
+        upstream_base = getattr(upstream, "module", upstream)
+        if isinstance(upstream_base, UpstreamBase):
+            layer_ids = self._get_needed_hidden_states() if early_exit else None
+            upstream_base.request_hidden_states(layer_ids)
+            if layer_ids is not None:
+                show(f"[{self.name}] - Only hidden_state_{max(layer_ids)} and below are propagated by the upstream")
+
         # This line is necessary as some models behave differently between train/eval
         # eg. The LayerDrop technique used in wav2vec2
         upstream.eval()
@@ -185,6 +307,10 @@ class Featurizer(nn.Module):
             possible_rate[(possible_rate - ratio).abs().argmin(dim=-1)]
         )
 
+    def _get_needed_hidden_states(self):
+        matched = re.fullmatch(r"hidden_state_(\d+)", self.feature_selection)
+        return [int(matched.group(1))] if matched else None
+
     def _select_feature(self, features):
         feature = features.get(self.feature_selection)
 
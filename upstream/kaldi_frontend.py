@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*- #
+"""*********************************************************************************************"""
+#   FileName     [ upstream/kaldi_frontend.py ]
+#   Synopsis     [ batched Kaldi-compatible spectrogram / fbank / mfcc frontend with length-aware delta and CMVN ]
+#   Author       [ S3PRL ]
+#   Copyright    [ Copyleft(c), Speech Lab, NTU, Taiwan ]
+"""*********************************************************************************************"""
+"""
+Computes the same features as torchaudio.compliance.kaldi.spectrogram / fbank / mfcc (+ torchaudio ComputeDeltas
++ utterance-wise CMVN), but for a padded batch at once, on the device of the input waveforms.
+"""
+
+
+###############
+# IMPORTATION #
+###############
+import math
+#-------------#
+import torch
+import torch.fft
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.nn.utils.rnn import pad_sequence
+#-------------#
+from torchaudio.compliance import kaldi
+
+
+############
+# CONSTANT #
+############
+MILLISECONDS_TO_SECONDS = 0.001
+FEAT_TYPES = ['spectrogram', 'fbank', 'mfcc']
+
+
+def get_window_function(window_type, window_size, blackman_coeff=0.42, dtype=torch.float):
+    # the same as torchaudio.compliance.kaldi._feature_window_function
+    if window_type == 'hanning':
+        return torch.hann_window(window_size, periodic=False, dtype=dtype)
+    elif window_type == 'hamming':
+        return torch.hamming_window(window_size, periodic=False, alpha=0.54, beta=0.46, dtype=dtype)
+    elif window_type == 'povey':
+        return torch.hann_window(window_size, periodic=False, dtype=dtype).pow(0.85)
+    elif window_type == 'rectangular':
+        return torch.ones(window_size, dtype=dtype)
+    elif window_type == 'blackman':
+        a = 2 * math.pi / (window_size - 1)
+        window_function = torch.arange(window_size, dtype=dtype)
+        return (blackman_coeff - 0.5 * torch.cos(a * window_function) +
+                (0.5 - blackman_coeff) * torch.cos(2 * a * window_function))
+    else:
+        raise ValueError(f'Invalid window type {window_type}')
+
+
+def get_dct_matrix(num_ceps, num_mel_bins):
+    # orthonormal DCT-II with the kaldi scaling on the first coefficient, [num_mel_bins, num_ceps]
+    n = torch.arange(num_mel_bins, dtype=torch.float)
+    k = torch.arange(num_ceps, dtype=torch.float)
+    dct = torch.cos(math.pi / num_mel_bins * (n.unsqueeze(1) + 0.5) * k.unsqueeze(0)) * math.sqrt(2.0 / num_mel_bins)
+    dct[:, 0] = math.sqrt(1.0 / num_mel_bins)
+    return dct
+
+
+def get_lifter_coeffs(num_ceps, cepstral_lifter):
+    i = torch.arange(num_ceps, dtype=torch.float)
+    return 1.0 + 0.5 * cepstral_lifter * torch.sin(math.pi * i / cepstral_lifter)
+
+
+def lengths_to_mask(lengths, max_len):
+    return torch.arange(max_len, device=lengths.device).unsqueeze(0) < lengths.unsqueeze(1)
+
+
+def compute_deltas(feats, lengths, win_length=5):
+    """
+    The same as torchaudio.transforms.ComputeDeltas (replicate padding) applied to each
+    unpadded utterance, where the replicated frame is the last valid one instead of the padding
+
+    Args:
+        feats: (batch_size, max_len, feat_dim)
+        lengths: (batch_size, )
+    """
+    n = (win_length - 1) // 2
+    denom = n * (n + 1) * (2 * n + 1) / 3
+    max_len = feats.size(1)
+    positions = torch.arange(max_len, device=feats.device).unsqueeze(0)
+    last = (lengths - 1).clamp(min=0).unsqueeze(1)
+    gather = lambda index: feats.gather(1, index.unsqueeze(-1).expand(-1, -1, feats.size(-1)))
+    deltas = torch.zeros_like(feats)
+    for k in range(1, n + 1):
+        forward = torch.min(positions + k, last)
+        backward = torch.min((positions - k).clamp(min=0), last)
+        deltas = deltas + k * (gather(forward) - gather(backward))
+    return deltas / denom
+
+
+def cmvn(feats, lengths, eps=1e-10):
+    """
+    Utterance-wise (x - mean) / (eps + std) over the valid frames, std is unbiased as torch.std
+
+    Args:
+        feats: (batch_size, max_len, feat_dim)
+        lengths: (batch_size, )
+    """
+    mask = lengths_to_mask(lengths, feats.size(1)).unsqueeze(-1).to(feats.dtype)
+    counts = lengths.to(feats.dtype).unsqueeze(-1)
+    mean = (feats * mask).sum(dim=1) / counts.clamp(min=1)
+    var = (((feats - mean.unsqueeze(1)) * mask) ** 2).sum(dim=1) / (counts - 1).clamp(min=1)
+    return (feats - mean.unsqueeze(1)) / (eps + var.sqrt().unsqueeze(1))
+
+
+class KaldiFrontend(nn.Module):
+    """
+    Batched torchaudio.compliance.kaldi.spectrogram / fbank / mfcc
+
+    Args:
+        feat_type: 'spectrogram', 'fbank' or 'mfcc'
+        delta_order: append delta features up to this order, 0 for no delta
+        delta_win_length: window length of torchaudio ComputeDeltas
+        apply_cmvn: utterance-wise mean variance normalization after the deltas
+        cmvn_eps: eps added to the standard deviation
+        frame_subsample: take every frame_subsample frames after CMVN (eg. DeCoAR low frame rate)
+        **kwargs: options of kaldi.spectrogram / kaldi.fbank / kaldi.mfcc, with the same names and defaults
+    """
+    def __init__(self, feat_type='fbank', delta_order=0, delta_win_length=5, apply_cmvn=False,
+                 cmvn_eps=1e-10, frame_subsample=1, sample_frequency=16000.0,
+                 frame_length=25.0, frame_shift=10.0, round_to_power_of_two=True, snip_edges=True,
+                 dither=0.0, remove_dc_offset=True, raw_energy=True, preemphasis_coefficient=0.97,
+                 window_type='povey', blackman_coeff=0.42, energy_floor=1.0, use_energy=False,
+                 htk_compat=False, subtract_mean=False, num_mel_bins=23, low_freq=20.0,
+                 high_freq=0.0, vtln_low=100.0, vtln_high=-500.0, vtln_warp=1.0,
+                 use_log_fbank=True, use_power=True, num_ceps=13, cepstral_lifter=22.0,
+                 channel=-1, min_duration=0.0):
+        super(KaldiFrontend, self).__init__()
+        assert feat_type in FEAT_TYPES, f'feat_type should be one of {FEAT_TYPES}'
+        assert snip_edges, 'Only snip_edges=True is supported by the batched frontend'
+        if feat_type == 'mfcc':
+            assert use_log_fbank and use_power, 'mfcc is computed from the log power fbank'
+        self.feat_type = feat_type
+        self.delta_order = delta_order
+        self.delta_win_length = delta_win_length
+        self.apply_cmvn = apply_cmvn
+        self.cmvn_eps = cmvn_eps
+        self.frame_subsample = frame_subsample
+
+        self.window_size = int(sample_frequency * frame_length * MILLISECONDS_TO_SECONDS)
+        self.window_shift = int(sample_frequency * frame_shift * MILLISECONDS_TO_SECONDS)
+        self.padded_window_size = 2 ** (self.window_size - 1).bit_length() if round_to_power_of_two else self.window_size
+        self.dither = dither
+        self.remove_dc_offset = remove_dc_offset
+        self.raw_energy = raw_energy
+        self.preemphasis_coefficient = preemphasis_coefficient
+        self.energy_floor = energy_floor
+        self.use_energy = use_energy
+        self.htk_compat = htk_compat
+        self.subtract_mean = subtract_mean
+        self.use_log_fbank = use_log_fbank
+        self.use_power = use_power
+        self.num_mel_bins = num_mel_bins
+
+        # not in the state_dict, so upstream checkpoints stay unchanged
+        window = get_window_function(window_type, self.window_size, blackman_coeff)
+        self.register_buffer('window', window, persistent=False)
+        if feat_type != 'spectrogram':
+            mel_banks, _ = kaldi.get_mel_banks(self.num_mel_bins, self.padded_window_size, float(sample_frequency),
+                                               low_freq, high_freq, vtln_low, vtln_high, vtln_warp)
+            mel_banks = F.pad(mel_banks.float(), (0, 1), mode='constant', value=0)
+            self.register_buffer('mel_banks', mel_banks.t().contiguous(), persistent=False)
+        if feat_type == 'mfcc':
+            self.num_ceps = num_ceps
+            self.register_buffer('dct_matrix', get_dct_matrix(num_ceps, self.num_mel_bins), persistent=False)
+            lifter = get_lifter_coeffs(num_ceps, cepstral_lifter) if cepstral_lifter != 0.0 else torch.ones(num_ceps)
+            self.register_buffer('lifter_coeffs', lifter, persistent=False)
+
+    def get_num_frames(self, wav_lengths):
+        """Number of frames of kaldi with snip_edges=True"""
+        num_frames = 1 + (wav_lengths - self.window_size).clamp(min=0) // self.window_shift
+        return torch.where(wav_lengths < self.window_size, torch.zeros_like(num_frames), num_frames)
+
+    def _fbank(self, wavs, num_frames):
+        # wavs: (batch_size, max_wav_len) -> frames: (batch_size, max_frames, window_size)
+        max_frames = max(int(num_frames.max()), 1)
+        needed = self.window_size + (max_frames - 1) * self.window_shift
+        if wavs.size(1) < needed:
+            wavs = F.pad(wavs, (0, needed - wavs.size(1)))
+        frames = wavs.unfold(1, self.window_size, self.window_shift)[:, :max_frames]
+
+        epsilon = torch.finfo(frames.dtype).eps
+        if self.dither != 0.0:
+            frames = frames + self.dither * torch.randn_like(frames)
+        if self.remove_dc_offset:
+            frames = frames - frames.mean(dim=-1, keepdim=True)
+        if self.raw_energy:
+            log_energy = self._log_energy(frames, epsilon)
+        if self.preemphasis_coefficient != 0.0:
+            previous = torch.cat([frames[..., :1], frames[..., :-1]], dim=-1)
+            frames = frames - self.preemphasis_coefficient * previous
+        frames = frames * self.window.to(frames.dtype)
+        if self.padded_window_size != self.window_size:
+            frames = F.pad(frames, (0, self.padded_window_size - self.window_size))
+        if not self.raw_energy:
+            log_energy = self._log_energy(frames, epsilon)
+
+        spectrum = torch.fft.rfft(frames, dim=-1).abs()
+        if self.feat_type == 'spectrogram':
+            # the log power spectrum, whose first bin is replaced by the log energy as kaldi.spectrogram
+            power_spectrum = torch.clamp(spectrum.pow(2), min=epsilon).log()
+            power_spectrum[..., 0] = log_energy
+            return power_spectrum, log_energy
+        if self.use_power:
+            spectrum = spectrum.pow(2)
+        mel_energies = torch.matmul(spectrum, self.mel_banks.to(spectrum.dtype))
+        if self.use_log_fbank:
+            mel_energies = torch.clamp(mel_energies, min=epsilon).log()
+        return mel_energies, log_energy
+
+    def _log_energy(self, frames, epsilon):
+        log_energy = torch.clamp(frames.pow(2).sum(-1), min=epsilon).log()
+        if self.energy_floor != 0.0:
+            log_energy = torch.clamp(log_energy, min=math.log(self.energy_floor))
+        return log_energy
+
+    def forward(self, wavs, wav_lengths=None):
+        """
+        Args:
+            wavs: list of unpadded wavs [wav1, wav2, ...], or a padded (batch_size, max_wav_len) tensor
+            wav_lengths: (batch_size, ) required when wavs is padded
+
+        Return:
+            feats: (batch_size, max_len, feat_dim), zeros on the padded frames
+            feat_lengths: (batch_size, ) LongTensor on the same device
+        """
+        if isinstance(wavs, (list, tuple)):
+            wav_lengths = torch.LongTensor([len(wav) for wav in wavs]).to(wavs[0].device)
+            wavs = pad_sequence(wavs, batch_first=True)
+        wav_lengths = wav_lengths.to(wavs.device)
+        num_frames = self.get_num_frames(wav_lengths)
+
+        feats, log_energy = self._fbank(wavs, num_frames)
+        if self.feat_type == 'fbank':
+            if self.use_energy:
+                energy = log_energy.unsqueeze(-1)
+                feats = torch.cat([feats, energy] if self.htk_compat else [energy, feats], dim=-1)
+        elif self.feat_type == 'mfcc':
+            feats = torch.matmul(feats, self.dct_matrix.to(feats.dtype)) * self.lifter_coeffs.to(feats.dtype)
+            if self.use_energy:
+                feats[..., 0] = log_energy
+            if self.htk_compat:
+                energy = feats[..., :1]
+                if not self.use_energy:
+                    energy = energy * math.sqrt(2)
+                feats = torch.cat([feats[..., 1:], energy], dim=-1)
+
+        mask = lengths_to_mask(num_frames, feats.size(1)).unsqueeze(-1).to(feats.dtype)
+        if self.subtract_mean:
+            mean = (feats * mask).sum(dim=1, keepdim=True) / num_frames.clamp(min=1).to(feats.dtype).view(-1, 1, 1)
+            feats = feats - mean
+
+        if self.delta_order > 0:
+            deltas = [feats]
+            for _ in range(self.delta_order):
+                deltas.append(compute_deltas(deltas[-1], num_frames, self.delta_win_length))
+            feats = torch.cat(deltas, dim=-1)
+
+        if self.apply_cmvn:
+            feats = cmvn(feats, num_frames, self.cmvn_eps)
+
+        feats = feats * mask
+        if self.frame_subsample > 1:
+            feats = feats[:, ::self.frame_subsample]
+            num_frames = (num_frames + self.frame_subsample - 1) // self.frame_subsample
+        return feats, num_frames
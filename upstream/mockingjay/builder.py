@@ -16,15 +16,14 @@ import yaml
 import torch
 import random
 import torchaudio
-import numpy as np
 import torch.nn as nn
 from torch.nn.utils.rnn import pad_sequence
-from functools import lru_cache
 from distutils.util import strtobool
 from upstream.baseline.extracter import get_extracter
 from upstream.baseline.preprocessor import get_preprocessor
 from .model import TransformerConfig, TransformerModel
 from .model import TransformerSpecPredictionHead
+from .position import position_encoding, get_attention_mask
 
 
 #######################
@@ -57,12 +56,17 @@ class TransformerBuilder(nn.Module):
         if str(options['dropout']) != 'default': # increase dropout if specified
             self.config['transformer']['hidden_dropout_prob'] = float(options['dropout'])
             self.config['transformer']['attention_probs_dropout_prob'] = float(options['dropout'])
+        if str(options.get('attention', 'default')) != 'default': # switch the attention implementation if specified
+            self.config['transformer']['attention'] = str(options['attention'])
 
         # Set model config
         self.model_config = TransformerConfig(self.config['transformer'])
         self.hidden_size = self.model_config.hidden_size
         self.num_layers = self.model_config.num_hidden_layers
         self.max_input_length = self.config['task']['sequence_length']
+        if self.model_config.attention == 'memory_efficient':
+            # the attention memory is linear in the input length, long inputs are forwarded as a whole
+            self.max_input_length = 0
 
         if on_the_fly_config is not None:
             self.config['audio'] = yaml.load(open(on_the_fly_config, 'r'), Loader=yaml.FullLoader)
@@ -150,25 +154,19 @@ class TransformerBuilder(nn.Module):
         elif len(feat.shape) != 3:
             raise ValueError('Input argument `feat` has invalid shape: {}'.format(feat.shape))
 
-        # Record length for each uttr
+        # Record length for each uttr, kept on the device of `feat`
         spec_len = (feat.sum(dim=-1) != 0).long().sum(dim=-1)
-        spec_len = spec_len.tolist()
 
         batch_size = feat.shape[0]
         seq_len = feat.shape[1]
 
-        pos_enc = position_encoding(seq_len, self.hidden_size) # (seq_len, hidden_size)
-        attn_mask = np.ones((batch_size, seq_len)) # (batch_size, seq_len)
-
         # zero vectors for padding dimension
-        for idx in range(len(feat)):
-            attn_mask[idx][spec_len[idx]:] = 0 
+        attn_mask = get_attention_mask(spec_len, seq_len) # (batch_size, seq_len)
 
         if self.spec_aug and self.spec_aug_prev and self.model.training and self.inp_dim > 1:
             feat = spec_augment(feat, mask_T=70, mask_F=9, num_T=2, num_F=2, p=1.0) # (batch_size, seq_len, feature_dim * dr)
         feat = feat.to(dtype=torch.float32) # (batch_size, seq_len, feature_dim * dr)
-        pos_enc = torch.FloatTensor(pos_enc).to(device=feat.device, dtype=torch.float32).expand(feat.size(0), *pos_enc.size()) # (batch_size, seq_len, hidden_size)
-        attn_mask = torch.FloatTensor(attn_mask).to(device=feat.device, dtype=torch.float32) # (batch_size, seq_len)
+        pos_enc = position_encoding(seq_len, self.hidden_size, feat.device).expand(batch_size, -1, -1) # (batch_size, seq_len, hidden_size)
         return feat, pos_enc, attn_mask # (x, pos_enc, attention_mask)
 
 
@@ -235,6 +233,7 @@ class PretrainedTransformer(TransformerBuilder):
             weighted_sum: str, ['True', 'False'], whether to use a learnable weighted sum to integrate hidden representations from all layers, if False then use the one specified in `select_layer`
             select_layer: int, select from all hidden representations, set to -1 to select the last (will only be used when weighted_sum is False)
             permute_input: str, ['True', 'False'], this attribute is for the forward method. Ture: input / ouput of shape (T, B, D); False: input / ouput of shape (B, T, D)
+            attention: optional str, ['default', 'memory_efficient'], overrides the attention implementation, 'memory_efficient' also disables the `sequence_length` chunking
         `intput_dim`: int, input dimension of model
         `config`: optional, reads the given yaml config and not use the config stored in `ckpt_file`
 
@@ -319,31 +318,6 @@ class PretrainedTransformerWithHead(PretrainedTransformer):
         return x
 
 
-#######################
-# POSITIONAL ENCODING #
-#######################
-MAX_SEQLEN = 24000
-@lru_cache(maxsize=128)
-def get_sinusoid_table(hidden_size):
-    def _cal_angle(position, hid_idx):
-        return position / np.power(10000, 2 * (hid_idx // 2) / hidden_size)
-    def _get_posi_angle_vec(position):
-        return [_cal_angle(position, hid_j) for hid_j in range(hidden_size)]
-    sinusoid_table = np.array([_get_posi_angle_vec(pos_i) for pos_i in range(MAX_SEQLEN)])
-    sinusoid_table[:, 0::2] = np.sin(sinusoid_table[:, 0::2])  # dim 2i
-    sinusoid_table[:, 1::2] = np.cos(sinusoid_table[:, 1::2])  # dim 2i+1
-    return torch.FloatTensor(sinusoid_table)
-
-
-def position_encoding(seq_len, hidden_size):
-    """ position encoding table """     
-    table = get_sinusoid_table(hidden_size)[:seq_len]
-    # no extra CPU and GPU memory allocation
-    # after getting the (seq_len, hidden_size) tensor, one should first put
-    # this tensor into GPU then expand it
-    return table  # (seq_len, hidden_size)
-
-
 ################
 # SPEC AUGMENT #
 ################
@@ -18,6 +18,8 @@ import torch
 import numpy as np
 from io import open
 from torch import nn
+import torch.nn.functional as F
+from torch.utils.checkpoint import checkpoint
 
 
 class TransformerConfig(object):
@@ -35,6 +37,10 @@ class TransformerConfig(object):
         self.layer_norm_eps = float(config['layer_norm_eps'])
         self.share_layer = bool(config['share_layer'])
         self.pre_layer_norm = bool(config['pre_layer_norm'])
+        self.attention = str(config.get('attention', 'default'))
+        self.attention_chunk_size = int(config.get('attention_chunk_size', 512))
+        if self.attention not in ['default', 'memory_efficient']:
+            raise ValueError('Unsupported attention: %s, should be \'default\' or \'memory_efficient\'' % self.attention)
 
 
 def prune_linear_layer(layer, index, dim=0):
@@ -126,6 +132,8 @@ class TransformerSelfAttention(nn.Module):
         self.output_attentions = output_attentions
         self.keep_multihead_output = keep_multihead_output
         self.multihead_output = None
+        self.memory_efficient = config.attention == 'memory_efficient'
+        self.chunk_size = config.attention_chunk_size
 
         self.num_attention_heads = config.num_attention_heads
         self.attention_head_size = int(config.hidden_size / config.num_attention_heads)
@@ -143,6 +151,10 @@ class TransformerSelfAttention(nn.Module):
         return x.permute(0, 2, 1, 3)
 
     def forward(self, hidden_states, attention_mask, head_mask=None):
+        # the attention probabilities are never materialized as a whole in the memory efficient path
+        if self.memory_efficient and not self.output_attentions:
+            return self.memory_efficient_forward(hidden_states, attention_mask, head_mask)
+
         mixed_query_layer = self.query(hidden_states)
         mixed_key_layer = self.key(hidden_states)
         mixed_value_layer = self.value(hidden_states)
@@ -184,6 +196,52 @@ class TransformerSelfAttention(nn.Module):
             return attention_probs, context_layer
         return context_layer
 
+    def _attend(self, query_layer, key_layer, value_layer, attention_mask, head_mask):
+        attention_scores = torch.matmul(query_layer, key_layer.transpose(-1, -2)) + attention_mask
+        attention_probs = self.dropout(F.softmax(attention_scores, dim=-1))
+        if head_mask is not None:
+            attention_probs = attention_probs * head_mask
+        return torch.matmul(attention_probs, value_layer)
+
+    def memory_efficient_forward(self, hidden_states, attention_mask, head_mask=None):
+        """
+        Same computation and parameters as forward(), but:
+            1. query, key and value are projected with a single fused matmul
+            2. attention_mask is the (batch_size, 1, 1, seqlen) key padding mask and is only broadcast
+            3. the softmax is computed for chunk_size queries at a time, so the scores take
+               (batch_size, head_num, chunk_size, seqlen) instead of (batch_size, head_num, seqlen, seqlen).
+               When training, each chunk is recomputed in backward instead of keeping its probabilities.
+        """
+        weight = torch.cat([self.query.weight, self.key.weight, self.value.weight], dim=0)
+        bias = torch.cat([self.query.bias, self.key.bias, self.value.bias], dim=0)
+        mixed_layer = F.linear(hidden_states, weight, bias)
+        # mixed_layer: (batch_size, seqlen, 3 * head_num * head_dim)
+
+        batch_size, seqlen = mixed_layer.shape[:2]
+        mixed_layer = mixed_layer.view(batch_size, seqlen, 3, self.num_attention_heads, self.attention_head_size)
+        query_layer, key_layer, value_layer = mixed_layer.permute(2, 0, 3, 1, 4).unbind(dim=0)
+        # each layer: (batch_size, head_num, seqlen, head_dim)
+
+        # scaling the queries is equivalent to scaling the scores
+        query_layer = query_layer / math.sqrt(self.attention_head_size)
+        use_checkpoint = torch.is_grad_enabled() and mixed_layer.requires_grad
+
+        context_chunks = []
+        for query_chunk in query_layer.split(self.chunk_size, dim=2):
+            if use_checkpoint:
+                context_chunk = checkpoint(self._attend, query_chunk, key_layer, value_layer, attention_mask, head_mask)
+            else:
+                context_chunk = self._attend(query_chunk, key_layer, value_layer, attention_mask, head_mask)
+            context_chunks.append(context_chunk)
+        context_layer = torch.cat(context_chunks, dim=2)
+        # context_layer: (batch_size, head_num, seqlen, head_dim)
+        if self.keep_multihead_output:
+            self.multihead_output = context_layer
+            self.multihead_output.retain_grad()
+
+        context_layer = context_layer.permute(0, 2, 1, 3).contiguous()
+        return context_layer.view(batch_size, seqlen, self.all_head_size)
+
 
 class TransformerSelfOutput(nn.Module):
     def __init__(self, config):
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*- #
+"""*********************************************************************************************"""
+#   FileName     [ upstream/mockingjay/position.py ]
+#   Synopsis     [ positional encodings and attention masks for the transformer inputs ]
+#   Author       [ S3PRL ]
+#   Copyright    [ Copyleft(c), Speech Lab, NTU, Taiwan ]
+"""*********************************************************************************************"""
+
+
+###############
+# IMPORTATION #
+###############
+import torch
+
+
+#######################
+# POSITIONAL ENCODING #
+#######################
+MIN_SEQLEN = 1024
+_SINUSOID_TABLES = {}
+
+
+def _build_sinusoid_table(max_seqlen, hidden_size):
+    # computed in float64 like the original numpy table, then cast
+    position = torch.arange(max_seqlen, dtype=torch.float64).unsqueeze(-1)
+    hid_idx = torch.arange(hidden_size, dtype=torch.float64)
+    sinusoid_table = position / torch.pow(10000, 2 * torch.floor(hid_idx / 2) / hidden_size)
+    sinusoid_table[:, 0::2] = torch.sin(sinusoid_table[:, 0::2])  # dim 2i
+    sinusoid_table[:, 1::2] = torch.cos(sinusoid_table[:, 1::2])  # dim 2i+1
+    return sinusoid_table.float()
+
+
+def get_sinusoid_table(hidden_size, seq_len=0, device='cpu'):
+    """
+    Return a (max_seqlen, hidden_size) table with max_seqlen >= seq_len on the given device.
+    The table is computed once per (hidden_size, device), and doubled when a longer sequence comes.
+    """
+    key = (hidden_size, torch.device(device))
+    table = _SINUSOID_TABLES.get(key)
+    if table is None or len(table) < seq_len:
+        max_seqlen = max(seq_len, MIN_SEQLEN if table is None else 2 * len(table))
+        table = _build_sinusoid_table(max_seqlen, hidden_size).to(device)
+        _SINUSOID_TABLES[key] = table
+    return table
+
+
+def position_encoding(seq_len, hidden_size, device='cpu'):
+    """ position encoding table """
+    # a view of the cached table, no extra memory allocation
+    # expand it after getting the (seq_len, hidden_size) tensor for the batch axis
+    return get_sinusoid_table(hidden_size, seq_len, device)[:seq_len]  # (seq_len, hidden_size)
+
+
+##################
+# ATTENTION MASK #
+##################
+def get_attention_mask(spec_len, seq_len, dtype=torch.float32):
+    """
+    Build the (batch_size, seq_len) mask of 1 for the valid frames and 0 for the padding,
+    on the device of the `spec_len` tensor
+    """
+    if not torch.is_tensor(spec_len):
+        spec_len = torch.LongTensor(spec_len)
+    positions = torch.arange(seq_len, device=spec_len.device)
+    return (positions.unsqueeze(0) < spec_len.unsqueeze(-1)).to(dtype=dtype)
@@ -8,7 +8,6 @@
 
 
 import torch
-from torch.nn.utils.rnn import pad_sequence
 
 from upstream.interfaces import UpstreamBase
 from .npc import NPC
@@ -41,8 +40,7 @@ class UpstreamExpert(UpstreamBase):
             self.add_hook("self.model", lambda input, output: output[1])
 
     def forward(self, wavs):
-        features = [self.preprocessor(wav.unsqueeze(0)) for wav in wavs]
-        features = pad_sequence(features, batch_first=True)
+        features, _ = self.preprocessor.batch_forward(wavs)
 
         predicted_BxLxM, features = self.model(features, testing=not self.training)
         return {"default": features}
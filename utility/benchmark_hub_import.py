@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*- #
+"""*********************************************************************************************"""
+#   FileName     [ utility/benchmark_hub_import.py ]
+#   Synopsis     [ measure the cold-start time of the lazy upstream registry in hubconf.py ]
+#   Author       [ S3PRL ]
+#   Copyright    [ Copyleft(c), Speech Lab, NTU, Taiwan ]
+"""*********************************************************************************************"""
+"""
+Usage:
+    python3 utility/benchmark_hub_import.py --upstream fbank --n_trials 3
+"""
+
+
+###############
+# IMPORTATION #
+###############
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY = """
+import hubconf
+hubconf.{upstream}
+"""
+
+# the behavior before the lazy registry: every hubconf module is imported up front
+EAGER = """
+import importlib
+import hubconf
+for module_name in sorted(set(hubconf._entries.values())):
+    try:
+        importlib.import_module(module_name)
+    except ModuleNotFoundError:
+        pass
+hubconf.{upstream}
+"""
+
+CLI = """
+import sys
+sys.argv = ['run_downstream.py', '-m', 'train', '-u', '{upstream}', '-h']
+try:
+    import run_downstream
+    run_downstream.get_downstream_args()
+except SystemExit:
+    pass
+"""
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--upstream', default='fbank')
+    parser.add_argument('--n_trials', default=3, type=int)
+    return parser.parse_args()
+
+
+def cold_start(code, n_trials):
+    seconds = []
+    for _ in range(n_trials):
+        start = time.time()
+        subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        seconds.append(time.time() - start)
+    return min(seconds)
+
+
+def main():
+    args = get_args()
+    for name, code in [('eager hubconf', EAGER), ('lazy hubconf', LAZY), ('run_downstream.py -h', CLI)]:
+        seconds = cold_start(code.format(upstream=args.upstream), args.n_trials)
+        print(f'[{name}] -u {args.upstream}: {seconds:.3f} sec')
+
+
+if __name__ == '__main__':
+    main()
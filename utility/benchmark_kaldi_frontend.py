@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*- #
+"""*********************************************************************************************"""
+#   FileName     [ utility/benchmark_kaldi_frontend.py ]
+#   Synopsis     [ compare the batched kaldi frontend against per-utterance torchaudio.compliance.kaldi ]
+#   Author       [ S3PRL ]
+#   Copyright    [ Copyleft(c), Speech Lab, NTU, Taiwan ]
+"""*********************************************************************************************"""
+"""
+Usage:
+    python3 utility/benchmark_kaldi_frontend.py --device cuda --batch_sizes 8 32 128
+"""
+
+
+###############
+# IMPORTATION #
+###############
+import os
+import sys
+import time
+import torch
+import argparse
+from torchaudio.compliance import kaldi
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from upstream.kaldi_frontend import KaldiFrontend
+from upstream.baseline.extracter import Delta, CMVN
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--batch_sizes', default=[8, 32, 128], type=int, nargs='+')
+    parser.add_argument('--max_secs', default=15, type=float)
+    parser.add_argument('--n_trials', default=10, type=int)
+    return parser.parse_args()
+
+
+def get_loop_fn(feat_type, kwargs, delta_order, apply_cmvn):
+    extract_fn = getattr(kaldi, feat_type)
+    delta = Delta(order=delta_order)
+    cmvn = CMVN(use_cmvn=apply_cmvn)
+
+    def loop_fn(wavs):
+        feats = []
+        for wav in wavs:
+            feat = extract_fn(wav.view(1, -1), sample_frequency=16000, **kwargs)
+            if delta_order > 0:
+                feat = delta(feat)
+            feats.append(cmvn(feat))
+        return feats
+    return loop_fn
+
+
+def timeit(fn, wavs, n_trials, device):
+    fn(wavs)
+    if device.startswith('cuda'):
+        torch.cuda.synchronize()
+    start = time.time()
+    for _ in range(n_trials):
+        fn(wavs)
+    if device.startswith('cuda'):
+        torch.cuda.synchronize()
+    return (time.time() - start) / n_trials * 1000
+
+
+def main():
+    args = get_args()
+    settings = [
+        ('fbank (apc/npc/decoar)', 'fbank', dict(num_mel_bins=80, window_type='hamming'), 0, True),
+        ('fbank (baseline)', 'fbank', dict(num_mel_bins=80, use_log_fbank=True), 2, True),
+        ('mfcc (baseline)', 'mfcc', dict(num_ceps=13), 2, True),
+    ]
+    for batch_size in args.batch_sizes:
+        lengths = torch.randint(16000, int(args.max_secs * 16000), (batch_size,))
+        wavs = [torch.randn(int(l), device=args.device) * 0.1 for l in lengths]
+        for name, feat_type, kwargs, delta_order, apply_cmvn in settings:
+            loop_fn = get_loop_fn(feat_type, kwargs, delta_order, apply_cmvn)
+            frontend = KaldiFrontend(feat_type, delta_order=delta_order, apply_cmvn=apply_cmvn, **kwargs).to(args.device)
+            batch_fn = lambda wavs: frontend(wavs)
+
+            feats, feat_lengths = batch_fn(wavs)
+            diff = max((ref - feat[:l]).abs().max().item()
+                       for ref, feat, l in zip(loop_fn(wavs), feats, feat_lengths.tolist()))
+            loop_ms = timeit(loop_fn, wavs, args.n_trials, args.device)
+            batch_ms = timeit(batch_fn, wavs, args.n_trials, args.device)
+            print(f'[{name}] batch_size {batch_size}: loop {loop_ms:.3f} ms, batched {batch_ms:.3f} ms, '
+                  f'{loop_ms / batch_ms:.1f}x, max abs diff {diff:.2e}')
+
+
+if __name__ == '__main__':
+    main()
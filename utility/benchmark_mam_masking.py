@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*- #
+"""*********************************************************************************************"""
+#   FileName     [ utility/benchmark_mam_masking.py ]
+#   Synopsis     [ compare the batched and looped masked acoustic model data generation ]
+#   Author       [ S3PRL ]
+#   Copyright    [ Copyleft(c), Speech Lab, NTU, Taiwan ]
+"""*********************************************************************************************"""
+"""
+Usage:
+    python3 utility/benchmark_mam_masking.py --config pretrain/tera/config_model.yaml
+    python3 utility/benchmark_mam_masking.py --config pretrain/tera/config_model.yaml --no_overlap
+"""
+
+
+###############
+# IMPORTATION #
+###############
+import os
+import sys
+import time
+import yaml
+import torch
+import random
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pretrain.mockingjay.task import generate_masked_acoustic_model_data, generate_masked_acoustic_model_data_loop
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', default='pretrain/tera/config_model.yaml')
+    parser.add_argument('--no_overlap', action='store_true', help='Set mask_allow_overlap to False')
+    parser.add_argument('--batch_size', default=32, type=int)
+    parser.add_argument('--max_len', default=1500, type=int)
+    parser.add_argument('--feat_dim', default=80, type=int)
+    parser.add_argument('--n_trials', default=50, type=int)
+    parser.add_argument('--seed', default=1337, type=int)
+    return parser.parse_args()
+
+
+def random_batch(batch_size, max_len, feat_dim):
+    lengths = torch.randint(max_len // 4, max_len + 1, (batch_size,))
+    spec = torch.randn(batch_size, int(lengths.max()), feat_dim)
+    for idx, length in enumerate(lengths):
+        spec[idx, length:] = 0
+    return spec
+
+
+def statistics(outputs):
+    time_ratio, freq_ratio, changed_ratio = [], [], []
+    for spec_masked, _, mask_label, attn_mask, spec_target in outputs:
+        valid = attn_mask.bool()
+        time_ratio.append(mask_label.all(dim=-1)[valid].float().mean().item())
+        for label, length in zip(mask_label, valid.sum(dim=-1)):
+            freq_ratio.append(label[:length].all(dim=0).float().mean().item())
+        changed_ratio.append((spec_masked != spec_target).any(dim=-1)[valid].float().mean().item())
+    mean = lambda values: sum(values) / len(values)
+    return {
+        'masked frame ratio': mean(time_ratio),
+        'masked band ratio': mean(freq_ratio),
+        'changed frame ratio': mean(changed_ratio),
+    }
+
+
+def main():
+    args = get_args()
+    with open(args.config, 'r') as file:
+        config = yaml.load(file, Loader=yaml.FullLoader)['task']
+    if args.no_overlap:
+        config['mask_allow_overlap'] = False
+
+    random.seed(args.seed)
+    torch.manual_seed(args.seed)
+    batches = [random_batch(args.batch_size, args.max_len, args.feat_dim) for _ in range(args.n_trials)]
+
+    for name, fn in [('loop', generate_masked_acoustic_model_data_loop), ('batched', generate_masked_acoustic_model_data)]:
+        outputs = []
+        start = time.time()
+        for spec in batches:
+            outputs.append(fn(spec=(spec.clone(),), config=config))
+        elapsed = time.time() - start
+
+        print(f'[{name}] - {args.n_trials * args.batch_size / elapsed:.1f} utterances/sec')
+        for key, value in statistics(outputs).items():
+            print(f'[{name}] - {key}: {value:.4f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*- #
+"""*********************************************************************************************"""
+#   FileName     [ utility/benchmark_optimizers.py ]
+#   Synopsis     [ compare the step time and results of the multi-tensor optimizers against the per-parameter ones ]
+#   Author       [ S3PRL ]
+#   Copyright    [ Copyleft(c), Speech Lab, NTU, Taiwan ]
+"""*********************************************************************************************"""
+"""
+Usage:
+    python3 utility/benchmark_optimizers.py --device cuda --n_layers 24 --hidden_size 1024
+"""
+
+
+###############
+# IMPORTATION #
+###############
+import os
+import sys
+import copy
+import time
+import argparse
+#-------------#
+import torch
+import torch.nn as nn
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import optimizers
+from optimizers import get_grouped_parameters
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--n_layers', default=24, type=int)
+    parser.add_argument('--hidden_size', default=1024, type=int)
+    parser.add_argument('--n_steps', default=20, type=int)
+    return parser.parse_args()
+
+
+class Layer(nn.Module):
+    """A transformer-like layer: many tensors of mixed sizes, with and without weight decay"""
+    def __init__(self, hidden_size):
+        super().__init__()
+        self.query = nn.Linear(hidden_size, hidden_size)
+        self.key = nn.Linear(hidden_size, hidden_size)
+        self.value = nn.Linear(hidden_size, hidden_size)
+        self.output = nn.Linear(hidden_size, hidden_size)
+        self.LayerNorm = nn.LayerNorm(hidden_size)
+        self.intermediate = nn.Linear(hidden_size, hidden_size * 4)
+        self.dense = nn.Linear(hidden_size * 4, hidden_size)
+
+
+def get_settings():
+    # (name, reference optimizer, multi-tensor optimizer, kwargs, whether to group the parameters)
+    return [
+        ('AdamW', optimizers.AdamW, optimizers.MultiTensorAdamW, dict(lr=1e-3, weight_decay=0.01), False),
+        ('BertAdam', optimizers.BertAdam, optimizers.MultiTensorBertAdam, dict(lr=1e-3, warmup=0.1, t_total=100), True),
+        ('AdamW_with_schedule', optimizers.Lamb, optimizers.MultiTensorLamb, dict(lr=1e-3, warmup=0.1, t_total=100, adam=True, correct_bias=True), True),
+        ('Lamb_with_schedule', optimizers.Lamb, optimizers.MultiTensorLamb, dict(lr=1e-3, warmup=0.1, t_total=100, adam=False, correct_bias=False), True),
+    ]
+
+
+def run(model, grads, Opt_class, kwargs, grouped, n_steps, device):
+    """Return the mean milliseconds per step and the final parameters"""
+    model = copy.deepcopy(model)
+    params = get_grouped_parameters([model]) if grouped else list(model.parameters())
+    optimizer = Opt_class(params, **kwargs)
+
+    seconds = []
+    for step in range(n_steps + 1):
+        for p, grad in zip(model.parameters(), grads):
+            p.grad = grad.clone()
+        if device.startswith('cuda'):
+            torch.cuda.synchronize()
+        start = time.time()
+        optimizer.step()
+        if device.startswith('cuda'):
+            torch.cuda.synchronize()
+        if step > 0:
+            seconds.append(time.time() - start)
+    return sum(seconds) / len(seconds) * 1000, [p.detach() for p in model.parameters()]
+
+
+def main():
+    args = get_args()
+    model = nn.Sequential(*[Layer(args.hidden_size) for _ in range(args.n_layers)]).to(args.device)
+    grads = [torch.randn_like(p) * 1e-2 for p in model.parameters()]
+    print(f'{len(grads)} tensors, {sum(g.numel() for g in grads) / 1e6:.1f}M parameters, '
+          f'foreach ops available: {optimizers.FOREACH_AVAILABLE}')
+
+    for name, Reference, MultiTensor, kwargs, grouped in get_settings():
+        ref_ms, ref_params = run(model, grads, Reference, kwargs, grouped, args.n_steps, args.device)
+        new_ms, new_params = run(model, grads, MultiTensor, kwargs, grouped, args.n_steps, args.device)
+        max_diff = max((p1 - p2).abs().max().item() for p1, p2 in zip(ref_params, new_params))
+        print(f'[{name}] per-parameter {ref_ms:.2f} ms/step, multi-tensor {new_ms:.2f} ms/step, '
+              f'speedup {ref_ms / new_ms:.2f}x, max param diff {max_diff:.3e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*- #
+"""*********************************************************************************************"""
+#   FileName     [ utility/benchmark_pooling.py ]
+#   Synopsis     [ compare the masked pooling library against per-item pooling loops ]
+#   Author       [ S3PRL ]
+#   Copyright    [ Copyleft(c), Speech Lab, NTU, Taiwan ]
+"""*********************************************************************************************"""
+"""
+Usage:
+    python3 utility/benchmark_pooling.py --device cuda --batch_sizes 8 32 128
+"""
+
+
+###############
+# IMPORTATION #
+###############
+import os
+import sys
+import time
+import torch
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from downstream.pooling import masked_mean, statistics_pooling
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--batch_sizes', default=[8, 32, 128], type=int, nargs='+')
+    parser.add_argument('--max_len', default=500, type=int)
+    parser.add_argument('--hidden_dim', default=768, type=int)
+    parser.add_argument('--n_trials', default=100, type=int)
+    return parser.parse_args()
+
+
+def loop_mean(features, lengths):
+    return torch.stack([torch.mean(features[i][:lengths[i]], dim=0) for i in range(len(features))])
+
+
+def loop_statistics(features, lengths):
+    mean = loop_mean(features, lengths)
+    std = torch.stack([torch.std(features[i][:lengths[i]], dim=-2) for i in range(len(features))])
+    return torch.cat([mean, std], dim=-1)
+
+
+def timeit(fn, features, lengths, n_trials, device):
+    fn(features, lengths)
+    if device.startswith('cuda'):
+        torch.cuda.synchronize()
+    start = time.time()
+    for _ in range(n_trials):
+        fn(features, lengths)
+    if device.startswith('cuda'):
+        torch.cuda.synchronize()
+    return (time.time() - start) / n_trials * 1000
+
+
+def main():
+    args = get_args()
+    pairs = [
+        ('mean', loop_mean, masked_mean),
+        ('statistics', loop_statistics, statistics_pooling),
+    ]
+    for batch_size in args.batch_sizes:
+        lengths = torch.randint(args.max_len // 4, args.max_len + 1, (batch_size,), device=args.device)
+        features = torch.randn(batch_size, int(lengths.max()), args.hidden_dim, device=args.device)
+        for name, loop_fn, masked_fn in pairs:
+            diff = (loop_fn(features, lengths) - masked_fn(features, lengths)).abs().max().item()
+            loop_ms = timeit(loop_fn, features, lengths, args.n_trials, args.device)
+            masked_ms = timeit(masked_fn, features, lengths, args.n_trials, args.device)
+            print(f'[{name}] batch_size {batch_size}: loop {loop_ms:.3f} ms, masked {masked_ms:.3f} ms, '
+                  f'{loop_ms / masked_ms:.1f}x, max abs diff {diff:.2e}')
+
+
+if __name__ == '__main__':
+    main()
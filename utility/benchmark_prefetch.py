@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*- #
+"""*********************************************************************************************"""
+#   FileName     [ utility/benchmark_prefetch.py ]
+#   Synopsis     [ per-step latency breakdown of the downstream Runner with and without batch prefetching ]
+#   Author       [ S3PRL ]
+#   Copyright    [ Copyleft(c), Speech Lab, NTU, Taiwan ]
+"""*********************************************************************************************"""
+"""
+Usage:
+    python3 utility/benchmark_prefetch.py --upstream fbank --batch_size 32 --n_steps 100
+"""
+
+
+###############
+# IMPORTATION #
+###############
+import os
+import sys
+import time
+import argparse
+from collections import defaultdict
+#-------------#
+import torch
+import numpy as np
+from torch.utils.data import Dataset, DataLoader
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import hubconf
+from downstream.prefetch import BatchPrefetcher
+
+
+class RandomWavDataset(Dataset):
+    def __init__(self, n_utts, min_secs, max_secs):
+        self.lengths = np.random.randint(int(min_secs * 16000), int(max_secs * 16000), n_utts)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, index):
+        # numpy waveforms as most of the downstream datasets yield
+        return np.random.randn(self.lengths[index]).astype(np.float32) * 0.1, index
+
+    @staticmethod
+    def collate_fn(samples):
+        return zip(*samples)
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--upstream', default='fbank')
+    parser.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--batch_size', default=32, type=int)
+    parser.add_argument('--n_steps', default=100, type=int)
+    parser.add_argument('--num_workers', default=4, type=int)
+    parser.add_argument('--min_secs', default=2, type=float)
+    parser.add_argument('--max_secs', default=15, type=float)
+    return parser.parse_args()
+
+
+def synchronize(device):
+    if device.startswith('cuda'):
+        torch.cuda.synchronize()
+
+
+def run(upstream, dataloader, device, n_steps, prefetch):
+    """
+    Return the mean milliseconds per step of:
+        data: waiting for the next batch, including the inline copy when not prefetching
+        forward: the upstream forward
+        total: the whole step
+    """
+    timings = defaultdict(list)
+    iterator = iter(BatchPrefetcher(dataloader, device) if prefetch else dataloader)
+    synchronize(device)
+    for step in range(n_steps + 1):
+        step_start = time.time()
+        wavs, *others = next(iterator)
+        if not prefetch:
+            wavs = [torch.FloatTensor(wav).to(device) for wav in wavs]
+        data_end = time.time()
+
+        with torch.no_grad():
+            upstream(wavs)
+        synchronize(device)
+        step_end = time.time()
+
+        if step > 0:
+            # the first step includes the worker startup
+            timings['data'].append(data_end - step_start)
+            timings['forward'].append(step_end - data_end)
+            timings['total'].append(step_end - step_start)
+    return {key: np.mean(values) * 1000 for key, values in timings.items()}
+
+
+def main():
+    args = get_args()
+    upstream = getattr(hubconf, args.upstream)().to(args.device)
+    upstream.eval()
+
+    dataset = RandomWavDataset(args.batch_size * (args.n_steps + 1), args.min_secs, args.max_secs)
+    for prefetch in [False, True]:
+        dataloader = DataLoader(dataset, batch_size=args.batch_size, num_workers=args.num_workers,
+                                collate_fn=dataset.collate_fn)
+        timings = run(upstream, dataloader, args.device, args.n_steps, prefetch)
+        name = 'prefetch' if prefetch else 'inline copy'
+        print(f'[{name}] ' + ', '.join(f'{key} {value:.1f} ms/step' for key, value in timings.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*- #
+"""*********************************************************************************************"""
+#   FileName     [ utility/benchmark_similarity_search.py ]
+#   Synopsis     [ compare the batched max-similarity search against the per-pair scoring loop ]
+#   Author       [ S3PRL ]
+#   Copyright    [ Copyleft(c), Speech Lab, NTU, Taiwan ]
+"""*********************************************************************************************"""
+"""
+Usage:
+    python3 utility/benchmark_similarity_search.py --device cuda --n_queries 100 --n_docs 2000
+"""
+
+
+###############
+# IMPORTATION #
+###############
+import os
+import sys
+import time
+import torch
+import argparse
+import torch.nn.functional as F
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from downstream.similarity_search import MaxSimilaritySearch
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--n_queries', default=100, type=int)
+    parser.add_argument('--n_docs', default=2000, type=int)
+    parser.add_argument('--max_segments', default=50, type=int)
+    parser.add_argument('--dim', default=256, type=int)
+    return parser.parse_args()
+
+
+def loop_score(query_embs, doc_embs, device):
+    all_scores = []
+    for query_emb in query_embs:
+        query_emb = query_emb[0:1].to(device)
+        scores = []
+        for doc_emb in doc_embs:
+            similarities = F.cosine_similarity(query_emb, doc_emb.to(device))
+            scores.append(similarities.max().cpu())
+        all_scores.append(torch.stack(scores))
+    return torch.stack(all_scores)
+
+
+def main():
+    args = get_args()
+    query_embs = [torch.randn(torch.randint(1, args.max_segments, ()).item(), args.dim) for _ in range(args.n_queries)]
+    doc_embs = [torch.randn(torch.randint(1, args.max_segments, ()).item(), args.dim) for _ in range(args.n_docs)]
+
+    start = time.time()
+    loop_scores = loop_score(query_embs, doc_embs, args.device)
+    loop_sec = time.time() - start
+
+    start = time.time()
+    search = MaxSimilaritySearch(doc_embs, device=args.device)
+    batch_scores = search.score(torch.stack([emb[0] for emb in query_embs]))
+    batch_sec = time.time() - start
+
+    diff = (loop_scores - batch_scores).abs().max().item()
+    print(f'{args.n_queries} queries x {args.n_docs} docs: loop {loop_sec:.3f} sec, batched {batch_sec:.3f} sec, '
+          f'{loop_sec / batch_sec:.1f}x, max abs diff {diff:.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*- #
+"""*********************************************************************************************"""
+#   FileName     [ utility/benchmark_zerospeech_export.py ]
+#   Synopsis     [ compare synchronous np.savetxt against the asynchronous ZeroSpeech 2021 export ]
+#   Author       [ S3PRL ]
+#   Copyright    [ Copyleft(c), Speech Lab, NTU, Taiwan ]
+"""*********************************************************************************************"""
+"""
+Usage:
+    python3 utility/benchmark_zerospeech_export.py --n_utts 1000 --num_workers 8
+"""
+
+
+###############
+# IMPORTATION #
+###############
+import os
+import sys
+import time
+import torch
+import tempfile
+import argparse
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from downstream.zerospeech2021.export import FeatureWriter, get_fmt
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_utts', default=1000, type=int)
+    parser.add_argument('--max_len', default=800, type=int)
+    parser.add_argument('--feature_dim', default=32, type=int)
+    parser.add_argument('--precision', default=4)
+    parser.add_argument('--num_workers', default=4, type=int)
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    features = [torch.randn(torch.randint(args.max_len // 4, args.max_len, ()).item(), args.feature_dim) for _ in range(args.n_utts)]
+
+    with tempfile.TemporaryDirectory() as sync_dir:
+        paths = [os.path.join(sync_dir, f'{i}.txt') for i in range(args.n_utts)]
+        start = time.time()
+        for path, feature in zip(paths, features):
+            np.savetxt(path, np.array(feature.cpu()), fmt=get_fmt(args.precision))
+        sync_secs = time.time() - start
+
+    with tempfile.TemporaryDirectory() as async_dir:
+        paths = [os.path.join(async_dir, f'{i}.txt') for i in range(args.n_utts)]
+        writer = FeatureWriter(args.precision, args.num_workers)
+        start = time.time()
+        writer.submit(features, paths)
+        submit_secs = time.time() - start
+        writer.finalize()
+        total_secs = time.time() - start
+
+    print(f'savetxt in forward: {args.n_utts / sync_secs:.1f} utt/sec')
+    print(f'FeatureWriter: {args.n_utts / submit_secs:.1f} utt/sec in forward, {args.n_utts / total_secs:.1f} utt/sec including text conversion')
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,7 @@ import hubconf
 
 
 parser = argparse.ArgumentParser()
-upstreams = [attr for attr in dir(hubconf) if callable(getattr(hubconf, attr)) and attr[0] != '_']
+upstreams = hubconf._get_entry_names()
 parser.add_argument('--mode', choices=['list', 'help', 'load'], required=True)
 parser.add_argument('--upstream', choices=upstreams)
 parser.add_argument('--ckpt', help='The PATH/URL/GOOGLE_DRIVE_ID of upstream checkpoint, not always needed')
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*- #
+"""*********************************************************************************************"""
+#   FileName     [ utility/checkpoint.py ]
+#   Synopsis     [ background checkpoint writer shared by the pre-training and downstream runners ]
+#   Author       [ S3PRL ]
+#   Copyright    [ Copyleft(c), Speech Lab, NTU, Taiwan ]
+"""*********************************************************************************************"""
+
+
+###############
+# IMPORTATION #
+###############
+import os
+import re
+import queue
+import shutil
+import threading
+from collections import OrderedDict
+#-------------#
+import torch
+
+
+PERIODIC_CKPT = re.compile(r'^states-(\d+)\.ckpt$')
+
+
+def snapshot_to_cpu(states):
+    """
+    Copy all the tensors in (nested) states to CPU, so that the training can keep updating
+    the parameters and optimizer states while the snapshot is being written
+    """
+    if torch.is_tensor(states):
+        return states.detach().cpu() if states.is_cuda else states.detach().clone()
+    elif isinstance(states, OrderedDict):
+        return OrderedDict((key, snapshot_to_cpu(value)) for key, value in states.items())
+    elif isinstance(states, dict):
+        return {key: snapshot_to_cpu(value) for key, value in states.items()}
+    elif isinstance(states, (list, tuple)):
+        return type(states)(snapshot_to_cpu(value) for value in states)
+    return states
+
+
+def link_or_copy(src, dst):
+    """Atomically make dst a hard link of src, or a copy when the filesystem does not support it"""
+    tmp = f'{dst}.tmp'
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+class CheckpointManager:
+    """
+    Writes each checkpoint once, from a background thread:
+        1. the states are snapshotted to CPU in the training thread
+        2. the payload is written to a temporary file and atomically renamed to the first name
+        3. the other names are hard links of the same file
+        4. periodic checkpoints (states-{step}.ckpt) beyond max_keep are removed
+
+    At most one checkpoint is pending, a new save waits for the previous one to finish.
+    """
+    def __init__(self, directory, max_keep, asynchronous=True):
+        self.directory = directory
+        self.max_keep = max_keep
+        self.asynchronous = asynchronous
+
+        # the only directory scan, later saves maintain the list
+        steps = []
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                matched = PERIODIC_CKPT.match(name)
+                if matched:
+                    steps.append((int(matched.group(1)), os.path.join(directory, name)))
+        self.periodic_paths = [path for step, path in sorted(steps)]
+
+        self.error = None
+        self.jobs = queue.Queue()
+        self.thread = None
+        if self.asynchronous:
+            self.thread = threading.Thread(target=self._worker, daemon=True)
+            self.thread.start()
+
+    def _worker(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+                if self.error is None:
+                    self._write(*job)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.jobs.task_done()
+
+    def _write(self, states, paths, removed_paths):
+        tmp = f'{paths[0]}.tmp'
+        try:
+            torch.save(states, tmp)
+            os.replace(tmp, paths[0])
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        for path in paths[1:]:
+            link_or_copy(paths[0], path)
+        for path in removed_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError('[CheckpointManager] - failed to write the checkpoint') from error
+
+    def save(self, states, names):
+        """
+        Args:
+            states (dict): the checkpoint content, tensors can be on any device
+            names (list(str)): file names under the directory, eg. ['states-1000.ckpt', 'best-states-dev.ckpt']
+
+        Return:
+            the list of paths the checkpoint will be saved to
+        """
+        self.wait()
+        paths = [os.path.join(self.directory, name) for name in names]
+
+        removed_paths = []
+        for path in paths:
+            if PERIODIC_CKPT.match(os.path.basename(path)) and path not in self.periodic_paths:
+                self.periodic_paths.append(path)
+        while len(self.periodic_paths) > self.max_keep:
+            removed = self.periodic_paths.pop(0)
+            if removed not in paths:
+                removed_paths.append(removed)
+
+        states = snapshot_to_cpu(states)
+        if self.asynchronous:
+            self.jobs.put((states, paths, removed_paths))
+        else:
+            self._write(states, paths, removed_paths)
+        return paths
+
+    def wait(self):
+        """Block until the pending checkpoint is on disk"""
+        if self.asynchronous:
+            self.jobs.join()
+        self._raise_error()
+
+    def close(self):
+        if self.asynchronous and self.thread is not None:
+            self.jobs.put(None)
+            self.thread.join()
+            self.thread = None
+        self._raise_error()
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*- #
+"""*********************************************************************************************"""
+#   FileName     [ utility/feature_store.py ]
+#   Synopsis     [ sharded memory-mapped store for the pre-extracted acoustic features ]
+#   Author       [ S3PRL ]
+#   Copyright    [ Copyleft(c), Speech Lab, NTU, Taiwan ]
+"""*********************************************************************************************"""
+"""
+Instead of one .npy per utterance, the features of a split are appended into a few large
+float32 shards, with an index mapping each utterance to (shard, offset, length) in frames:
+
+    {split_dir}/shard-00000.bin
+    {split_dir}/shard-00001.bin
+    {split_dir}/index.csv
+    {split_dir}/meta.json        # written last, marks the store as complete
+
+The keys are the `file_path` entries of the bucketing csv, eg. 'train-clean-100/xxx.npy', so the
+tables written by the preprocessors are unchanged.
+
+Existing per-utterance .npy features can be packed with:
+    python3 -m utility.feature_store -i data/libri_mel160 -s train-clean-100 dev-clean
+"""
+
+
+###############
+# IMPORTATION #
+###############
+import os
+import json
+import argparse
+#-------------#
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from joblib import Parallel, delayed
+
+
+INDEX_FILE = 'index.csv'
+META_FILE = 'meta.json'
+DTYPE = 'float32'
+
+
+def get_shard_path(directory, shard_id):
+    return os.path.join(directory, f'shard-{shard_id:05d}.bin')
+
+
+class ShardedFeatureWriter:
+    """
+    Args:
+        directory: the split directory to write the shards into
+        shard_size: maximum size of a shard in bytes, a single utterance is never split
+        dtype: the storage dtype, eg. int16 for waveforms
+    """
+    def __init__(self, directory, shard_size=1024 ** 3, dtype=DTYPE):
+        self.directory = directory
+        self.shard_size = shard_size
+        self.dtype = dtype
+        os.makedirs(directory, exist_ok=True)
+        if os.path.isfile(os.path.join(directory, META_FILE)):
+            os.remove(os.path.join(directory, META_FILE))
+
+        self.dim = None
+        self.index = []
+        self.handle = None
+        self.shard_id = -1
+        self.shard_frames = 0
+
+    def _next_shard(self):
+        if self.handle is not None:
+            self.handle.close()
+        self.shard_id += 1
+        self.shard_frames = 0
+        self.handle = open(get_shard_path(self.directory, self.shard_id), 'wb')
+
+    def add(self, key, feat):
+        """
+        Args:
+            key: the file_path of the utterance in the bucketing csv
+            feat: (seq_len, feature_dim) array
+        """
+        feat = np.ascontiguousarray(feat, dtype=self.dtype)
+        if self.dim is None:
+            self.dim = feat.shape[1]
+        assert feat.shape[1] == self.dim, f'Feature dim {feat.shape[1]} of {key} mismatches {self.dim}'
+
+        if self.handle is None or (self.shard_frames > 0 and (self.shard_frames + len(feat)) * self.dim * feat.itemsize > self.shard_size):
+            self._next_shard()
+        self.handle.write(feat.tobytes())
+        self.index.append((key, self.shard_id, self.shard_frames, len(feat)))
+        self.shard_frames += len(feat)
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+        df = pd.DataFrame(self.index, columns=['file_path', 'shard', 'offset', 'length'])
+        df.to_csv(os.path.join(self.directory, INDEX_FILE), index=False)
+        with open(os.path.join(self.directory, META_FILE), 'w') as handle:
+            json.dump({'dim': self.dim, 'dtype': self.dtype, 'n_shards': self.shard_id + 1, 'n_utts': len(self.index)}, handle)
+
+
+class ShardedFeatureStore:
+    """
+    Read-only access to the features written by ShardedFeatureWriter.
+    The shards are memory-mapped lazily, in each dataloader worker.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), 'r') as handle:
+            self.meta = json.load(handle)
+        df = pd.read_csv(os.path.join(directory, INDEX_FILE))
+        self.index = dict(zip(df['file_path'].tolist(), zip(df['shard'].tolist(), df['offset'].tolist(), df['length'].tolist())))
+        self.shards = {}
+
+    @staticmethod
+    def exists(directory):
+        return os.path.isfile(os.path.join(directory, META_FILE))
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['shards'] = {}
+        return state
+
+    def _get_shard(self, shard_id):
+        if shard_id not in self.shards:
+            shard = np.memmap(get_shard_path(self.directory, shard_id), dtype=self.meta['dtype'], mode='r')
+            self.shards[shard_id] = shard.reshape(-1, self.meta['dim'])
+        return self.shards[shard_id]
+
+    def read(self, key):
+        """Return a read-only (seq_len, feature_dim) view, copy it before modifying"""
+        shard_id, offset, length = self.index[key]
+        return self._get_shard(shard_id)[offset : offset + length]
+
+
+def extract_to_store(directory, files, keys, extract_fn, n_jobs=-1, shard_size=1024 ** 3, chunk_size=512):
+    """
+    Run extract_fn(file) -> (seq_len, feature_dim) array in parallel, and append the results
+    into a sharded store in the order of files
+
+    Return:
+        the list of the feature lengths
+    """
+    writer = ShardedFeatureWriter(directory, shard_size)
+    lengths = []
+    for start in tqdm(range(0, len(files), chunk_size)):
+        feats = Parallel(n_jobs=n_jobs)(delayed(extract_fn)(file) for file in files[start : start + chunk_size])
+        for key, feat in zip(keys[start : start + chunk_size], feats):
+            writer.add(key, feat)
+            lengths.append(len(feat))
+    writer.close()
+    return lengths
+
+
+def pack_features(root, split, shard_size=1024 ** 3):
+    """Pack the per-utterance .npy features listed in {root}/{split}.csv into a sharded store"""
+    table = pd.read_csv(os.path.join(root, split + '.csv'))
+    writer = ShardedFeatureWriter(os.path.join(root, split), shard_size)
+    for file_path in tqdm(table['file_path'].tolist()):
+        writer.add(file_path, np.load(os.path.join(root, file_path)))
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack pre-extracted .npy features into sharded memory-mapped files.')
+    parser.add_argument('-i', '--input_path', required=True, type=str, help='The directory containing {split}.csv and the {split}/ features')
+    parser.add_argument('-s', '--splits', required=True, type=str, nargs='+')
+    parser.add_argument('--shard_size', default=1024, type=int, help='Maximum shard size in MB')
+    args = parser.parse_args()
+
+    for split in args.splits:
+        pack_features(args.input_path, split, args.shard_size * 1024 ** 2)
+        print('Packed', split, 'into', os.path.join(args.input_path, split))
+
+
+if __name__ == '__main__':
+    main()
@@ -22,6 +22,15 @@ for sample in samples:
 # for utterance-wise classification
 records['sample_wise_metric'] += (predicted_classid == labels).view(-1).cpu().tolist()
 ```
+
+Evaluation strategies (--strategy):
+- sequential: evaluate the two checkpoints one after the other
+- shared: when both checkpoints use the same frozen upstream on the same downstream data, the
+          upstream is built once and each batch is forwarded once, feeding both featurizers and
+          downstream heads
+- parallel: evaluate the two checkpoints concurrently in two processes, eg. with
+            --device1 cuda:0 --device2 cuda:1
+- auto: shared if possible, else sequential
 """
 
 
@@ -34,6 +43,7 @@ import random
 import argparse
 from tqdm import tqdm
 from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
 #-------------#
 import torch
 import torchaudio
@@ -55,6 +65,7 @@ def get_ttest_args():
     parser.add_argument('-em', '--evaluate_metric', default='acc')
     parser.add_argument('-t', '--evaluate_split', default='test')
     parser.add_argument('-o', '--override', help='Used to override args and config, this is at the highest priority')
+    parser.add_argument('-s', '--strategy', choices=['auto', 'sequential', 'shared', 'parallel'], default='auto', help='How the two checkpoints are evaluated')
 
     # compare two ckpts with the Paired Sample T-test using SciPy
     # All the args and config ill be determined by the ckpts
@@ -63,6 +74,8 @@ def get_ttest_args():
     parser.add_argument('-e2', '--past_exp2', metavar='{CKPT_PATH,CKPT_DIR}', help='Load from another checkpoint')
     parser.add_argument('-u1', '--upstream1', default='default', type=str, help='used to override the upstream string for checkpoint e1')
     parser.add_argument('-u2', '--upstream2', default='default', type=str, help='used to override the upstream string for checkpoint e2')
+    parser.add_argument('-d1', '--device1', default=None, type=str, help='used to override the device for checkpoint e1')
+    parser.add_argument('-d2', '--device2', default=None, type=str, help='used to override the device for checkpoint e2')
 
     # options
     parser.add_argument('--seed', default=1337, type=int)
@@ -76,8 +89,10 @@ def get_ttest_args():
     args2, config2 = get_past_exp(args, args.past_exp2, args.ckpt_name)
     if args.upstream1 != 'default': args1.upstream = args.upstream1
     if args.upstream2 != 'default': args2.upstream = args.upstream2
+    if args.device1 is not None: args1.device = args.device1
+    if args.device2 is not None: args2.device = args.device2
 
-    return args.mode, args1, config1, args2, config2
+    return args.mode, args.strategy, args1, config1, args2, config2
 
 
 def get_past_exp(args, past_exp, name):
@@ -126,74 +141,159 @@ def get_past_exp(args, past_exp, name):
 class Tester(Runner):
     """
     Used to handle the evaluation loop and return the testing records for Paired Sample T-test.
+
+    Args:
+        upstream: an upstream ModelEntry shared with another Tester, built from args if None
     """
-    def __init__(self, args, config):
+    def __init__(self, args, config, upstream=None):
+        self.shared_upstream = upstream
         super(Tester, self).__init__(args, config)
-    
-    def evaluate(self):
-        """evaluate function will always be called on a single process even during distributed training"""
 
-        split = self.args.evaluate_split
+    def _get_upstream(self):
+        if self.shared_upstream is not None:
+            return self.shared_upstream
+        return super(Tester, self)._get_upstream()
 
+    def prepare_evaluate(self):
         # fix seed to guarantee the same evaluation protocol across steps 
         random.seed(self.args.seed)
         np.random.seed(self.args.seed)
         torch.manual_seed(self.args.seed)
         if torch.cuda.is_available():
             torch.cuda.manual_seed_all(self.args.seed)
-        with torch.cuda.device(self.args.device):
-            torch.cuda.empty_cache()
+            with torch.cuda.device(self.args.device):
+                torch.cuda.empty_cache()
 
         # set all models to eval
-        self.downstream.eval()
-        self.upstream.eval()
+        for entry in self.all_entries:
+            entry.model.eval()
+
+    def upstream_forward(self, wavs):
+        if self.upstream.trainable:
+            wavs = self._to_device(wavs)
+            with torch.no_grad():
+                features = self.upstream.model(wavs)
+        else:
+            wavs, features = self._frozen_upstream_forward(wavs)
+        return wavs, features
+
+    def downstream_forward(self, split, wavs, features, others, records):
+        with torch.no_grad():
+            features = self.featurizer.model(wavs, features)
+            self.downstream.model(
+                split,
+                features, *others,
+                records = records,
+            )
+
+    def evaluate(self):
+        """evaluate function will always be called on a single process even during distributed training"""
+
+        split = self.args.evaluate_split
+        self.prepare_evaluate()
 
         # prepare data
-        dataloader = self.downstream.get_dataloader(split)
+        dataloader = self.downstream.model.get_dataloader(split)
 
         records = defaultdict(list)
-        for batch_id, (wavs, *others) in enumerate(tqdm(dataloader, dynamic_ncols=True, desc=split)):
-
-            wavs = [torch.FloatTensor(wav).to(self.args.device) for wav in wavs]
-            with torch.no_grad():
-                features = self.upstream(wavs)
-                self.downstream(
-                    split,
-                    features, *others,
-                    records = records,
-                )
+        for batch_id, (wavs, *others) in enumerate(tqdm(self._prefetch(dataloader), dynamic_ncols=True, desc=split)):
+            wavs, features = self.upstream_forward(wavs)
+            self.downstream_forward(split, wavs, features, others, records)
         return records
 
 
+def can_share_upstream(args1, config1, args2, config2):
+    """Whether the two checkpoints see the same upstream features for the same batches"""
+    same_keys = ['upstream', 'upstream_ckpt', 'upstream_model_config', 'downstream', 'evaluate_split']
+    if any(getattr(args1, key, None) != getattr(args2, key, None) for key in same_keys):
+        return False
+    if args1.upstream_trainable or args2.upstream_trainable:
+        return False
+    return config1['downstream_expert'].get('datarc') == config2['downstream_expert'].get('datarc')
+
+
+def evaluate_shared(args1, config1, args2, config2):
+    """Build the upstream once, and feed the features of each batch to both downstream heads"""
+    args2.device = args1.device
+    tester1 = Tester(args1, config1)
+    tester2 = Tester(args2, config2, upstream=tester1.upstream)
+
+    split = args1.evaluate_split
+    tester2.prepare_evaluate()
+    tester1.prepare_evaluate()
+    dataloader = tester1.downstream.model.get_dataloader(split)
+
+    records1, records2 = defaultdict(list), defaultdict(list)
+    for batch_id, (wavs, *others) in enumerate(tqdm(tester1._prefetch(dataloader), dynamic_ncols=True, desc=split)):
+        wavs, features = tester1.upstream_forward(wavs)
+        tester1.downstream_forward(split, wavs, features, others, records1)
+        tester2.downstream_forward(split, wavs, features, others, records2)
+
+    return process_records(records1, args1.evaluate_metric), process_records(records2, args2.evaluate_metric)
+
+
 def process_records(records, metric):
     assert 'sample_wise_metric' in records, 'Utterance-wise / sample-wise metric is necessary for proceeding the Paired Sample T-test.'
     average = torch.FloatTensor(records[metric]).mean().item()
     return average, records['sample_wise_metric']
 
 
-def main():
+def fix_seed(seed):
+    # Fix seed and make backends deterministic
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    if torch.cuda.is_available(): torch.cuda.manual_seed_all(seed)
+    torch.backends.cudnn.deterministic = True
+    torch.backends.cudnn.benchmark = False
+
+
+def evaluate_single(args, config):
+    tester = Tester(args, config)
+    records = eval(f'tester.{args.mode}')()
+    return process_records(records, args.evaluate_metric)
+
+
+def evaluate_in_process(args, config):
+    """The entry of the worker processes used by the parallel strategy"""
     torch.multiprocessing.set_sharing_strategy('file_system')
     torchaudio.set_audio_backend('sox_io')
     hack_isinstance()
+    fix_seed(args.seed)
+    return evaluate_single(args, config)
 
-    # get config and arguments
-    mode, args1, config1, args2, config2 = get_ttest_args()
 
-    # Fix seed and make backends deterministic
-    random.seed(args1.seed)
-    np.random.seed(args1.seed)
-    torch.manual_seed(args1.seed)
-    if torch.cuda.is_available(): torch.cuda.manual_seed_all(args1.seed)
-    torch.backends.cudnn.deterministic = True
-    torch.backends.cudnn.benchmark = False
+def evaluate_parallel(args1, config1, args2, config2):
+    context = torch.multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=2, mp_context=context) as executor:
+        future1 = executor.submit(evaluate_in_process, args1, config1)
+        future2 = executor.submit(evaluate_in_process, args2, config2)
+        return future1.result(), future2.result()
 
-    tester1 = Tester(args1, config1)
-    records1 = eval(f'tester1.{args1.mode}')()
-    average1, sample_metric1 = process_records(records1, args1.evaluate_metric)
 
-    tester2 = Tester(args2, config2)
-    records2 = eval(f'tester2.{args2.mode}')()
-    average2, sample_metric2 = process_records(records2, args2.evaluate_metric)
+def main():
+    torch.multiprocessing.set_sharing_strategy('file_system')
+    torchaudio.set_audio_backend('sox_io')
+    hack_isinstance()
+
+    # get config and arguments
+    mode, strategy, args1, config1, args2, config2 = get_ttest_args()
+    fix_seed(args1.seed)
+
+    if strategy == 'auto':
+        strategy = 'shared' if can_share_upstream(args1, config1, args2, config2) else 'sequential'
+    elif strategy == 'shared':
+        assert can_share_upstream(args1, config1, args2, config2), \
+            'The shared strategy needs the same frozen upstream, downstream task and data config for both checkpoints'
+    print(f'[Runner] - Evaluating the two ckpts with the {strategy} strategy')
+
+    if strategy == 'shared':
+        (average1, sample_metric1), (average2, sample_metric2) = evaluate_shared(args1, config1, args2, config2)
+    elif strategy == 'parallel':
+        (average1, sample_metric1), (average2, sample_metric2) = evaluate_parallel(args1, config1, args2, config2)
+    else:
+        average1, sample_metric1 = evaluate_single(args1, config1)
+        average2, sample_metric2 = evaluate_single(args2, config2)
 
     if mode == 'ttest':
         statistic, p_value = stats.ttest_rel(sample_metric1, sample_metric2)
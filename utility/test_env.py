@@ -49,7 +49,7 @@ def main():
     parser = argparse.ArgumentParser()
 
     # upstream settings
-    upstreams = [attr for attr in dir(hubconf) if callable(getattr(hubconf, attr)) and attr[0] != '_']
+    upstreams = hubconf._get_entry_names()
     parser.add_argument('--mode', '-m', choices=['extract', 'test'], required=True)
     parser.add_argument('--upstream', '-u', choices=upstreams, required=True)
     parser.add_argument('--extract_dir', '-d', default='./extracted')